@@ -0,0 +1,39 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncTableManager:
+    """
+    Асинхронный фасад над TableManager.
+
+    Все обращения к таблице выполняются в одном отдельном потоке строго
+    в порядке вызова, поэтому обработчики событий Telethon не блокируются
+    на дисковых операциях:
+
+        await table_manager.mark_completed(prompt_id, model, file_path)
+
+    Константы статусов и другие атрибуты менеджера доступны как обычно.
+    """
+
+    def __init__(self, table_manager):
+        self.table_manager = table_manager
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='table-writer')
+
+    def __getattr__(self, name):
+        attr = getattr(self.table_manager, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(attr, *args, **kwargs))
+
+        return call
+
+    async def close(self):
+        """Дожидается всех операций, закрывает хранилище и останавливает поток записи"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.table_manager.close)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,63 @@
+import argparse
+import csv
+import gc
+import io
+import tracemalloc
+from datetime import datetime
+from prompt_record import PromptRecord
+
+
+def build_csv(rows_count):
+    """Создает CSV таблицы промптов в памяти, как после частичной обработки очереди"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=PromptRecord.FIELDS)
+    writer.writeheader()
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for i in range(rows_count):
+        writer.writerow({
+            'id': f"{i:08x}",
+            'prompt': f"Cinematic drone shot over a neon city at night, scene number {i}",
+            'status': 'pending' if i % 3 else 'completed',
+            'model': '' if i % 3 else '🌙 SORA',
+            'video_path': '',
+            'timestamp': '' if i % 3 else timestamp,
+            'slot': '',
+        })
+    return buffer.getvalue()
+
+
+def measure(csv_text, factory):
+    """
+    Измеряет память, занимаемую очередью строк
+
+    Returns:
+        float: Байт на один промпт в очереди
+    """
+    gc.collect()
+    tracemalloc.start()
+    rows = [factory(row) for row in csv.DictReader(io.StringIO(csv_text))]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(rows)
+    del rows
+    gc.collect()
+    return current / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память на один промпт в очереди: dict и PromptRecord")
+    parser.add_argument('--rows', default='100000,1000000',
+                        help="Размеры очереди через запятую (по умолчанию 100000,1000000)")
+    args = parser.parse_args()
+
+    print(f"{'Строк':>10} | {'dict, байт':>11} | {'PromptRecord, байт':>18} | {'Экономия':>8}")
+    for rows_count in (int(value) for value in args.rows.split(',')):
+        csv_text = build_csv(rows_count)
+        dict_bytes = measure(csv_text, dict)
+        record_bytes = measure(csv_text, PromptRecord.from_dict)
+        saving = (1 - record_bytes / dict_bytes) * 100
+        print(f"{rows_count:>10} | {dict_bytes:>11.0f} | {record_bytes:>18.0f} | {saving:>7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+from telethon import TelegramClient
+from navigation import TelegramNavigator
+from video_downloader import VideoDownloader
+from message_monitor import MessageMonitor
+from scheduler import ModelScheduler
+
+
+def load_accounts(config):
+    """
+    Возвращает список учетных данных аккаунтов из конфига
+
+    Args:
+        config: Конфигурация (accounts=api_id:api_hash,api_id:api_hash или api_id и api_hash)
+
+    Returns:
+        list: Список кортежей (api_id, api_hash)
+
+    Raises:
+        ValueError: Неверный формат или повторяющийся api_id
+    """
+    accounts = []
+    for item in config.get('accounts', '').split(','):
+        if not item.strip():
+            continue
+        api_id, _, api_hash = item.partition(':')
+        if not api_id.strip().isdigit() or not api_hash.strip():
+            raise ValueError(f"Неверное значение accounts: {item.strip()}")
+        if any(api_id.strip() == known_id for known_id, _ in accounts):
+            # Сессия, слоты и контрольная точка аккаунта привязаны к api_id
+            raise ValueError(f"api_id {api_id.strip()} указан в accounts несколько раз; "
+                             f"аккаунты одного приложения запускайте отдельными процессами с общей очередью")
+        accounts.append((api_id.strip(), api_hash.strip()))
+    return accounts or [(config['api_id'], config['api_hash'])]
+
+
+class BotAccount:
+    """
+    Аккаунт Telegram со своим клиентом, монитором сообщений, навигатором
+    и планировщиком слотов. Все аккаунты берут промпты из общей очереди.
+    """
+
+    def __init__(self, api_id, api_hash, config, logger=None):
+        self.api_id = api_id
+        self.config = config
+        self.logger = logger
+        # Уникальное имя сессии для каждого аккаунта
+        self.client = TelegramClient(f"bot_session_{api_id}", int(api_id), api_hash)
+        self.bot = None
+        self.video_downloader = None
+        self.message_monitor = None
+        self.navigator = None
+        self.scheduler = None
+
+    async def connect(self):
+        """Подключается к Telegram, при необходимости запрашивая номер телефона и код"""
+        print(f"\nВход в аккаунт Telegram (api_id {self.api_id})")
+
+        # Запускаем клиент без автоматического входа
+        await self.client.connect()
+
+        if not await self.client.is_user_authorized():
+            phone = input('Введите номер телефона: ')
+            await self.client.send_code_request(phone)
+            code = input('Введите код подтверждения: ')
+            await self.client.sign_in(phone, code)
+            if self.logger:
+                self.logger.log_app_event("AUTH", f"Выполнена авторизация с новыми учетными данными (api_id {self.api_id})")
+        elif self.logger:
+            self.logger.log_app_event("AUTH", f"Использована существующая авторизация (api_id {self.api_id})")
+
+        # Получение информации о боте
+        self.bot = await self.client.get_input_entity(self.config['bot_name'])
+        if self.logger:
+            self.logger.log_app_event("BOT_CONNECTED", f"Подключено к боту {self.config['bot_name']} (api_id {self.api_id})")
+
+    async def start(self, table_manager, generation_stats=None):
+        """
+        Создает компоненты аккаунта и запускает мониторинг сообщений
+
+        Args:
+            table_manager: Менеджер таблицы промптов
+            generation_stats: Статистика времени генерации, общая для всех аккаунтов
+
+        Raises:
+            ValueError: Неверные настройки планировщика
+        """
+        self.video_downloader = VideoDownloader(table_manager, self.config, self.logger)
+        self.message_monitor = MessageMonitor(self.client, self.bot, self.video_downloader, self.config, self.logger)
+        self.navigator = TelegramNavigator(self.client, self.bot, self.config, self.message_monitor, self.logger)
+        self.scheduler = ModelScheduler.from_config(self.config, self.navigator.models, self.logger)
+        self.message_monitor.set_scheduler(self.scheduler)
+        self.message_monitor.set_generation_stats(generation_stats)
+        await self.message_monitor.start_monitoring()
+
+    def load(self):
+        """Возвращает долю занятых слотов аккаунта"""
+        return sum(self.scheduler.active.values()) / self.max_in_flight()
+
+    def max_in_flight(self):
+        """Возвращает, сколько запросов аккаунт может держать в работе одновременно"""
+        navigator = self.navigator
+        models = navigator.models.values() if navigator.routing else [navigator.get_model()]
+        return self.scheduler.max_in_flight(models)
+
+    def select_model(self, prompt_data):
+        """Выбирает модель для промпта или None, если у аккаунта нет свободных слотов"""
+        return self.navigator.select_model(prompt_data, self.scheduler)
+
+    async def catch_up(self):
+        """Запрашивает у Telegram обновления, пропущенные, пока бот был остановлен"""
+        try:
+            await self.client.catch_up()
+        except Exception as e:
+            if self.logger:
+                self.logger.log_exception(e, context=f"При получении пропущенных сообщений (api_id {self.api_id})")
+
+    async def disconnect(self):
+        await self.client.disconnect()
+
+
+def select_account(accounts, prompt_data):
+    """
+    Выбирает для промпта наименее загруженный аккаунт, у которого есть свободная модель
+
+    Returns:
+        tuple: (BotAccount, модель) или (None, None), если все аккаунты заняты
+    """
+    for account in sorted(accounts, key=lambda account: account.load()):
+        model = account.select_model(prompt_data)
+        if model:
+            return account, model
+    return None, None
@@ -0,0 +1,111 @@
+import time
+from table_manager import MemoryTableManager
+
+
+class BufferedTableManager(MemoryTableManager):
+    """
+    CSV-менеджер таблицы с отложенной записью.
+
+    Изменения копятся в памяти: несколько обновлений одной строки сливаются
+    в одно, а таблица перезаписывается раз в write_flush_interval секунд
+    или при накоплении write_flush_max_dirty измененных строк.
+    """
+
+    def __init__(self, config):
+        self.flush_interval = float(config.get('write_flush_interval', '0'))
+        self.flush_max_dirty = int(config.get('write_flush_max_dirty', '100'))
+
+        self._dirty = set()  # id строк, измененных после последней записи
+        self.flush_stats = {
+            'updates': 0,         # Всего изменений статуса
+            'coalesced': 0,       # Изменений, слитых с уже ожидающими записи
+            'flushes': 0,         # Фактических перезаписей таблицы
+            'total_flush_time': 0.0,
+            'max_flush_time': 0.0,
+        }
+
+        super().__init__(config)
+        self._start_worker(self.flush_interval, 'table-flusher')
+
+    def clear_table(self):
+        """Очищает таблицу в памяти и на диске"""
+        self._reset_dedup_index()
+        with self._snapshot_lock, self._lock:
+            self._set_rows([])
+            self._dirty.clear()
+            self._write_snapshot([])
+
+    def _write_table(self, rows):
+        """Заменяет таблицу целиком и сразу записывает ее"""
+        with self._lock:
+            self._set_rows(rows)
+            self._dirty.clear()
+        self.flush(force=True)
+
+    def _persist_update(self, prompt_id, record):
+        """Помечает строку как измененную"""
+        self.flush_stats['updates'] += 1
+        if prompt_id in self._dirty:
+            self.flush_stats['coalesced'] += 1
+        self._dirty.add(prompt_id)
+
+    def _persist_rows(self, rows):
+        """Помечает новые строки как требующие записи"""
+        self._dirty.update(row['id'] for row in rows)
+
+    def _after_persist(self):
+        """Сбрасывает буфер при накоплении слишком многих измененных строк"""
+        if len(self._dirty) >= self.flush_max_dirty:
+            self.flush()
+
+    def flush(self, force=False):
+        """
+        Записывает накопленные изменения в CSV
+
+        Args:
+            force: Записать таблицу, даже если изменений нет
+
+        Returns:
+            bool: True если таблица была записана
+        """
+        with self._snapshot_lock:
+            with self._lock:
+                if not self._dirty and not force:
+                    return False
+                self._dirty.clear()
+                rows = [row.copy() for row in self._rows]
+
+            start_time = time.perf_counter()
+            self._write_snapshot(rows)
+            elapsed = time.perf_counter() - start_time
+
+            with self._lock:
+                self.flush_stats['flushes'] += 1
+                self.flush_stats['total_flush_time'] += elapsed
+                self.flush_stats['max_flush_time'] = max(self.flush_stats['max_flush_time'], elapsed)
+            return True
+
+    def get_flush_stats(self):
+        """
+        Возвращает статистику записи таблицы
+
+        Returns:
+            dict: Счетчики изменений и записей, сэкономленные записи и задержка в мс
+        """
+        with self._lock:
+            stats = dict(self.flush_stats)
+            stats['dirty'] = len(self._dirty)
+        flushes = stats['flushes']
+        stats['saved_writes'] = max(stats['updates'] - flushes, 0)
+        stats['avg_flush_ms'] = round(stats['total_flush_time'] / flushes * 1000, 2) if flushes else 0.0
+        stats['max_flush_ms'] = round(stats.pop('max_flush_time') * 1000, 2)
+        stats.pop('total_flush_time')
+        return stats
+
+    def _on_tick(self):
+        self.flush()
+
+    def close(self):
+        """Останавливает фоновую запись и сбрасывает буфер"""
+        self._stop_worker()
+        self.flush()
@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+
+class DrainCheckpoint:
+    """
+    Контрольная точка при плавной остановке бота.
+
+    Сохраняет порядок очереди, отложенные повторы с историей попыток и
+    запросы, которые бот еще генерирует (слот, модель, ID сообщений для
+    сопоставления ответа, исходный текст промпта для восстановления строки
+    таблицы). При следующем запуске эти запросы не помечаются
+    как ошибка, а снова ожидают видео, поэтому оплаченные генерации не
+    пропадают. Файл читается один раз и переименовывается в .loaded.
+    """
+
+    def __init__(self, checkpoint_file, logger=None):
+        self.checkpoint_file = checkpoint_file
+        self.logger = logger
+
+    def save(self, job_queue, retry_scheduler, accounts):
+        """
+        Атомарно записывает контрольную точку
+
+        Args:
+            job_queue: Очередь промптов (JobQueue)
+            retry_scheduler: Планировщик повторов (RetryScheduler)
+            accounts: Аккаунты (BotAccount) с активными запросами
+
+        Returns:
+            dict: Сохраненное состояние
+        """
+        now = time.time()
+        in_flight = []
+        for account in accounts:
+            for slot, request in account.message_monitor.active_requests.items():
+                in_flight.append({
+                    'api_id': account.api_id,
+                    'slot': slot,
+                    'prompt_id': request['prompt_id'],
+                    'prompt': request['prompt'],
+                    'source_prompt': request.get('source_prompt') or request['prompt'],
+                    'model': request['model'],
+                    'start_time': request['start_time'],
+                    'sent_message_id': request.get('sent_message_id'),
+                    'status_message_id': request.get('status_message_id'),
+                    'accepted': request.get('accepted', False),
+                })
+        state = {
+            'time': now,
+            'queue': job_queue.ids(),
+            'retries': [{'id': prompt_data['id'], 'due': now + delay}
+                        for prompt_data, delay in retry_scheduler.pending()],
+            'history': retry_scheduler.history,
+            'in_flight': in_flight,
+        }
+
+        tmp_file = self.checkpoint_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_file, self.checkpoint_file)
+
+        message = (f"Сохранена контрольная точка {self.checkpoint_file}: в очереди {len(state['queue'])}, "
+                   f"ожидают повтора {len(state['retries'])}, в работе {len(in_flight)}")
+        print(message)
+        if self.logger:
+            self.logger.log_app_event("CHECKPOINT_SAVED", message)
+        return state
+
+    def load(self):
+        """
+        Читает контрольную точку прошлого запуска
+
+        Returns:
+            dict: Состояние или None, если контрольной точки нет
+        """
+        if not os.path.exists(self.checkpoint_file):
+            return None
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            if self.logger:
+                self.logger.log_exception(e, context="При чтении контрольной точки")
+            return None
+        os.replace(self.checkpoint_file, self.checkpoint_file + '.loaded')
+
+        if self.logger:
+            self.logger.log_app_event("CHECKPOINT_LOADED", f"Загружена контрольная точка {self.checkpoint_file}",
+                                      extra_info={"queue": len(state.get('queue', [])),
+                                                  "retries": len(state.get('retries', [])),
+                                                  "in_flight": len(state.get('in_flight', []))})
+        return state
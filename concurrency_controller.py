@@ -0,0 +1,75 @@
+class AIMDController:
+    """
+    Адаптивный лимит одновременных запросов для каждой модели (AIMD).
+
+    Окно модели растет на increase / окно после каждого запроса, принятого
+    ботом (примерно +increase за каждые "окно" успешных запросов), и умножается
+    на decrease, когда бот отвечает сообщением о лимите. Так промпты
+    отправляются с максимальной параллельностью, которую допускает бот.
+    """
+
+    def __init__(self, initial_windows=None, default_window=2, max_window=8, min_window=1,
+                 increase=1.0, decrease=0.5, logger=None):
+        """
+        Args:
+            initial_windows: Словарь {модель: начальное окно}
+            default_window: Начальное окно для остальных моделей
+            max_window: Максимальное окно
+            min_window: Минимальное окно
+            increase: Прирост окна за окно успешных запросов
+            decrease: Множитель окна при сообщении о лимите
+            logger: Логгер для записи событий
+        """
+        self.initial_windows = dict(initial_windows or {})
+        self.default_window = default_window
+        self.max_window = max_window
+        self.min_window = min_window
+        self.increase = increase
+        self.decrease = decrease
+        self.logger = logger
+        self.windows = {}  # модель: текущее окно
+
+    def window(self, model):
+        """Возвращает текущее окно модели"""
+        if model not in self.windows:
+            initial = self.initial_windows.get(model, self.default_window)
+            self.windows[model] = float(min(self.max_window, max(self.min_window, initial)))
+        return self.windows[model]
+
+    def limit(self, model):
+        """Возвращает допустимое количество одновременных запросов для модели"""
+        return max(self.min_window, self._whole(self.window(model)))
+
+    def record_success(self, model):
+        """Бот принял запрос - аддитивно увеличиваем окно"""
+        window = self.window(model)
+        new_window = min(self.max_window, window + self.increase / window)
+        self._set_window(model, window, new_window, "success")
+
+    def record_limit(self, model):
+        """Бот сообщил о лимите - мультипликативно уменьшаем окно"""
+        window = self.window(model)
+        new_window = max(self.min_window, window * self.decrease)
+        self._set_window(model, window, new_window, "limit")
+
+    @staticmethod
+    def _whole(window):
+        # Сумма дробных приростов может оказаться чуть меньше целого числа
+        return int(window + 1e-9)
+
+    def _set_window(self, model, old_window, new_window, reason):
+        self.windows[model] = new_window
+        if self._whole(new_window) != self._whole(old_window):
+            message = f"Окно модели {model}: {self._whole(old_window)} -> {self._whole(new_window)}"
+            print(message)
+            if self.logger:
+                self.logger.log_app_event("AIMD_WINDOW", message,
+                                          extra_info={"model": model, "window": round(new_window, 2),
+                                                      "reason": reason})
+
+    def get_metrics(self):
+        """
+        Returns:
+            dict: {модель: текущее окно}
+        """
+        return {model: round(window, 2) for model, window in self.windows.items()}
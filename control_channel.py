@@ -0,0 +1,81 @@
+import asyncio
+
+
+class ControlChannel:
+    """
+    Канал команд оператора.
+
+    Принимает текстовые команды по TCP на локальном порту (control_port), не
+    блокируя цикл событий. Подключиться можно, например, так:
+
+        telnet 127.0.0.1 8765
+
+    Каждая строка - команда с аргументами через пробел, ответ возвращается
+    одной или несколькими строками. Набор команд задается словарем
+    {имя: async функция(args) -> str}.
+    """
+
+    def __init__(self, commands, port, host='127.0.0.1', logger=None):
+        self.commands = commands
+        self.port = port
+        self.host = host
+        self.logger = logger
+        self.server = None
+
+    async def start(self):
+        """Запускает сервер команд"""
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        message = f"Канал управления запущен на {self.host}:{self.port} (команда help - список команд)"
+        print(message)
+        if self.logger:
+            self.logger.log_app_event("CONTROL_START", message)
+
+    async def execute(self, line):
+        """
+        Выполняет одну команду
+
+        Args:
+            line: Строка команды, например 'pause 1 600'
+
+        Returns:
+            str: Ответ
+        """
+        parts = line.split()
+        if not parts:
+            return ''
+        name, args = parts[0].lower(), parts[1:]
+        if name == 'help':
+            return 'Команды: ' + ', '.join(sorted(self.commands)) + ', help'
+        command = self.commands.get(name)
+        if not command:
+            return f"Неизвестная команда {name}"
+
+        if self.logger:
+            self.logger.log_app_event("CONTROL_COMMAND", f"Команда оператора: {line}")
+        try:
+            return await command(args)
+        except Exception as e:
+            if self.logger:
+                self.logger.log_exception(e, context=f"При выполнении команды {line}")
+            return f"Ошибка: {e}"
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.execute(line.decode('utf-8', errors='replace').strip())
+                if response:
+                    writer.write((response + '\n').encode('utf-8'))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        """Останавливает сервер команд"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
@@ -0,0 +1,128 @@
+class FailurePolicy:
+    """
+    Политика обработки неудачных промптов без участия оператора.
+
+    Для каждого класса отказа в конфиге задается действие:
+
+        on_error=retry:2          # повторить до 2 раз в том же слоте
+        on_timeout=requeue        # вернуть в очередь с задержкой по расписанию backoff_timeout
+        on_download=requeue:300   # вернуть в очередь через 300 секунд
+        on_send_failed=pause:600  # приостановить модель на 600 секунд
+        on_exhausted=skip         # что делать, когда повторы исчерпаны
+
+    Действия: retry[:N], skip, requeue[:секунды], pause[:секунды] (pause без
+    срока - на DEFAULT_PAUSE_SECONDS). Промпт возвращается в очередь (requeue
+    или pause) не больше max_requeues раз, кроме отказов из-за лимитов бота и
+    Telegram, которые не зависят от самого промпта. Если после этого и
+    on_exhausted возвращает промпт в очередь, промпт пропускается.
+    """
+
+    ERROR = 'error'              # Бот сообщил об ошибке генерации
+    TIMEOUT = 'timeout'          # Видео не получено за wait_time_minutes
+    SEND_FAILED = 'send_failed'  # Не удалось отправить промпт
+    LIMIT = 'limit'              # Бот отклонил запрос из-за лимита модели
+    DOWNLOAD = 'download'        # Видео получено, но не скачалось
+    FLOOD_WAIT = 'flood_wait'    # Telegram ограничил частоту запросов (FloodWait)
+    FAILURE_CLASSES = (ERROR, TIMEOUT, SEND_FAILED, LIMIT, DOWNLOAD, FLOOD_WAIT)
+    RATE_LIMIT_CLASSES = (LIMIT, FLOOD_WAIT)
+
+    RETRY = 'retry'
+    SKIP = 'skip'
+    REQUEUE = 'requeue'
+    PAUSE = 'pause'
+    ACTIONS = (RETRY, SKIP, REQUEUE, PAUSE)
+
+    DEFAULTS = {
+        ERROR: 'retry:1',
+        TIMEOUT: 'requeue',
+        SEND_FAILED: 'retry:2',
+        LIMIT: 'requeue',
+        DOWNLOAD: 'retry:1',
+        FLOOD_WAIT: 'requeue',
+    }
+    DEFAULT_EXHAUSTED = 'skip'
+    DEFAULT_PAUSE_SECONDS = 600
+
+    def __init__(self, rules=None, exhausted=DEFAULT_EXHAUSTED, max_requeues=5):
+        """
+        Args:
+            rules: Словарь {класс отказа: действие}, например {'error': 'retry:2'}
+            exhausted: Действие после исчерпания повторов (skip, requeue или pause)
+            max_requeues: Сколько раз промпт можно вернуть в очередь (0 - без ограничения)
+        """
+        self.rules = {}
+        for failure_class in self.FAILURE_CLASSES:
+            self.rules[failure_class] = self.parse_action((rules or {}).get(failure_class) or self.DEFAULTS[failure_class])
+        self.exhausted = self.parse_action(exhausted)
+        if self.exhausted[0] == self.RETRY:
+            raise ValueError("on_exhausted не может быть retry")
+        self.max_requeues = max_requeues
+
+    @classmethod
+    def from_config(cls, config):
+        """Создает политику по ключам on_<класс отказа>, on_exhausted и max_requeues"""
+        rules = {failure_class: config.get(f'on_{failure_class}', '').strip()
+                 for failure_class in cls.FAILURE_CLASSES}
+        return cls(rules, config.get('on_exhausted', '').strip() or cls.DEFAULT_EXHAUSTED,
+                   int(config.get('max_requeues', '5')))
+
+    @classmethod
+    def parse_action(cls, value):
+        """
+        Разбирает действие вида 'retry:2'
+
+        Returns:
+            tuple: (действие, число)
+        """
+        action, _, number = value.strip().lower().partition(':')
+        if action not in cls.ACTIONS:
+            raise ValueError(f"Неизвестное действие политики отказов: {value}")
+        try:
+            number = float(number) if number else (1 if action == cls.RETRY else 0)
+        except ValueError:
+            raise ValueError(f"Неверное значение в действии политики отказов: {value}")
+        if action == cls.PAUSE:
+            # Пауза без срока остановила бы модель до команды оператора
+            number = number or cls.DEFAULT_PAUSE_SECONDS
+            if number < 0:
+                raise ValueError(f"Длительность паузы должна быть положительной: {value}")
+        return action, number
+
+    def classify(self, status, reason=None):
+        """
+        Определяет класс отказа по статусу промпта после неудачной попытки
+
+        Args:
+            status: Статус промпта в таблице
+            reason: Класс отказа, записанный монитором сообщений (если есть)
+        """
+        if reason in self.FAILURE_CLASSES:
+            return reason
+        if status == self.ERROR:
+            return self.ERROR
+        if status == self.TIMEOUT:
+            return self.TIMEOUT
+        return self.SEND_FAILED
+
+    def decide(self, failure_class, attempt, requeues=0):
+        """
+        Выбирает действие для отказа
+
+        Args:
+            failure_class: Класс отказа
+            attempt: Номер неудачной попытки промпта в этом слоте (с 1)
+            requeues: Сколько раз промпт уже возвращался в очередь (requeue и pause)
+
+        Returns:
+            tuple: (действие, число)
+        """
+        action, number = self.rules[failure_class]
+        if action == self.RETRY and attempt > number:
+            action, number = self.exhausted
+        if (action in (self.REQUEUE, self.PAUSE) and self.max_requeues and requeues >= self.max_requeues
+                and failure_class not in self.RATE_LIMIT_CLASSES):
+            action, number = self.exhausted
+            if action in (self.REQUEUE, self.PAUSE):
+                # Возвраты в очередь исчерпаны - промпт больше не повторяется
+                return self.SKIP, 0
+        return action, number
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+
+class GenerationStats:
+    """
+    Время генерации видео по моделям.
+
+    Хранит последние window длительностей от отправки промпта до получения
+    видео для каждой модели и по ним выбирает таймаут модели: заданный
+    перцентиль, умноженный на запас margin, в пределах min_timeout..max_timeout.
+    Пока замеров меньше min_samples, используется общий wait_time_minutes.
+    Замеры сохраняются в файл, поэтому после перезапуска таймауты не
+    приходится подбирать заново. Файл записывается не чаще раза в
+    save_interval секунд в фоновом потоке и при завершении бота (save).
+    """
+
+    def __init__(self, stats_file=None, window=200, percentile=95, margin=1.5, min_samples=10,
+                 min_timeout=180, max_timeout=3600, adaptive=True, save_interval=60, logger=None):
+        """
+        Args:
+            stats_file: Файл для сохранения замеров (None - не сохранять)
+            window: Сколько последних замеров хранить для каждой модели
+            percentile: Перцентиль длительности для таймаута (0-100)
+            margin: Множитель запаса к перцентилю
+            min_samples: Минимум замеров для собственного таймаута модели
+            min_timeout: Минимальный таймаут в секундах
+            max_timeout: Максимальный таймаут в секундах
+            adaptive: Выбирать таймауты по замерам (замеры собираются в любом случае)
+            save_interval: Как часто записывать замеры в файл (секунды)
+            logger: Логгер для записи событий
+        """
+        if not 0 < percentile <= 100:
+            raise ValueError("timeout_percentile должен быть от 0 до 100")
+        self.stats_file = stats_file
+        self.window = window
+        self.percentile = percentile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.adaptive = adaptive
+        self.save_interval = save_interval
+        self.logger = logger
+        self.durations = {}  # модель: deque длительностей в секундах
+        self.dirty = False  # Есть замеры, не записанные в файл
+        self._saved_at = time.monotonic()
+        self._save_lock = threading.Lock()  # Записи из фонового потока и при завершении не пересекаются
+        self.load()
+
+    @classmethod
+    def from_config(cls, config, logger=None):
+        """Создает статистику по ключам adaptive_timeout, timeout_* и generation_stats_file"""
+        stats_file = os.path.join(config.get('downloads_path', 'downloaded_videos'),
+                                  config.get('generation_stats_file', 'generation_stats.json'))
+        return cls(stats_file,
+                   window=int(config.get('timeout_window', '200')),
+                   percentile=float(config.get('timeout_percentile', '95')),
+                   margin=float(config.get('timeout_margin', '1.5')),
+                   min_samples=int(config.get('timeout_min_samples', '10')),
+                   min_timeout=float(config.get('timeout_min_minutes', '3')) * 60,
+                   max_timeout=float(config.get('timeout_max_minutes', '60')) * 60,
+                   adaptive=config.get('adaptive_timeout', 'false').strip().lower() == 'true',
+                   save_interval=float(config.get('generation_stats_save_seconds', '60')),
+                   logger=logger)
+
+    def load(self):
+        """Загружает сохраненные замеры"""
+        if not self.stats_file or not os.path.exists(self.stats_file):
+            return
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for model, durations in saved.get('durations', {}).items():
+            self.durations[model] = deque((float(value) for value in durations), maxlen=self.window)
+
+    def _snapshot(self):
+        """Копирует замеры для записи (в потоке цикла событий)"""
+        self.dirty = False
+        self._saved_at = time.monotonic()
+        return {'durations': {model: [round(value, 1) for value in durations]
+                              for model, durations in self.durations.items()}}
+
+    def _write(self, snapshot):
+        """Атомарно записывает копию замеров в файл"""
+        try:
+            with self._save_lock:
+                tmp_file = self.stats_file + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, ensure_ascii=False)
+                os.replace(tmp_file, self.stats_file)
+        except OSError as e:
+            if self.logger:
+                self.logger.log_exception(e, context="При сохранении статистики времени генерации")
+
+    def save(self):
+        """Сохраняет замеры, если есть незаписанные (вызывается при завершении)"""
+        if self.stats_file and self.dirty:
+            self._write(self._snapshot())
+
+    def record(self, model, duration):
+        """Добавляет замер времени генерации модели; файл обновляется не чаще раза в save_interval секунд"""
+        self.durations.setdefault(model, deque(maxlen=self.window)).append(duration)
+        self.dirty = True
+        if not self.stats_file or time.monotonic() - self._saved_at < self.save_interval:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        # Запись файла не блокирует цикл событий
+        loop.run_in_executor(None, self._write, self._snapshot())
+
+    def quantile(self, model, percentile):
+        """
+        Returns:
+            float: Перцентиль длительности модели или None, если замеров нет
+        """
+        durations = sorted(self.durations.get(model, ()))
+        if not durations:
+            return None
+        # Метод ближайшего ранга
+        rank = max(1, math.ceil(percentile / 100 * len(durations)))
+        return durations[rank - 1]
+
+    def timeout(self, model, default):
+        """
+        Возвращает таймаут ожидания видео для модели
+
+        Args:
+            model: Название модели
+            default: Таймаут по умолчанию (wait_time_minutes) в секундах
+        """
+        if not self.adaptive or len(self.durations.get(model, ())) < self.min_samples:
+            return default
+        timeout = self.quantile(model, self.percentile) * self.margin
+        return min(self.max_timeout, max(self.min_timeout, timeout))
+
+    def get_metrics(self):
+        """
+        Returns:
+            dict: {модель: {'samples', 'p50', 'p95', 'timeout'}} (секунды)
+        """
+        metrics = {}
+        for model, durations in self.durations.items():
+            metrics[model] = {'samples': len(durations),
+                              'p50': round(self.quantile(model, 50), 1),
+                              'p95': round(self.quantile(model, 95), 1),
+                              'timeout': round(self.timeout(model, 0), 1) or None}
+        return metrics
@@ -8,18 +8,111 @@ class ConfigInitializer:
 api_id=YOUR_API_ID
 api_hash=YOUR_API_HASH
 bot_name=@syntxaibot
+# Несколько аккаунтов в одном процессе: api_id:api_hash через запятую (пусто = api_id и api_hash)
+accounts=
 
 # Пути к файлам и папкам
 downloads_path=downloaded_videos
 prompts_file=prompt.txt
 table_file=prompts_table.csv
 
+# Возобновление: сохранять завершенные промпты прошлого запуска вместо очистки таблицы
+resume=false
+
+# Потоковое чтение промптов с сохранением позиции в файле
+stream_prompts=false
+ingest_batch_size=100
+prompt_cursor_file=prompt_cursor.json
+
+# Очередь с приоритетами: сколько секунд ожидания дает один уровень приоритета, сколько промптов
+# просматривается, если модели первого заняты, файл срочных промптов (пусто = выключено)
+queue_aging_seconds=600
+queue_lookahead=100
+urgent_prompts_file=
+urgent_priority=100
+
+# Хранилище таблицы промптов: csv, sqlite или journal
+storage_backend=csv
+table_db_file=prompts_table.db
+journal_file=prompts_table.journal
+journal_compact_interval=60
+journal_fsync=false
+
+# Отложенная запись CSV (0 = записывать при каждом изменении)
+write_flush_interval=0
+write_flush_max_dirty=100
+
+# Общая очередь для нескольких процессов (пусто = выключено)
+shared_queue_file=
+shared_queue_lease_seconds=300
+worker_id=
+
 # Настройки генерации
 model_number=1
 parallel_requests=1
+# Конвейер: parallel_requests ограничивает только отправку, число видео в работе - лимиты моделей
+pipeline_mode=false
+# Лимит одновременных запросов для модели: по умолчанию и по номерам моделей (например 1:2,4:3)
+model_concurrency_default=2
+model_concurrency=
+# Адаптивный лимит (AIMD): окно растет, пока бот принимает запросы, и уменьшается при сообщении о лимите
+adaptive_concurrency=false
+aimd_max_window=8
+aimd_increase=1
+aimd_decrease=0.5
+# Маршрутизация по нескольким моделям (номера через запятую, пусто = все модели)
+model_routing=false
+routing_models=
 wait_time_minutes=20
+# Таймаут модели по времени генерации: перцентиль * запас, в пределах timeout_min_minutes..timeout_max_minutes
+adaptive_timeout=false
+timeout_percentile=95
+timeout_margin=1.5
+timeout_min_samples=10
+timeout_min_minutes=3
+timeout_max_minutes=60
+generation_stats_file=generation_stats.json
+generation_stats_save_seconds=60
 retry_attempts=3
 
+# Политика отказов: retry[:N], skip, requeue[:секунды], pause[:секунды]
+on_error=retry:1
+on_timeout=requeue
+on_send_failed=retry:2
+on_limit=requeue
+on_download=retry:1
+on_flood_wait=requeue
+on_exhausted=skip
+max_requeues=5
+# Расписание задержек повторов для requeue без числа: база:множитель:максимум (секунды)
+backoff_error=30:2:900
+backoff_timeout=300:2:3600
+backoff_send_failed=10:2:300
+backoff_limit=15:2:300
+backoff_download=30:2:600
+backoff_flood_wait=60:2:3600
+backoff_jitter=0.2
+
+# Ожидание ответа бота на выбор модели перед отправкой промпта (секунды) и, при необходимости,
+# фрагменты текста этого ответа через запятую (пусто - подходит любой ответ, кроме меню и статусов)
+model_ack_timeout=10
+model_ack_messages=
+
+# Ограничение частоты исходящих сообщений (сообщений в секунду и подряд) для чата и всего аккаунта
+send_rate_per_chat=1
+send_burst_per_chat=3
+send_rate_per_account=2
+send_burst_per_account=5
+# FloodWait дольше этого времени (секунды) не пережидается, а передается политике отказов
+flood_wait_max_seconds=300
+
+# Порт канала управления (0 = выключен), команды: status, pause, resume, skip, stop, drain
+control_port=0
+
+# Плавная остановка по SIGINT/SIGTERM: сколько ждать видео в работе и куда сохранить контрольную точку
+drain_timeout_minutes=30
+checkpoint_file=drain_checkpoint.json
+
 # Настройки логирования
 log_level=INFO
 log_file=bot.log
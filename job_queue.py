@@ -0,0 +1,183 @@
+import heapq
+import itertools
+import time
+from datetime import datetime
+from prompt_reader import split_prompt_meta
+
+
+class JobQueue:
+    """
+    Очередь промптов на куче с приоритетами, дедлайнами и старением.
+
+    Порядок определяется ключом в секундах: время постановки в очередь минус
+    priority * aging_seconds. Один уровень приоритета равен aging_seconds
+    ожидания, поэтому промпты с низким приоритетом со временем все равно
+    обгоняют новые. Промпт с дедлайном получает ключ не позже, чем
+    deadline - deadline_lead (время на генерацию). Возвращенный в очередь
+    промпт сохраняет свой ключ и не теряет накопленный возраст.
+    Добавление и извлечение выполняются за O(log n), снятие с очереди - за
+    O(1): запись кучи помечается как снятая и пропускается при извлечении.
+    """
+
+    def __init__(self, aging_seconds=600, deadline_lead=1200):
+        self.aging_seconds = aging_seconds
+        self.deadline_lead = deadline_lead
+        self._heap = []  # [ключ, порядковый номер, строка промпта или None у снятой записи]
+        self._entries = {}  # prompt_id: действующая запись кучи
+        self._keys = {}  # prompt_id: ключ
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def _discard_removed(self):
+        while self._heap and self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+
+    def _add(self, key, prompt_data):
+        """Кладет промпт в кучу, заменяя его прежнюю запись"""
+        self._remove_entry(prompt_data['id'])
+        entry = [key, next(self._counter), prompt_data]
+        self._entries[prompt_data['id']] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _remove_entry(self, prompt_id):
+        """Помечает запись промпта как снятую; возвращает True, если промпт был в очереди"""
+        entry = self._entries.pop(prompt_id, None)
+        if entry is None:
+            return False
+        entry[2] = None
+        # Когда снятых записей становится больше действующих, куча перестраивается
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [item for item in self._heap if item[2] is not None]
+            heapq.heapify(self._heap)
+        return True
+
+    @staticmethod
+    def parse_deadline(value):
+        """Разбирает дедлайн вида '2026-10-20 18:00' в timestamp (None, если не указан или неверен)"""
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+
+    def make_key(self, prompt_data, priority=None, deadline=None, enqueued_at=None):
+        """
+        Вычисляет ключ промпта
+
+        Args:
+            prompt_data: Строка промпта
+            priority: Приоритет (по умолчанию из строки '#priority:' промпта или 0)
+            deadline: Дедлайн, timestamp (по умолчанию из строки '#deadline:' промпта)
+            enqueued_at: Время постановки в очередь (по умолчанию текущее)
+
+        Returns:
+            float: Ключ (меньше - раньше)
+        """
+        meta, _ = split_prompt_meta(prompt_data['prompt'])
+        if priority is None:
+            try:
+                priority = float(meta.get('priority') or 0)
+            except ValueError:
+                priority = 0
+        if deadline is None:
+            deadline = self.parse_deadline(meta.get('deadline'))
+
+        key = (enqueued_at or time.time()) - priority * self.aging_seconds
+        if deadline is not None:
+            key = min(key, deadline - self.deadline_lead)
+        return key
+
+    def push(self, prompt_data, priority=None, deadline=None):
+        """Добавляет промпт в очередь"""
+        key = self.make_key(prompt_data, priority, deadline)
+        self._keys[prompt_data['id']] = key
+        self._add(key, prompt_data)
+
+    def raise_priority(self, prompt_id, priority):
+        """
+        Повышает приоритет промпта, который уже ждет в очереди (ключ не становится позже)
+
+        Returns:
+            bool: True, если промпт был в очереди
+        """
+        entry = self._entries.get(prompt_id)
+        if entry is None:
+            return False
+        key = min(entry[0], self.make_key(entry[2], priority))
+        self._keys[prompt_id] = key
+        self._add(key, entry[2])
+        return True
+
+    def extend(self, rows, priority=None):
+        """Добавляет несколько промптов"""
+        for row in rows:
+            self.push(row, priority)
+
+    def requeue(self, prompt_data):
+        """Возвращает промпт в очередь с прежним ключом"""
+        key = self._keys.get(prompt_data['id'])
+        if key is None:
+            self.push(prompt_data)
+            return
+        self._add(key, prompt_data)
+
+    def peek(self):
+        """Возвращает первый промпт, не извлекая его"""
+        self._discard_removed()
+        return self._heap[0][2] if self._heap else None
+
+    def pop(self):
+        """Извлекает первый промпт"""
+        self._discard_removed()
+        prompt_data = heapq.heappop(self._heap)[2]
+        del self._entries[prompt_data['id']]
+        return prompt_data
+
+    def pop_first(self, select, limit):
+        """
+        Извлекает первый из limit промптов в начале очереди, для которого select
+        возвращает значение
+
+        Пропущенные промпты остаются в очереди со своими ключами: заблокированный
+        первый промпт не задерживает остальные, но и не теряет своего места.
+
+        Returns:
+            tuple: (строка промпта, результат select) или (None, None)
+        """
+        skipped = []
+        try:
+            while len(skipped) < limit:
+                self._discard_removed()
+                if not self._heap:
+                    break
+                entry = heapq.heappop(self._heap)
+                result = select(entry[2])
+                if result:
+                    del self._entries[entry[2]['id']]
+                    return entry[2], result
+                skipped.append(entry)
+        finally:
+            for entry in skipped:
+                heapq.heappush(self._heap, entry)
+        return None, None
+
+    def remove(self, prompt_id):
+        """Снимает промпт с очереди"""
+        if self._remove_entry(prompt_id):
+            self._keys.pop(prompt_id, None)
+            return True
+        return False
+
+    def forget(self, prompt_id):
+        """Удаляет сохраненный ключ промпта, обработка которого завершена"""
+        self._keys.pop(prompt_id, None)
+
+    def ids(self):
+        """Возвращает ID промптов в порядке отправки"""
+        return [entry[2]['id'] for entry in sorted(self._entries.values())]
@@ -0,0 +1,162 @@
+import csv
+import json
+import os
+from table_manager import MemoryTableManager
+
+
+class JournalTableManager(MemoryTableManager):
+    """
+    Менеджер таблицы промптов с журналом изменений.
+
+    Каждое изменение статуса дописывается одной записью в журнал, чтения
+    обслуживаются из памяти, а фоновая компакция периодически сворачивает
+    журнал в снимок prompts_table.csv. При сбое теряется не больше последней записи.
+    """
+
+    def __init__(self, config):
+        base_path = config.get('downloads_path', 'downloaded_videos')
+        os.makedirs(base_path, exist_ok=True)
+        self.journal_file = os.path.join(base_path, config.get('journal_file', 'prompts_table.journal'))
+        self.compacting_file = self.journal_file + '.compacting'
+        self.compact_interval = float(config.get('journal_compact_interval', '60'))
+        self.fsync = config.get('journal_fsync', 'false').strip().lower() == 'true'
+
+        self._journal = None
+        self._journal_records = 0
+
+        super().__init__(config)
+        self._start_worker(self.compact_interval, 'journal-compactor')
+
+    def _open_journal(self, mode='a'):
+        """Открывает журнал для дозаписи"""
+        if self._journal:
+            self._journal.close()
+        self._journal = open(self.journal_file, mode, encoding='utf-8')
+        if mode == 'w':
+            self._journal_records = 0
+
+    def _persist_update(self, prompt_id, record):
+        """Дописывает запись в журнал"""
+        self._append_record(record)
+
+    def _persist_rows(self, rows):
+        """Дописывает новые строки в журнал"""
+        for row in rows:
+            # Номер вхождения ID делает повторное применение записи безопасным
+            occurrence = next(n for n, other in enumerate(self._rows_by_id(row.id)) if other is row)
+            self._append_record({'op': 'add', 'n': occurrence, **row})
+
+    def _append_record(self, record):
+        """Дописывает одну запись в журнал"""
+        self._journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._journal_records += 1
+
+    def _apply_record(self, record):
+        """Применяет запись журнала к строкам в памяти"""
+        if record.get('op') == 'add':
+            # Строка уже есть в снимке: сбой произошел после записи снимка,
+            # но до удаления свернутого журнала
+            occurrence = record.get('n')
+            if occurrence is None or len(self._rows_by_id(record['id'])) <= occurrence:
+                self._add_rows([record])
+            return
+        for row in self._rows_by_id(record['id']):
+            self._update_row(row, lambda r: self._apply_fields(r, record))
+
+    @staticmethod
+    def _apply_fields(row, record):
+        """Переносит непустые поля записи журнала в строку"""
+        for field, value in record.items():
+            if field != 'id' and value:
+                row[field] = value
+        row['status'] = record['status']
+
+    def _load_existing(self):
+        """Восстанавливает таблицу прошлого запуска из снимка и журнала"""
+        self.recover()
+
+    def recover(self):
+        """
+        Восстанавливает состояние из снимка и журнала
+
+        Returns:
+            list: Восстановленные строки таблицы
+        """
+        with self._lock:
+            if self._journal is None:
+                self._open_journal('a')
+            rows = []
+            if os.path.exists(self.table_file):
+                with open(self.table_file, 'r', encoding='utf-8') as f:
+                    rows = list(csv.DictReader(f))
+            self._set_rows(rows)
+
+            for path in (self.compacting_file, self.journal_file):
+                if not os.path.exists(path):
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            self._apply_record(json.loads(line))
+                            self._journal_records += 1
+                        except (ValueError, KeyError):
+                            # Недописанная последняя запись после сбоя
+                            continue
+
+        self.compact()
+        return self._read_table()
+
+    def clear_table(self):
+        """Очищает таблицу, снимок и журнал"""
+        self._reset_dedup_index()
+        with self._snapshot_lock, self._lock:
+            self._set_rows([])
+            self._write_snapshot([])
+            self._open_journal('w')
+            if os.path.exists(self.compacting_file):
+                os.remove(self.compacting_file)
+
+    def _write_table(self, rows):
+        """Заменяет таблицу целиком и сразу записывает снимок"""
+        with self._snapshot_lock, self._lock:
+            self._set_rows(rows)
+            self._write_snapshot(self._rows)
+            self._open_journal('w')
+
+    def compact(self):
+        """Сворачивает журнал в снимок prompts_table.csv"""
+        with self._snapshot_lock:
+            with self._lock:
+                if self._journal_records == 0 and not os.path.exists(self.compacting_file):
+                    return False
+                # Переименовываем журнал: новые записи идут в новый файл, пока пишется снимок
+                self._journal.close()
+                if os.path.exists(self.compacting_file):
+                    with open(self.compacting_file, 'a', encoding='utf-8') as dst, \
+                            open(self.journal_file, 'r', encoding='utf-8') as src:
+                        dst.write(src.read())
+                    os.remove(self.journal_file)
+                else:
+                    os.replace(self.journal_file, self.compacting_file)
+                self._journal = None
+                self._open_journal('w')
+                rows = [row.copy() for row in self._rows]
+
+            self._write_snapshot(rows)
+            os.remove(self.compacting_file)
+            return True
+
+    def _on_tick(self):
+        self.compact()
+
+    def close(self):
+        """Останавливает компакцию, сворачивает журнал и закрывает файл"""
+        self._stop_worker()
+        self.compact()
+        with self._lock:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
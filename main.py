@@ -1,69 +1,112 @@
-from telethon import TelegramClient, events, sync
 import asyncio
 import logging
-from telethon.tl.types import InputPeerUser
-from navigation import TelegramNavigator
-from video_downloader import VideoDownloader
-from message_monitor import MessageMonitor
+from bot_account import BotAccount, load_accounts, select_account
 from init_config import ConfigInitializer
 from request_manager import RequestManager
-from table_manager import TableManager
+from table_manager import create_table_manager
+from async_table_manager import AsyncTableManager
 from advanced_logger import AdvancedLogger
+from prompt_reader import PromptReader
+from job_queue import JobQueue
+from shared_queue import SharedPromptQueue
+from failure_policy import FailurePolicy
+from retry_scheduler import RetryScheduler
+from generation_stats import GenerationStats
+from checkpoint import DrainCheckpoint
+from control_channel import ControlChannel
 import os
+import signal
+import time
+import uuid
 
 # Настройка логирования
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                    level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def process_prompt(prompt_data, slot, navigator, request_manager, table_manager, advanced_logger):
-    """Обрабатывает один промпт"""
+# Интервал проверки источников работы, которые не присылают событий
+# (файл срочных промптов, общая очередь других процессов)
+IDLE_POLL_SECONDS = 5
+
+async def process_prompt(prompt_data, slot, account, model, request_manager, table_manager, retry_scheduler, advanced_logger,
+                         resumed=False):
+    """
+    Обрабатывает один промпт
+
+    При resumed=True промпт уже отправлен до перезапуска, и первая попытка
+    только ожидает видео по восстановленному запросу монитора.
+    """
+    failure_policy = retry_scheduler.policy
+    attempt = 0
     try:
         while True:  # Добавляем цикл для повторных попыток
-            # Модель будет выбрана внутри navigate_and_send_prompt
-            # Отправляем промпт
-            advanced_logger.log_app_event("PROMPT_PROCESS", f"Начинаем обработку промпта {prompt_data['id']} в слоте {slot}", 
-                                        extra_info={"prompt": prompt_data['prompt'][:50]+"..."})
-            
-            success = await navigator.navigate_and_send_prompt(prompt_data, slot)
+            if resumed:
+                resumed = False
+                success = await account.navigator.collect_result(slot)
+            else:
+                # Отправляем промпт
+                advanced_logger.log_app_event("PROMPT_PROCESS", f"Начинаем обработку промпта {prompt_data['id']} в слоте {slot}", 
+                                            extra_info={"prompt": prompt_data['prompt'][:50]+"..."})
+                
+                # Общий слот (в режиме pipeline) занят только на время отправки,
+                # ожидание видео ограничивает лишь слот модели
+                async with account.scheduler.submission():
+                    if request_manager.draining:
+                        # Плавная остановка началась, пока промпт ждал отправки - он остается в очереди
+                        await request_manager.release_slot(slot)
+                        await table_manager.mark_pending(prompt_data['id'])
+                        return False
+                    success = await account.navigator.submit_prompt(prompt_data, slot, model)
+                if success:
+                    success = await account.navigator.collect_result(slot)
             
             if not success:
-                # Проверяем, не был ли промпт отмечен как pending из-за лимита
-                prompt_status = table_manager.get_status(prompt_data['id'])
-                if prompt_status['status'] == 'pending':
-                    message = f"Промпт {prompt_data['id']} не был отправлен из-за лимита в слоте {slot}"
-                    print(f"\n{message}")
-                    advanced_logger.log_app_event("LIMIT_REACHED", message, "WARNING")
-                    print(f"Автоматическое ожидание снятия лимита для данной модели...")
-                    # Освобождаем слот и отмечаем промпт как ожидающий
-                    await request_manager.release_slot(slot)
-                    return False  # Вернет промпт обратно в очередь
+                prompt_status = await table_manager.get_status(prompt_data['id'])
+                reason, detail = account.message_monitor.pop_failure(prompt_data['id'])
+                if prompt_status['status'] == 'pending' and reason is None:
+                    # Промпт не был отправлен из-за лимита модели
+                    reason = failure_policy.LIMIT
                 
-                # Для других ошибок (не связанных с лимитом) показываем меню
-                message = f"Не удалось отправить промпт {prompt_data['id']} в слоте {slot}"
+                # Действие выбирает политика отказов, задержку - расписание класса отказа
+                attempt += 1
+                failure_class = failure_policy.classify(prompt_status['status'], reason)
+                action, value = failure_policy.decide(failure_class, attempt, retry_scheduler.requeues(prompt_data['id']))
+                if action == failure_policy.RETRY and request_manager.draining:
+                    # При плавной остановке промпт не отправляется заново, а остается в очереди
+                    action, value = failure_policy.REQUEUE, 0
+                flood_seconds = float(detail) if failure_class == failure_policy.FLOOD_WAIT else 0
+                delay = 0
+                if action == failure_policy.REQUEUE and not request_manager.draining:
+                    delay = value or retry_scheduler.delay(prompt_data['id'], failure_class, flood_seconds)
+                retry_scheduler.record(prompt_data['id'], failure_class, action, delay, detail)
+                message = f"Не удалось обработать промпт {prompt_data['id']} в слоте {slot} ({failure_class}), действие: {action}"
                 print(f"\n{message}")
-                advanced_logger.log_app_event("PROMPT_ERROR", message, "ERROR")
-                print(f"Слот {slot} - Выберите действие:")
-                print("1. Повторить попытку")
-                print("2. Освободить слот и продолжить")
-                print("3. Выйти")
+                advanced_logger.log_app_event("PROMPT_FAILURE", message, "ERROR",
+                                            {"prompt_id": prompt_data['id'], "failure": failure_class,
+                                             "action": action, "value": value, "attempt": attempt,
+                                             "delay": round(delay, 1)})
                 
-                choice = input(f"Слот {slot} - Введите номер действия (1-3): ").strip()
+                if flood_seconds:
+                    # Ограничение Telegram действует на весь аккаунт
+                    for account_model in account.navigator.models.values():
+                        account.scheduler.pause(account_model, flood_seconds)
                 
-                if choice == '1':
-                    advanced_logger.log_app_event("USER_ACTION", f"Пользователь выбрал повтор отправки промпта {prompt_data['id']}")
+                if action == failure_policy.RETRY:
                     continue  # Повторяем попытку
-                elif choice == '2':
-                    advanced_logger.log_app_event("USER_ACTION", f"Пользователь выбрал пропуск промпта {prompt_data['id']}")
-                    table_manager.mark_skipped(prompt_data['id'])
-                    await request_manager.release_slot(slot)
+                
+                await request_manager.release_slot(slot)
+                if action == failure_policy.SKIP:
+                    await table_manager.mark_skipped(prompt_data['id'])
                     return False
-                elif choice == '3':
-                    advanced_logger.log_app_event("USER_ACTION", "Пользователь выбрал выход")
-                    await request_manager.release_slot(slot)
-                    return None
+                if action == failure_policy.PAUSE:
+                    account.scheduler.pause(model, value)
+                else:
+                    # Промпт вернется в очередь через колесо таймеров, не занимая слот
+                    asyncio.current_task().requeue_delay = delay
+                await table_manager.mark_pending(prompt_data['id'])
+                return False
             else:
-                table_manager.mark_completed(prompt_data['id'])
+                await table_manager.mark_completed(prompt_data['id'])
                 message = f"Промпт {prompt_data['id']} успешно обработан в слоте {slot}"
                 print(f"{message}")
                 advanced_logger.log_app_event("PROMPT_COMPLETED", message)
@@ -74,10 +117,192 @@ async def process_prompt(prompt_data, slot, navigator, request_manager, table_ma
         error_message = f"Ошибка при обработке промпта {prompt_data['id']} в слоте {slot}: {e}"
         print(f"{error_message}")
         advanced_logger.log_exception(e, context=f"При обработке промпта {prompt_data['id']} в слоте {slot}")
-        table_manager.mark_error(prompt_data['id'])
+        await table_manager.mark_error(prompt_data['id'])
         await request_manager.release_slot(slot)
         return False
 
+async def process_scheduled(account, model, prompt_data, slot, request_manager, table_manager, retry_scheduler, advanced_logger,
+                            resumed=False):
+    """Обрабатывает промпт, удерживая слот модели в планировщике аккаунта"""
+    try:
+        return await process_prompt(prompt_data, slot, account, model, request_manager, table_manager,
+                                    retry_scheduler, advanced_logger, resumed)
+    finally:
+        account.scheduler.release(model)
+
+async def requeue_prompt(prompt_data, job_queue, shared_queue):
+    """Возвращает промпт в очередь (в общей очереди - освобождает его для всех процессов)"""
+    if shared_queue:
+        await asyncio.to_thread(shared_queue.release, prompt_data['id'])
+    else:
+        job_queue.requeue(prompt_data)
+
+def load_worker_id(config, downloads_path):
+    """
+    Возвращает ID процесса в общей очереди
+
+    Берется из worker_id в конфиге, а если он не задан - создается при первом
+    запуске и сохраняется в downloads_path, чтобы после перезапуска процесс
+    сохранил свои аренды. api_id для этого не подходит: одно приложение Telegram
+    обычно используется всеми процессами.
+    """
+    worker_id = config.get('worker_id', '').strip()
+    if worker_id:
+        return worker_id
+    id_file = os.path.join(downloads_path, 'worker_id.txt')
+    if os.path.exists(id_file):
+        with open(id_file, 'r', encoding='utf-8') as f:
+            worker_id = f.read().strip()
+    if not worker_id:
+        worker_id = uuid.uuid4().hex[:12]
+        with open(id_file, 'w', encoding='utf-8') as f:
+            f.write(worker_id)
+    return worker_id
+
+def worker_file_name(file_name, worker_id):
+    """Добавляет ID процесса к имени файла: prompts_table.csv -> prompts_table_<worker_id>.csv"""
+    root, ext = os.path.splitext(file_name)
+    return f"{root}_{worker_id}{ext}"
+
+async def load_urgent_prompts(urgent_file, table_manager, job_queue, priority, advanced_logger):
+    """
+    Загружает срочные промпты, если появился файл urgent_file
+
+    Файл переименовывается перед чтением, поэтому следующую срочную партию
+    можно положить сразу после загрузки текущей.
+    """
+    if not os.path.exists(urgent_file):
+        return 0
+    loading_file = urgent_file + '.loading'
+    os.replace(urgent_file, loading_file)
+
+    reader = PromptReader(loading_file)
+    added_ids = set()
+    while not reader.exhausted:
+        rows = await table_manager.ingest_prompts(reader, 1000)
+        job_queue.extend(rows, priority)
+        added_ids.update(row['id'] for row in rows)
+    os.replace(loading_file, urgent_file + '.loaded')
+    added = len(added_ids)
+
+    # Срочный повтор промпта, который уже ждет в очереди, поднимает его приоритет
+    raised = sum(1 for prompt_id in set(reader.unfinished_ids()) - added_ids
+                 if job_queue.raise_priority(prompt_id, priority))
+
+    message = f"Загружено {added} срочных промптов из {urgent_file}"
+    if raised:
+        message += f", повышен приоритет {raised} промптов в очереди"
+    print(message)
+    advanced_logger.log_app_event("URGENT_PROMPTS", message, extra_info={"priority": priority})
+    return added
+
+def build_control_commands(accounts, table_manager, job_queue, retry_scheduler, shared_queue, stop_event, drain_event,
+                           wake_event=None):
+    """
+    Создает команды оператора для канала управления
+
+    wake_event будит основной цикл, когда команда меняет очередь или снимает паузу
+
+    Returns:
+        dict: {имя команды: async функция(args) -> str}
+    """
+    models = accounts[0].navigator.models
+
+    def model_by_number(args):
+        if not args or args[0] not in models:
+            raise ValueError(f"укажите номер модели от 1 до {len(models)}")
+        return models[args[0]]
+
+    async def status(args):
+        counts = await table_manager.count_by_status()
+        lines = [f"В очереди: {len(job_queue)}, ожидают повтора: {len(retry_scheduler)}",
+                 "Статусы: " + ", ".join(f"{name}={count}" for name, count in sorted(counts.items()))]
+        for account in accounts:
+            scheduler = account.scheduler
+            paused = [model for model in list(scheduler.paused) if scheduler.is_paused(model)]
+            sends = account.navigator.rate_limiter.get_metrics()
+            windows = scheduler.get_window_metrics()
+            lines.append(f"Аккаунт {account.api_id}: занято {sum(scheduler.active.values())} из {account.max_in_flight()}"
+                         + (f", отправляются: {scheduler.submitting}" if scheduler.pipeline else "")
+                         + (f", на паузе: {', '.join(paused)}" if paused else "")
+                         + (", окна: " + ", ".join(f"{model}={window}" for model, window in windows.items())
+                            if windows else "")
+                         + f", отправлено сообщений: {sends['sent']}, ожидание лимита: {sends['throttle_seconds']} с, "
+                         + f"FloodWait: {sends['flood_waits']}, навигация по меню: {account.navigator.navigations_sent}, "
+                         + f"пропущена: {account.navigator.navigations_skipped}, "
+                         + f"ожидание очереди отправки: {account.navigator.submit_lock_wait:.1f} с")
+        generation_stats = accounts[0].message_monitor.generation_stats
+        if generation_stats and generation_stats.adaptive:
+            lines.append("Таймауты: " + ", ".join(
+                f"{model}={accounts[0].message_monitor.get_wait_time(model) / 60:.1f} мин"
+                for model in generation_stats.durations))
+        return "\n".join(lines)
+
+    async def pause(args):
+        model = model_by_number(args)
+        seconds = float(args[1]) if len(args) > 1 else None
+        for account in accounts:
+            account.scheduler.pause(model, seconds)
+        return f"Модель {model} приостановлена" + (f" на {seconds:g} с" if seconds else "")
+
+    async def resume(args):
+        model = model_by_number(args)
+        for account in accounts:
+            account.scheduler.resume(model)
+        if wake_event:
+            wake_event.set()
+        return f"Модель {model} снова доступна"
+
+    async def skip(args):
+        if not args:
+            raise ValueError("укажите ID промпта")
+        prompt_id = args[0]
+        if not await table_manager.get_status(prompt_id):
+            return f"Промпт {prompt_id} не найден"
+        job_queue.remove(prompt_id)
+        await table_manager.mark_skipped(prompt_id)
+        if wake_event:
+            wake_event.set()
+        if shared_queue:
+            await asyncio.to_thread(shared_queue.complete, prompt_id, table_manager.STATUS_SKIPPED)
+        return f"Промпт {prompt_id} пропущен"
+
+    async def stop(args):
+        stop_event.set()
+        return "Остановка бота"
+
+    async def drain(args):
+        drain_event.set()
+        return "Плавная остановка: новые промпты не отправляются, бот дождется видео в работе"
+
+    return {'status': status, 'pause': pause, 'resume': resume, 'skip': skip, 'stop': stop, 'drain': drain}
+
+def install_signal_handlers(drain_event, stop_event):
+    """Первый SIGINT/SIGTERM включает плавную остановку, повторный - немедленную"""
+    loop = asyncio.get_running_loop()
+
+    def on_signal():
+        if drain_event.is_set():
+            stop_event.set()
+        else:
+            drain_event.set()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, on_signal)
+        except NotImplementedError:
+            # Windows: обработчик вызывается в основном потоке и передает сигнал в цикл событий
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(on_signal))
+
+async def renew_leases(shared_queue, interval, advanced_logger):
+    """Периодически продлевает аренду промптов этого процесса в общей очереди"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(shared_queue.renew)
+        except Exception as e:
+            advanced_logger.log_exception(e, context="При продлении аренды промптов в общей очереди")
+
 async def run_client():
     # Загружаем конфигурацию
     config = ConfigInitializer.load_config()
@@ -88,34 +313,33 @@ async def run_client():
     advanced_logger = AdvancedLogger(config)
     advanced_logger.log_startup()
 
-    # Инициализация клиента с уникальным именем сессии
-    session_name = f"bot_session_{config['api_id']}"
-    client = TelegramClient(session_name,
-                          int(config['api_id']),
-                          config['api_hash'])
+    # Каждый аккаунт получает свой клиент с уникальным именем сессии
+    try:
+        credentials = load_accounts(config)
+        retry_scheduler = RetryScheduler.from_config(config, FailurePolicy.from_config(config), advanced_logger)
+    except ValueError as e:
+        message = f"Ошибка: {e}"
+        print(message)
+        advanced_logger.log_app_event("CONFIG_ERROR", message, "ERROR")
+        return
+    accounts = [BotAccount(api_id, api_hash, config, advanced_logger) for api_id, api_hash in credentials]
+    table_manager = None
+    shared_queue = None
+    lease_task = None
+    control_channel = None
+    stop_waiter = None
+    drain_waiter = None
+    wake_waiter = None
+    kept_leases = set()
 
     try:
         # Подключение к Telegram с запросом номера телефона
         print("\nДля работы бота требуется войти в отдельный аккаунт Telegram.")
         print("Пожалуйста, введите номер телефона для входа:")
+        for account in accounts:
+            await account.connect()
         
-        # Запускаем клиент без автоматического входа
-        await client.connect()
-        
-        if not await client.is_user_authorized():
-            phone = input('Введите номер телефона: ')
-            await client.send_code_request(phone)
-            code = input('Введите код подтверждения: ')
-            await client.sign_in(phone, code)
-            advanced_logger.log_app_event("AUTH", "Выполнена авторизация с новыми учетными данными")
-        else:
-            advanced_logger.log_app_event("AUTH", "Использована существующая авторизация")
-        
-        # Получение информации о боте
-        bot = await client.get_input_entity(config['bot_name'])
-        advanced_logger.log_app_event("BOT_CONNECTED", f"Подключено к боту {config['bot_name']}")
-        
-        print("\nПодключено к Telegram")
+        print(f"\nПодключено к Telegram (аккаунтов: {len(accounts)})")
         
         # Создание директории для загрузки видео
         downloads_path = config.get('downloads_path', 'downloaded_videos')
@@ -123,12 +347,31 @@ async def run_client():
         if advanced_logger:
             advanced_logger.log_app_event("DIRECTORY_CHECK", f"Проверена директория для видео: {downloads_path}")
         
+        # В режиме общей очереди каждый процесс ведет свою таблицу,
+        # а промпты распределяются через общую базу
+        shared_queue_file = config.get('shared_queue_file', '').strip()
+        if shared_queue_file:
+            worker_id = load_worker_id(config, downloads_path)
+            print(f"ID процесса в общей очереди: {worker_id}")
+            advanced_logger.log_app_event("WORKER_ID", f"ID процесса в общей очереди: {worker_id}",
+                                          extra_info={"worker_id": worker_id})
+            config['table_file'] = worker_file_name(config.get('table_file', 'prompts_table.csv'), worker_id)
+            config['table_db_file'] = worker_file_name(config.get('table_db_file', 'prompts_table.db'), worker_id)
+            config['journal_file'] = worker_file_name(config.get('journal_file', 'prompts_table.journal'), worker_id)
+
         # Создание компонентов с конфигом
-        table_manager = TableManager(config)
-        video_downloader = VideoDownloader(table_manager, config, advanced_logger)
-        message_monitor = MessageMonitor(client, bot, video_downloader, config, advanced_logger)
-        await message_monitor.start_monitoring()
-        navigator = TelegramNavigator(client, bot, config, message_monitor, advanced_logger)
+        # Все операции с таблицей выполняются в отдельном потоке, не блокируя цикл событий
+        table_manager = AsyncTableManager(create_table_manager(config))
+        try:
+            # Таймауты моделей подбираются по времени генерации, накопленному и в прошлых запусках
+            generation_stats = GenerationStats.from_config(config, advanced_logger)
+            for account in accounts:
+                await account.start(table_manager, generation_stats)
+        except ValueError as e:
+            message = f"Ошибка: {e}"
+            print(message)
+            advanced_logger.log_app_event("CONFIG_ERROR", message, "ERROR")
+            return
         
         # Загружаем промпты
         prompts_file = config.get('prompts_file', 'prompt.txt')
@@ -138,79 +381,334 @@ async def run_client():
             advanced_logger.log_app_event("FILE_ERROR", message, "ERROR")
             return
             
-        table_manager.load_prompts(prompts_file)
-        
-        # Инициализация менеджера запросов
-        max_slots = int(config.get('parallel_requests', '1'))
-        if max_slots not in [1, 2]:
-            message = "Ошибка: parallel_requests должно быть 1 или 2"
+        # Запросы, которые бот генерировал при плавной остановке, продолжают ожидать видео
+        checkpoint = DrainCheckpoint(os.path.join(downloads_path, config.get('checkpoint_file', 'drain_checkpoint.json')),
+                                     advanced_logger)
+        saved_state = checkpoint.load() or {}
+        account_by_id = {account.api_id: account for account in accounts}
+        restored = [entry for entry in saved_state.get('in_flight', []) if entry.get('api_id') in account_by_id]
+        keep = {entry['prompt_id'] for entry in restored}
+
+        # В потоковом режиме промпты дочитываются из файла по мере освобождения очереди
+        prompt_reader = None
+        ingest_batch_size = int(config.get('ingest_batch_size', '100'))
+        if shared_queue_file:
+            lease_seconds = float(config.get('shared_queue_lease_seconds', '300'))
+            shared_queue = SharedPromptQueue(shared_queue_file, worker_id, lease_seconds)
+            added = await asyncio.to_thread(shared_queue.populate, prompts_file)
+            message = f"Общая очередь {shared_queue_file}: добавлено {added} новых промптов, процесс {worker_id}"
             print(message)
-            advanced_logger.log_app_event("CONFIG_ERROR", message, "ERROR")
-            return
+            advanced_logger.log_app_event("SHARED_QUEUE", message)
+            lease_task = asyncio.create_task(renew_leases(shared_queue, lease_seconds / 3, advanced_logger))
+        elif config.get('stream_prompts', 'false').lower() == 'true':
+            cursor_file = os.path.join(downloads_path, config.get('prompt_cursor_file', 'prompt_cursor.json'))
+            prompt_reader = PromptReader(prompts_file, cursor_file)
+            if prompt_reader.offset:
+                advanced_logger.log_app_event("PROMPTS_RESUME", f"Чтение промптов продолжается с позиции {prompt_reader.offset}")
+            if table_manager.resume:
+                requeued = await table_manager.requeue_unfinished(keep)
+                advanced_logger.log_app_event("PROMPTS_RESUME", f"Возвращено в очередь {requeued} незавершенных промптов")
+        else:
+            await table_manager.load_prompts(prompts_file)
+        
+        # Номера слотов общие для всех аккаунтов, лимиты - у каждого аккаунта свои.
+        # В режиме pipeline слотов столько, сколько запросов в работе позволяют лимиты моделей
+        max_slots = sum(account.max_in_flight() for account in accounts)
         request_manager = RequestManager(max_slots, table_manager)
 
+        # Восстановленные запросы снова занимают свои слоты
+        keep = {entry['prompt_id'] for entry in restored if 0 < entry['slot'] <= max_slots}
+        for entry in restored:
+            prompt_status = await table_manager.get_status(entry['prompt_id'])
+            if entry['prompt_id'] not in keep:
+                # Слота больше нет (уменьшен parallel_requests) - промпт отправляется заново
+                if prompt_status and prompt_status['status'] not in table_manager.FINISHED_STATUSES:
+                    await table_manager.mark_pending(entry['prompt_id'])
+                continue
+            # В потоковом режиме таблица могла начаться заново, а курсор за промптом
+            # не сдвигался - дочитываем файл до него
+            while not prompt_status and prompt_reader and not prompt_reader.exhausted:
+                await table_manager.ingest_prompts(prompt_reader, ingest_batch_size)
+                prompt_status = await table_manager.get_status(entry['prompt_id'])
+            if not prompt_status:
+                # Строки нет (общая очередь без resume) - восстанавливаем ее из контрольной
+                # точки, чтобы видео не генерировалось повторно
+                await table_manager.add_prompt(entry['prompt_id'], entry.get('source_prompt') or entry['prompt'])
+            elif prompt_status['status'] in (table_manager.STATUS_COMPLETED, table_manager.STATUS_SKIPPED):
+                keep.discard(entry['prompt_id'])
+                continue
+            if not await account_by_id[entry['api_id']].scheduler.try_acquire(entry['model']):
+                # Лимит модели уменьшен после остановки - лишние промпты отправляются заново
+                keep.discard(entry['prompt_id'])
+                await table_manager.mark_pending(entry['prompt_id'])
+                continue
+            await table_manager.mark_queued(entry['prompt_id'], entry['slot'])
+            await table_manager.mark_in_progress(entry['prompt_id'], entry['model'])
+        restored = [entry for entry in restored if entry['prompt_id'] in keep]
+
         # Очищаем занятые слоты при старте
-        await message_monitor.cleanup_active_slots()
+        for account in accounts:
+            await account.message_monitor.cleanup_active_slots(keep)
+
+        # Очередь с приоритетами: промпты упорядочены по приоритету, дедлайну и времени ожидания
+        all_prompts = JobQueue(float(config.get('queue_aging_seconds', '600')),
+                               int(config.get('wait_time_minutes', '20')) * 60)
+        queue_lookahead = int(config.get('queue_lookahead', '100'))
+
+        def place_prompt(prompt_data):
+            account, model = select_account(accounts, prompt_data)
+            return (account, model) if account else None
+
+        urgent_file = config.get('urgent_prompts_file', '').strip()
+        urgent_priority = float(config.get('urgent_priority', '100'))
+
+        # Команды оператора принимаются асинхронно, не блокируя обработку
+        stop_event = asyncio.Event()
+        stop_waiter = asyncio.create_task(stop_event.wait())
+
+        # SIGINT/SIGTERM включают плавную остановку, повторный сигнал - немедленную
+        drain_event = asyncio.Event()
+        drain_waiter = asyncio.create_task(drain_event.wait())
+        drain_timeout = float(config.get('drain_timeout_minutes', '30')) * 60
+        drain_deadline = None
+        install_signal_handlers(drain_event, stop_event)
+
+        # Команды оператора будят основной цикл, не дожидаясь завершения задач
+        wake_event = asyncio.Event()
+        wake_waiter = asyncio.create_task(wake_event.wait())
+
+        control_port = int(config.get('control_port', '0'))
+        if control_port:
+            control_channel = ControlChannel(
+                build_control_commands(accounts, table_manager, all_prompts, retry_scheduler, shared_queue,
+                                       stop_event, drain_event, wake_event),
+                control_port, logger=advanced_logger)
+            await control_channel.start()
 
         # Обработка промптов
         pending_tasks = set()
-        all_prompts = table_manager.get_pending_prompts()
+        pending_prompts = await table_manager.get_pending_prompts()
+        if saved_state.get('queue'):
+            # Сохраняем порядок очереди прошлого запуска
+            order = {prompt_id: position for position, prompt_id in enumerate(saved_state['queue'])}
+            pending_prompts.sort(key=lambda row: order.get(row['id'], len(order)))
+        all_prompts.extend(pending_prompts)
+        retry_scheduler.history.update(saved_state.get('history', {}))
+        for retry in saved_state.get('retries', []):
+            if all_prompts.remove(retry['id']):
+                prompt_status = await table_manager.get_status(retry['id'])
+                retry_scheduler.schedule(prompt_status, max(0, retry['due'] - time.time()))
+
+        for entry in restored:
+            account = account_by_id[entry['api_id']]
+            prompt_status = await table_manager.get_status(entry['prompt_id'])
+            request_manager.active_slots[entry['slot']] = entry['prompt_id']
+            account.message_monitor.restore_request(entry)
+            task = asyncio.create_task(
+                process_scheduled(account, entry['model'], prompt_status, entry['slot'], request_manager,
+                                  table_manager, retry_scheduler, advanced_logger, resumed=True)
+            )
+            task.prompt_id = entry['prompt_id']
+            pending_tasks.add(task)
+        if restored:
+            message = f"Продолжено ожидание {len(restored)} видео, отправленных до перезапуска"
+            print(message)
+            advanced_logger.log_app_event("CHECKPOINT_RESUME", message)
+            # Получаем сообщения бота, пришедшие, пока бот был остановлен
+            for account in {account_by_id[entry['api_id']] for entry in restored}:
+                await account.catch_up()
+
+        if prompt_reader:
+            all_prompts.extend(await table_manager.ingest_prompts(prompt_reader, ingest_batch_size))
         print(f"Загружено {len(all_prompts)} промптов")
         advanced_logger.log_app_event("PROMPTS_LOADED", f"Загружено {len(all_prompts)} промптов")
 
-        while all_prompts or pending_tasks:
-            # Пытаемся заполнить все доступные слоты
-            while all_prompts and len(pending_tasks) < max_slots:
-                prompt_data = all_prompts.pop(0)
+        while all_prompts or pending_tasks or len(retry_scheduler) or (prompt_reader and not prompt_reader.exhausted) or shared_queue:
+            if stop_event.is_set():
+                advanced_logger.log_app_event("USER_EXIT", "Оператор остановил бота")
+                break
+
+            # Плавная остановка: новые промпты не отправляются, ждем видео в работе до дедлайна
+            draining = drain_event.is_set()
+            if draining:
+                if drain_deadline is None:
+                    drain_deadline = time.monotonic() + drain_timeout
+                    request_manager.draining = True
+                    message = (f"Плавная остановка: ожидаем {len(pending_tasks)} видео в работе "
+                               f"не дольше {drain_timeout / 60:g} мин (повторный сигнал - немедленная остановка)")
+                    print(f"\n{message}")
+                    advanced_logger.log_app_event("DRAIN_START", message)
+                if not pending_tasks or time.monotonic() >= drain_deadline:
+                    break
+
+            # Дочитываем следующую порцию промптов, когда очередь почти пуста
+            if prompt_reader and not prompt_reader.exhausted and len(all_prompts) < max_slots and not draining:
+                all_prompts.extend(await table_manager.ingest_prompts(prompt_reader, ingest_batch_size))
+
+            # Отложенные повторы, время которых наступило, возвращаются в очередь
+            if not draining:
+                for prompt_data in retry_scheduler.pop_due():
+                    prompt_status = await table_manager.get_status(prompt_data['id'])
+                    if not prompt_status or prompt_status['status'] != 'pending':
+                        continue  # Оператор пропустил промпт, пока он ждал повтора
+                    await requeue_prompt(prompt_status, all_prompts, shared_queue)
+                    advanced_logger.log_app_event("PROMPT_REQUEUED", f"Промпт {prompt_data['id']} возвращен в очередь после паузы")
+
+            # Срочные промпты встают в начало очереди без перезапуска
+            if urgent_file and not draining:
+                await load_urgent_prompts(urgent_file, table_manager, all_prompts, urgent_priority, advanced_logger)
+
+            # Забираем из общей очереди столько промптов, сколько есть свободных слотов
+            if shared_queue and not draining:
+                while len(all_prompts) + len(pending_tasks) < max_slots:
+                    job = await asyncio.to_thread(shared_queue.claim)
+                    if not job:
+                        break
+                    all_prompts.push(await table_manager.add_prompt(job['id'], job['prompt']))
+                    advanced_logger.log_app_event("SHARED_QUEUE_CLAIM", f"Промпт {job['id']} получен из общей очереди")
+
+                # Выходим, когда все промпты общей очереди получили итоговый статус
+                if not all_prompts and not pending_tasks and not await asyncio.to_thread(shared_queue.remaining):
+                    break
+
+            # Отправляем промпты, пока у какого-либо аккаунта позволяют общий лимит и лимит модели.
+            # Промпт достается наименее загруженному аккаунту. Если модели первого промпта
+            # заняты, отправляется следующий промпт, для которого есть свободная модель
+            while all_prompts and not draining:
+                prompt_data, placement = all_prompts.pop_first(place_prompt, queue_lookahead)
+                if not prompt_data:
+                    break
+                account, model = placement
+                scheduler = account.scheduler
+                await scheduler.acquire(model)
                 slot = await request_manager.acquire_slot(prompt_data['id'])
                 
                 if slot:
-                    advanced_logger.log_app_event("SLOT_ACQUIRED", f"Получен слот {slot} для промпта {prompt_data['id']}")
+                    advanced_logger.log_app_event("SLOT_ACQUIRED", f"Получен слот {slot} для промпта {prompt_data['id']}",
+                                                extra_info={"model": model, "api_id": account.api_id})
                     task = asyncio.create_task(
-                        process_prompt(prompt_data, slot, navigator, request_manager, table_manager, advanced_logger)
+                        process_scheduled(account, model, prompt_data, slot, request_manager,
+                                          table_manager, retry_scheduler, advanced_logger)
                     )
                     task.prompt_id = prompt_data['id']
                     pending_tasks.add(task)
                     continue
                 else:
                     # Если не получили слот, возвращаем промпт обратно
-                    all_prompts.insert(0, prompt_data)
+                    scheduler.release(model)
+                    all_prompts.requeue(prompt_data)
                     advanced_logger.log_app_event("SLOT_UNAVAILABLE", "Не удалось получить слот для промпта", 
                                                 "WARNING", {"prompt_id": prompt_data['id']})
                     break
 
-            if not pending_tasks:
-                await asyncio.sleep(1)
-                continue
-
-            # Ждем завершения любой задачи
+            # Ждем события: завершения задачи, команды оператора или сигнала, а также
+            # срока ближайшего повтора или окончания паузы модели. Раз в IDLE_POLL_SECONDS
+            # проверяются только источники без событий: файл срочных промптов, общая
+            # очередь других процессов и лимиты бота, если задач в работе нет
+            delays = []
+            if draining:
+                delays.append(max(0, drain_deadline - time.monotonic()))
+            else:
+                next_retry = retry_scheduler.next_delay()
+                if next_retry is not None:
+                    delays.append(next_retry)
+                if all_prompts:
+                    delays.extend(delay for delay in (account.scheduler.next_resume_delay() for account in accounts)
+                                  if delay is not None)
+                if urgent_file or shared_queue or (all_prompts and not pending_tasks):
+                    delays.append(IDLE_POLL_SECONDS)
+            # Сработавший сигнал остановки больше не ожидается, иначе цикл не засыпал бы
+            waiters = {waiter for waiter in (stop_waiter, drain_waiter, wake_waiter) if not waiter.done()}
             done, pending_tasks = await asyncio.wait(
-                pending_tasks,
+                pending_tasks | waiters,
+                timeout=min(delays) if delays else None,
                 return_when=asyncio.FIRST_COMPLETED
             )
+            for waiter in (stop_waiter, drain_waiter, wake_waiter):
+                done.discard(waiter)
+                pending_tasks.discard(waiter)
+            if wake_waiter.done():
+                wake_event.clear()
+                wake_waiter = asyncio.create_task(wake_event.wait())
 
             # Обрабатываем завершенные задачи
             for task in done:
                 try:
                     result = task.result()
-                    if result is None:  # Пользователь выбрал выход
-                        advanced_logger.log_app_event("USER_EXIT", "Пользователь выбрал выход из программы")
-                        return
-                    elif result is False:  # Ошибка обработки
-                        # Проверяем, не был ли промпт возвращен в очередь из-за лимита
-                        prompt_status = table_manager.get_status(task.prompt_id)
+                    if result is False:  # Ошибка обработки
+                        # Проверяем, не был ли промпт возвращен в очередь (лимит или политика отказов)
+                        prompt_status = await table_manager.get_status(task.prompt_id)
                         if prompt_status['status'] == 'pending':
-                            all_prompts.append(prompt_status)
-                            advanced_logger.log_app_event("PROMPT_REQUEUED", 
-                                                        f"Промпт {task.prompt_id} возвращен в очередь")
+                            delay = getattr(task, 'requeue_delay', 0)
+                            if delay:
+                                retry_scheduler.schedule(prompt_status, delay)
+                            else:
+                                await requeue_prompt(prompt_status, all_prompts, shared_queue)
+                                advanced_logger.log_app_event("PROMPT_REQUEUED", 
+                                                            f"Промпт {task.prompt_id} возвращен в очередь")
+                            continue
+
+                    # Обработка промпта завершена - сдвигаем позицию чтения файла
+                    all_prompts.forget(task.prompt_id)
+                    retry_scheduler.forget(task.prompt_id)
+                    if prompt_reader:
+                        prompt_reader.commit(task.prompt_id)
+                    if shared_queue:
+                        prompt_status = await table_manager.get_status(task.prompt_id)
+                        await asyncio.to_thread(shared_queue.complete, task.prompt_id, prompt_status['status'])
                 except Exception as e:
                     error_message = f"Ошибка при выполнении задачи {task.prompt_id}: {e}"
                     print(error_message)
                     advanced_logger.log_exception(e, context=f"При выполнении задачи {task.prompt_id}")
 
+        if drain_event.is_set():
+            # Запросы, не дождавшиеся видео, продолжат ожидание после перезапуска
+            state = checkpoint.save(all_prompts, retry_scheduler, accounts)
+            kept_leases = {entry['prompt_id'] for entry in state['in_flight']}
+            for task in pending_tasks:
+                task.cancel()
+            await asyncio.gather(*pending_tasks, return_exceptions=True)
+            advanced_logger.log_app_event("DRAIN_COMPLETE", "Плавная остановка завершена",
+                                          extra_info={"in_flight": len(kept_leases)})
+
     finally:
+        if stop_waiter:
+            stop_waiter.cancel()
+        if drain_waiter:
+            drain_waiter.cancel()
+        if wake_waiter:
+            wake_waiter.cancel()
+        if control_channel:
+            await control_channel.close()
+        if lease_task:
+            lease_task.cancel()
+        if shared_queue:
+            # Незавершенные промпты сразу становятся доступны другим процессам
+            shared_queue.release_all(kept_leases)
+            shared_queue.close()
+        if table_manager:
+            await table_manager.close()
+            if hasattr(table_manager.table_manager, 'get_flush_stats'):
+                advanced_logger.log_app_event("TABLE_FLUSH_STATS", "Статистика записи таблицы",
+                                              extra_info=table_manager.table_manager.get_flush_stats())
+        for account in accounts:
+            if account.navigator:
+                advanced_logger.log_app_event("SEND_METRICS", f"Отправка сообщений аккаунта {account.api_id}",
+                                              extra_info={**account.navigator.rate_limiter.get_metrics(),
+                                                          "navigations_sent": account.navigator.navigations_sent,
+                                                          "navigations_skipped": account.navigator.navigations_skipped,
+                                                          **account.navigator.get_submission_metrics()})
+            if account.scheduler and account.scheduler.controller:
+                advanced_logger.log_app_event("AIMD_WINDOWS", f"Окна моделей аккаунта {account.api_id}",
+                                              extra_info=account.scheduler.get_window_metrics())
+        if accounts and accounts[0].message_monitor and accounts[0].message_monitor.generation_stats:
+            # Замеры, накопленные после последней фоновой записи
+            accounts[0].message_monitor.generation_stats.save()
+            advanced_logger.log_app_event("GENERATION_STATS", "Время генерации моделей",
+                                          extra_info=accounts[0].message_monitor.generation_stats.get_metrics())
         advanced_logger.log_shutdown()
-        await client.disconnect()
+        for account in accounts:
+            await account.disconnect()
 
 if __name__ == "__main__":
     # Запускаем асинхронный код
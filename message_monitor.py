@@ -3,12 +3,18 @@ from datetime import datetime
 import asyncio
 import os
 from message_filter import MessageFilter
+from failure_policy import FailurePolicy
 from message_logger import MessageLogger
 from prompt_matcher import PromptMatcher
 import re
 import time
 
 class MessageMonitor:
+    # Результат запроса, отклоненного ботом из-за лимита одновременных генераций
+    REQUEST_LIMITED = 'limited'
+    # Минимальное ожидание видео для запроса, восстановленного после перезапуска (секунды)
+    RESTORED_MIN_WAIT = 60
+
     def __init__(self, client, bot, video_downloader, config, logger=None):
         """
         Инициализирует монитор сообщений
@@ -35,7 +41,7 @@ class MessageMonitor:
         self.config = config
         self.logger = logger  # Сохраняем переданный логгер
         self.max_slots = int(config.get('parallel_requests', '1'))
-        self.active_requests = {}  # slot: {prompt_id, model, event}
+        self.active_requests = {}  # slot: {prompt_id, model, future}
         self.message_filter = MessageFilter()
         self.message_logger = MessageLogger()
         
@@ -45,10 +51,8 @@ class MessageMonitor:
         
         self.current_prompt = {}  # slot: prompt_id
         self.current_model = {}   # slot: model
-        self.video_received = {}  # slot: filename
         self.expected_filepath = None
         self.generation_in_progress = False
-        self.error_received = False
         self.prompt_history = []  # История промптов только для текущей сессии
         self.current_video_prompt = None  # Промпт из сообщения с видео
         
@@ -61,14 +65,15 @@ class MessageMonitor:
         # Инициализация словарей
         self.current_prompt = {}  # Текущие промпты по слотам
         self.current_model = {}   # Текущие модели по слотам
-        self.video_received = {}  # Флаги получения видео по слотам
         
         # Активные запросы со всей информацией
         self.active_requests = {}
+        self.failures = {}  # ID промпта: (класс отказа, подробности) для политики повторов
         
-        self.max_model_limit = 2  # Максимум 2 одновременно обрабатываемых промпта для модели
-        self.waiting_for_any_video = False  # Флаг ожидания любого видео при лимите
-        self.any_video_received = asyncio.Event()  # Событие для отслеживания получения любого видео
+        # Лимит одновременно обрабатываемых промптов для модели (по умолчанию и по моделям)
+        self.max_model_limit = int(config.get('model_concurrency_default', '2'))
+        self.scheduler = None  # Планировщик аккаунта с лимитами моделей
+        self.generation_stats = None  # Время генерации моделей для таймаутов
         self.last_video_info = None
         self.current_request_id = None  # ID текущего запроса
         self.current_request_time = None  # Время отправки текущего запроса
@@ -78,11 +83,8 @@ class MessageMonitor:
         self.prompt_matcher = PromptMatcher()  # Добавляем matcher
         self.current_prompt_id = None  # Добавляем ID текущего промпта
         self.startup_cleanup = False  # Флаг для очистки слотов при старте
-        self.waiting_for_slot = False  # Флаг ожидания освобождения слота
-        self.slot_freed = asyncio.Event()  # Событие для отслеживания освобождения слота
         self.model_limits = {}  # Словарь для отслеживания счетчиков лимитов моделей
         self.generation_in_progress = False
-        self.error_received = False
         self.prompt_history = []  # История промптов только для текущей сессии
         self.current_video_prompt = None  # Промпт из сообщения с видео
         self.expected_prompt = None  # Промпт, который мы ожидаем
@@ -102,6 +104,34 @@ class MessageMonitor:
             "Ошибка генерации"
         ]
 
+        # Сообщения меню: после них бот уже не ждет промпт для выбранной модели
+        self.menu_messages = [
+            "Выберите раздел для работы с видео",
+            "Не выбран инструмент для работы с чат-ботом",
+            "Пожалуйста, воспользуйтесь навигацией",
+            "В главное меню",
+            "Настройки модели",
+            "Профиль",
+            "База знаний",
+            "Кубик удачи"
+        ]
+
+        # Бот не принял промпт, потому что модель не выбрана
+        self.navigation_lost_messages = [
+            "Не выбран инструмент для работы с чат-ботом",
+            "Пожалуйста, воспользуйтесь навигацией"
+        ]
+
+        # Модель, промпт для которой бот ждет сейчас (None - состояние меню неизвестно),
+        # и ID нашего сообщения с выбором модели: более ранние сообщения меню ее не отменяют
+        self.menu_model = None
+        self.menu_message_id = 0
+
+        # Подтверждение выбора модели: промпт отправляется после ответа бота на выбор модели.
+        # model_ack_messages - необязательные фрагменты текста подтверждения через запятую
+        self.model_ack_messages = [msg.strip() for msg in config.get('model_ack_messages', '').split(',') if msg.strip()]
+        self.model_ack_waiters = []
+
         # Обновляем сообщения о лимите
         self.limit_messages = [
             "⚠️ Достигнут лимит одновременных запросов",
@@ -116,7 +146,7 @@ class MessageMonitor:
         if model not in self.model_limits:
             self.model_limits[model] = 0
         self.model_limits[model] += 1
-        print(f"Увеличен счетчик модели {model}: {self.model_limits[model]}/{self.max_model_limit}")
+        print(f"Увеличен счетчик модели {model}: {self.model_limits[model]}/{self.get_model_limit(model)}")
         
         if self.logger:
             self.logger.log_app_event("MODEL_COUNTER", f"Увеличен счетчик модели {model}", 
@@ -126,34 +156,45 @@ class MessageMonitor:
         """Уменьшает счетчик использования модели на 1"""
         if model in self.model_limits and self.model_limits[model] > 0:
             self.model_limits[model] -= 1
-            print(f"Уменьшен счетчик модели {model}: {self.model_limits[model]}/{self.max_model_limit}")
+            print(f"Уменьшен счетчик модели {model}: {self.model_limits[model]}/{self.get_model_limit(model)}")
             
-            # Если счетчик был на максимуме и теперь уменьшился, сигнализируем об освобождении слота
-            if self.model_limits[model] == self.max_model_limit - 1:
-                print(f"Лимит для модели {model} снят (счетчик уменьшен с {self.max_model_limit} до {self.model_limits[model]})")
-                # Если кто-то ждет освобождения слота
-                if self.waiting_for_slot:
-                    print("Сигнализируем об освобождении слота для модели")
-                    self.slot_freed.set()
-                    
-                # Если ожидаем любое видео для снятия лимита
-                if self.waiting_for_any_video:
-                    print("Сигнализируем о снятии лимита для модели")
-                    self.any_video_received.set()
+            # Если счетчик был на максимуме и теперь уменьшился, лимит модели снят
+            if self.model_limits[model] == self.get_model_limit(model) - 1:
+                print(f"Лимит для модели {model} снят (счетчик уменьшен с {self.get_model_limit(model)} до {self.model_limits[model]})")
 
     def set_model_limit(self, model):
         """Устанавливает флаг лимита для модели"""
         self.model_limits[model] = self.model_limits.get(model, 0) + 1
-        print(f"Установлен максимальный лимит для модели {model}: {self.model_limits[model]}/{self.max_model_limit}")
+        print(f"Установлен максимальный лимит для модели {model}: {self.model_limits[model]}/{self.get_model_limit(model)}")
         
         if self.logger:
             self.logger.log_model_limit(model, self.model_limits[model])
 
+    def set_scheduler(self, scheduler):
+        """Задает планировщик, который хранит лимиты моделей и получает сигналы о лимитах бота"""
+        self.scheduler = scheduler
+
+    def set_generation_stats(self, generation_stats):
+        """Подключает статистику времени генерации (общую для всех аккаунтов)"""
+        self.generation_stats = generation_stats
+
+    def get_wait_time(self, model):
+        """Возвращает таймаут ожидания видео для модели в секундах"""
+        if self.generation_stats:
+            return self.generation_stats.timeout(model, self.wait_time)
+        return self.wait_time
+
+    def get_model_limit(self, model):
+        """Возвращает лимит одновременных запросов для модели"""
+        if self.scheduler:
+            return self.scheduler.cap(model)
+        return self.max_model_limit
+
     def is_model_limited(self, model):
         """Проверяет, достигла ли модель лимита запросов"""
-        return self.model_limits.get(model, 0) >= self.max_model_limit
+        return self.model_limits.get(model, 0) >= self.get_model_limit(model)
 
-    def set_current_task(self, prompt_id, prompt, model, slot):
+    async def set_current_task(self, prompt_id, prompt, model, slot, source_prompt=None):
         """
         Устанавливает текущую задачу
         
@@ -162,6 +203,7 @@ class MessageMonitor:
             prompt: Текст промпта
             model: Модель для генерации
             slot: Номер слота
+            source_prompt: Промпт из файла вместе со служебными строками (по умолчанию prompt)
             
         Returns:
             bool: True если успешно, False в случае ошибки
@@ -173,7 +215,7 @@ class MessageMonitor:
             # Отмечаем промпт как ожидающий
             table_manager = self.get_table_manager()
             if table_manager:
-                table_manager.mark_pending(prompt_id)
+                await table_manager.mark_pending(prompt_id)
                 
                 if self.logger:
                     self.logger.log_app_event("MODEL_LIMITED", 
@@ -191,34 +233,218 @@ class MessageMonitor:
         self.active_requests[slot] = {
             'prompt_id': prompt_id,
             'prompt': prompt,
+            'source_prompt': source_prompt or prompt,  # Для восстановления строки таблицы после перезапуска
             'model': model,
             'start_time': time.time(),
             'sent_message_id': None,
-            'status': 'sending'
+            'status': 'sending',
+            'accepted': False,  # Бот начал генерацию по запросу
+            # Результат запроса: True - видео получено, False - ошибка
+            'future': asyncio.get_running_loop().create_future()
         }
         
         # Отмечаем промпт как находящийся в обработке
         table_manager = self.get_table_manager()
         if table_manager:
-            table_manager.mark_in_progress(prompt_id, model)
+            await table_manager.mark_in_progress(prompt_id, model)
             
             if self.logger:
                 self.logger.log_app_event("TASK_SET", 
                                         f"Установлена задача для промпта {prompt_id} в слоте {slot}",
                                         extra_info={"model": model, "slot": slot, "prompt": prompt_short})
         
-        print(f"Увеличен счетчик модели {model}: {self.model_limits[model]}/{self.max_model_limit}")
+        print(f"Увеличен счетчик модели {model}: {self.model_limits[model]}/{self.get_model_limit(model)}")
+        return True
+
+    def restore_request(self, entry):
+        """
+        Восстанавливает запрос, который бот генерировал при прошлой остановке
+
+        Args:
+            entry: Запрос из контрольной точки (slot, prompt_id, prompt, model,
+                   start_time, sent_message_id, status_message_id, accepted)
+        """
+        self.increase_model_counter(entry['model'])
+        self.active_requests[entry['slot']] = {
+            'prompt_id': entry['prompt_id'],
+            'prompt': entry['prompt'],
+            'source_prompt': entry.get('source_prompt') or entry['prompt'],
+            'model': entry['model'],
+            'start_time': entry['start_time'],
+            'sent_message_id': entry.get('sent_message_id'),
+            'status_message_id': entry.get('status_message_id'),
+            'status': 'restored',
+            'accepted': entry.get('accepted', False),
+            'restored': True,  # Время генерации включает простой бота и не попадает в статистику
+            'future': asyncio.get_running_loop().create_future()
+        }
+        if self.logger:
+            self.logger.log_app_event("TASK_RESTORED",
+                                      f"Восстановлено ожидание видео для промпта {entry['prompt_id']} в слоте {entry['slot']}",
+                                      extra_info={"model": entry['model']})
+
+    def set_menu_model(self, model, message_id=0):
+        """
+        Запоминает, что бот перешел в режим ввода промпта для модели
+
+        Args:
+            model: Выбранная модель
+            message_id: ID нашего сообщения с выбором модели
+        """
+        self.menu_model = model
+        self.menu_message_id = message_id
+
+    def reset_menu_state(self, reason, message_id=None):
+        """
+        Сбрасывает состояние меню: следующий промпт отправится с полной навигацией
+
+        Args:
+            reason: Причина сброса для лога
+            message_id: ID сообщения, из-за которого сброс (сообщения до выбора модели игнорируются)
+        """
+        if message_id is not None and message_id <= self.menu_message_id:
+            return
+        if self.menu_model is not None:
+            self.menu_model = None
+            if self.logger:
+                self.logger.log_app_event("MENU_STATE_RESET", f"Состояние меню бота сброшено: {reason}")
+
+    def expect_model_ack(self):
+        """
+        Начинает ожидание подтверждения выбора модели (до отправки сообщения с моделью)
+
+        Returns:
+            dict: Ожидание для wait_model_ack
+        """
+        waiter = {'after_id': None, 'candidates': [], 'future': asyncio.get_running_loop().create_future()}
+        self.model_ack_waiters.append(waiter)
+        return waiter
+
+    async def wait_model_ack(self, waiter, after_id, timeout):
+        """
+        Ожидает ответ бота на выбор модели
+
+        Args:
+            waiter: Ожидание из expect_model_ack
+            after_id: ID нашего сообщения с моделью (учитываются только более поздние ответы)
+            timeout: Время ожидания в секундах
+
+        Returns:
+            bool: True - модель выбрана, False - бот ответил, что модель не выбрана,
+                None - подтверждение не пришло за timeout
+        """
+        waiter['after_id'] = after_id
+        try:
+            # Ответ мог прийти, пока отправлялось сообщение с моделью
+            for message_id, confirmed in waiter['candidates']:
+                if message_id > after_id:
+                    return confirmed
+            return await asyncio.wait_for(waiter['future'], timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.discard_model_ack(waiter)
+
+    def discard_model_ack(self, waiter):
+        """Прекращает ожидание подтверждения"""
+        if waiter in self.model_ack_waiters:
+            self.model_ack_waiters.remove(waiter)
+
+    def classify_model_ack(self, message_text, has_video):
+        """
+        Определяет, является ли сообщение бота ответом на выбор модели
+
+        Returns:
+            bool: True - подтверждение, False - модель не выбрана, None - другое сообщение
+        """
+        if has_video:
+            return None
+        if any(msg in message_text for msg in self.navigation_lost_messages):
+            return False
+        if self.model_ack_messages:
+            return True if any(msg in message_text for msg in self.model_ack_messages) else None
+        # Без заданного текста подтверждением считается первое сообщение, не относящееся
+        # к меню раздела, статусам генерации, лимитам и ошибкам
+        if ('📍' in message_text
+                or any(msg in message_text for msg in self.menu_messages)
+                or any(msg in message_text for msg in self.generation_start_messages)
+                or any(msg in message_text for msg in self.message_filter.progress_messages)
+                or any(msg in message_text for msg in self.limit_messages)
+                or any(msg in message_text.lower() for msg in self.message_filter.error_patterns)):
+            return None
         return True
 
+    def notify_model_ack(self, message_id, confirmed):
+        """Передает ответ бота ожидающим подтверждения выбора модели"""
+        for waiter in self.model_ack_waiters:
+            if waiter['after_id'] is None:
+                waiter['candidates'].append((message_id, confirmed))
+            elif message_id > waiter['after_id'] and not waiter['future'].done():
+                waiter['future'].set_result(confirmed)
+
+    def oldest_unaccepted_request(self):
+        """
+        Возвращает самый ранний запрос, который бот еще не принял в работу
+
+        Returns:
+            tuple: (слот, запрос) или (None, None)
+        """
+        waiting = [(request['start_time'], slot) for slot, request in self.active_requests.items()
+                   if not request.get('accepted')]
+        if not waiting:
+            return None, None
+        _, slot = min(waiting)
+        return slot, self.active_requests[slot]
+
+    def accept_request(self, request):
+        """Отмечает, что бот принял запрос, и сообщает об этом планировщику"""
+        if not request.get('accepted'):
+            request['accepted'] = True
+            if self.scheduler:
+                self.scheduler.record_success(request['model'])
+
+    def record_failure(self, prompt_id, failure_class, detail=''):
+        """Запоминает класс отказа промпта для политики повторов"""
+        self.failures[prompt_id] = (failure_class, detail)
+
+    def pop_failure(self, prompt_id):
+        """
+        Returns:
+            tuple: (класс отказа, подробности) или (None, '')
+        """
+        return self.failures.pop(prompt_id, (None, ''))
+
+    def release_request(self, slot):
+        """Освобождает слот запроса, который не удалось отправить"""
+        request = self.active_requests.pop(slot, None)
+        if request:
+            self.decrease_model_counter(request['model'])
+
+    def resolve_request(self, request, result):
+        """
+        Завершает ожидание запроса
+
+        Args:
+            request: Запрос из active_requests
+            result: True если видео получено, False в случае ошибки,
+                REQUEST_LIMITED если бот отклонил запрос из-за лимита
+        """
+        future = request.get('future')
+        if future and not future.done():
+            future.set_result(result)
+
     async def wait_for_video(self, slot):
         """
         Ожидает получения видео для конкретного слота
         
+        Обработчики сообщений завершают future запроса при получении видео
+        или ошибки, поэтому ожидание не требует опроса.
+        
         Args:
             slot: Номер слота
             
         Returns:
-            bool: True если видео получено, False если истек таймаут
+            bool: True если видео получено, False при ошибке или по таймауту
         """
         if slot not in self.active_requests:
             print(f"Ошибка: слот {slot} не активен")
@@ -228,90 +454,54 @@ class MessageMonitor:
         prompt_id = request['prompt_id']
         model = request['model']
         
-        print(f"Ожидаем видео для слота {slot}. Таймаут установлен на {self.wait_time} секунд ({self.wait_time/60} минут)")
+        wait_time = self.get_wait_time(model)
+        if request.get('restored'):
+            # Запрос отправлен до перезапуска - ждем только оставшееся время
+            wait_time = max(self.RESTORED_MIN_WAIT, wait_time - (time.time() - request['start_time']))
+        print(f"Ожидаем видео для слота {slot}. Таймаут установлен на {wait_time:.0f} секунд ({wait_time/60:.1f} минут)")
         
-        # Ожидаем получения видео
-        start_time = time.time()
-        
-        while time.time() - start_time < self.wait_time:
-            # Видео получено
-            if slot in self.video_received and self.video_received[slot]:
-                print(f"✅ Видео для слота {slot} получено!")
-                
-                # Отмечаем, что видео получено
-                self.video_received[slot] = False
-                
-                # Уменьшаем счетчик для модели
-                self.decrease_model_counter(model)
-                print(f"Уменьшен счетчик модели {model} после успешного получения видео: {self.model_limits[model]}/{self.max_model_limit}")
-                
-                # Освобождаем слот
-                if slot in self.active_requests:
-                    del self.active_requests[slot]
-                
-                return True
-                
-            # Получена ошибка
-            if self.error_received:
-                print(f"❌ Получена ошибка при генерации видео для слота {slot}")
-                self.error_received = False
-                
-                # Отмечаем промпт как завершившийся с ошибкой
-                table_manager = self.get_table_manager()
-                if table_manager:
-                    table_manager.mark_error(prompt_id, model, "Ошибка при генерации видео")
-                    
-                # Уменьшаем счетчик для модели
-                self.decrease_model_counter(model)
-                print(f"Уменьшен счетчик модели {model} после ошибки: {self.model_limits[model]}/{self.max_model_limit}")
-                
-                # Освобождаем слот
-                if slot in self.active_requests:
-                    del self.active_requests[slot]
-                
-                return False
-            
-            # Проверяем, не был ли слот освобожден извне
-            if slot not in self.active_requests:
-                print(f"Слот {slot} был освобожден во время ожидания")
-                return False
-                
-            # Небольшая пауза, чтобы не нагружать процессор
-            await asyncio.sleep(0.5)
-            
+        try:
+            received = await asyncio.wait_for(asyncio.shield(request['future']), timeout=wait_time)
+        except asyncio.TimeoutError:
+            received = None
+        finally:
+            # Освобождаем слот
+            if self.active_requests.get(slot) is request:
+                del self.active_requests[slot]
+
+        # Уменьшаем счетчик для модели
+        self.decrease_model_counter(model)
+
+        if received == self.REQUEST_LIMITED:
+            # Бот не принял запрос - промпт вернется в очередь
+            print(f"⚠️ Бот отклонил запрос в слоте {slot} из-за лимита модели {model}")
+            self.record_failure(prompt_id, FailurePolicy.LIMIT)
+            table_manager = self.get_table_manager()
+            if table_manager:
+                await table_manager.mark_pending(prompt_id)
+            return False
+
+        if received:
+            print(f"✅ Видео для слота {slot} получено!")
+            if self.generation_stats and not request.get('restored'):
+                self.generation_stats.record(model, time.time() - request['start_time'])
+            return True
+
+        if received is False:
+            print(f"❌ Получена ошибка при генерации видео для слота {slot}")
+            return False
+
         # Время ожидания истекло
         print(f"⏰ Истекло время ожидания видео для слота {slot}")
         
         # Отмечаем промпт как таймаут
+        self.record_failure(prompt_id, FailurePolicy.TIMEOUT, f"{wait_time:.0f} с")
         table_manager = self.get_table_manager()
         if table_manager:
-            table_manager.mark_timeout(prompt_id, model)
-            
-        # Уменьшаем счетчик для модели
-        self.decrease_model_counter(model)
-        print(f"Уменьшен счетчик модели {model} из-за таймаута: {self.model_limits[model]}/{self.max_model_limit}")
-        
-        # Освобождаем слот
-        if slot in self.active_requests:
-            del self.active_requests[slot]
+            await table_manager.mark_timeout(prompt_id, model)
             
         return False
 
-    async def wait_for_any_video_received(self):
-        """Ожидает получение любого видео (для снятия лимита)"""
-        print("\nОжидаем получение любого видео для снятия лимита...")
-        self.waiting_for_any_video = True
-        self.any_video_received.clear()
-        try:
-            await asyncio.wait_for(self.any_video_received.wait(), timeout=self.wait_time)
-            print("Получено видео, лимиты для моделей уменьшены")
-            return True
-        except asyncio.TimeoutError:
-            print("Таймаут ожидания видео для снятия лимита")
-            return False
-        finally:
-            self.waiting_for_any_video = False
-
     async def start_monitoring(self):
         # Устанавливаем флаг активности мониторинга
         self.monitoring_active = True
@@ -327,6 +517,11 @@ class MessageMonitor:
                 if self.logger:
                     self.logger.log_outgoing(message_text, self.bot.username, "TEXT")
                 
+                # Сообщение, отправленное не ботом (например, вручную), могло изменить меню
+                if message_text != '/video' and message_text != self.menu_model and \
+                   not any(request['prompt'] == message_text for request in self.active_requests.values()):
+                    self.reset_menu_state("отправлено постороннее сообщение", event.message.id)
+                
                 # Проверяем, является ли сообщение промптом
                 if len(message_text) > 20 and not message_text.startswith('/'):
                     print(f"\nОтправлен промпт: {message_text[:30]}...")
@@ -385,19 +580,12 @@ class MessageMonitor:
                                                      extra_info={"model": model})
                         
                         # Скачиваем видео
-                        await self.video_downloader.download_video(message, prompt_id, model)
-                        
-                        # Уменьшаем счетчик использования модели после успешного скачивания
-                        self.decrease_model_counter(model)
-                        print(f"Уменьшен счетчик модели {model} после успешного получения видео: {self.model_limits[model]}/{self.max_model_limit}")
+                        downloaded = await self.video_downloader.download_video(message, prompt_id, model)
                         
-                        # Уведомляем о получении видео для слота
-                        self.video_received[prompt_slot] = True
-                        
-                        # Сигнализируем о том, что видео получено и загружено
-                        if prompt_slot in self.active_requests and 'event' in self.active_requests[prompt_slot]:
-                            event_obj = self.active_requests[prompt_slot]['event']
-                            event_obj.set()
+                        # Сигнализируем о том, что видео получено и загружено (или не скачалось)
+                        if prompt_slot in self.active_requests:
+                            self.accept_request(self.active_requests[prompt_slot])
+                            self.resolve_request(self.active_requests[prompt_slot], downloaded)
                     else:
                         # Если не смогли определить слот по промпту, пробуем по ID ответа
                         for slot, request in self.active_requests.items():
@@ -411,14 +599,11 @@ class MessageMonitor:
                                                             extra_info={"model": model})
                                 
                                 # Скачиваем видео
-                                await self.video_downloader.download_video(message, prompt_id, model)
-                                
-                                # Уведомляем о получении видео для слота
-                                self.video_received[slot] = True
+                                downloaded = await self.video_downloader.download_video(message, prompt_id, model)
                                 
-                                # Сигнализируем о том, что видео получено и загружено
-                                if 'event' in request:
-                                    request['event'].set()
+                                # Сигнализируем о том, что видео получено и загружено (или не скачалось)
+                                self.accept_request(request)
+                                self.resolve_request(request, downloaded)
                                 break
                         else:
                             # Если не смогли определить слот ни по промпту, ни по ID, скачиваем видео со стандартным названием
@@ -450,6 +635,47 @@ class MessageMonitor:
                 # Записываем сообщение в лог
                 self.message_logger.log_message(message_text, has_video)
                 
+                # Ответ на выбор модели разрешает отправку промпта. Реплай на отправленный
+                # промпт относится к этому промпту, а не к выбору модели
+                if self.model_ack_waiters and not self.find_slot_by_reply(event.message):
+                    confirmed = self.classify_model_ack(message_text, has_video)
+                    if confirmed is not None:
+                        self.notify_model_ack(event.message.id, confirmed)
+                    if confirmed is False:
+                        # Отказ относится к навигации, которая ждет ответа, а не к отправленным промптам
+                        self.reset_menu_state(message_text[:50], event.message.id)
+                        return
+                    # Подтверждение обрабатывается дальше как обычное сообщение: если это все же
+                    # уведомление о лимите или ошибке, оно дойдет до своего запроса
+
+                # Бот показал меню - режим ввода промпта для модели сброшен
+                if any(msg in message_text for msg in self.menu_messages):
+                    self.reset_menu_state(message_text[:50], event.message.id)
+                    if any(msg in message_text for msg in self.navigation_lost_messages):
+                        # Промпт ушел без выбранной модели - отправим его заново с навигацией
+                        slot, request = self.oldest_unaccepted_request()
+                        if request:
+                            print(f"\n⚠️ Бот не принял промпт в слоте {slot}: модель не выбрана")
+                            self.record_failure(request['prompt_id'], FailurePolicy.SEND_FAILED, message_text[:100])
+                            self.resolve_request(request, False)
+                    return
+
+                # Бот отклонил запрос из-за лимита одновременных генераций
+                if any(msg in message_text for msg in self.limit_messages):
+                    slot = self.find_slot_by_reply(event.message)
+                    request = self.active_requests.get(slot) if slot else None
+                    if not request:
+                        slot, request = self.oldest_unaccepted_request()
+                    if request:
+                        print(f"\n⚠️ Лимит бота для модели {request['model']} (слот {slot})")
+                        if self.logger:
+                            self.logger.log_model_limit(request['model'], self.model_limits.get(request['model'], 0),
+                                                        request['prompt_id'])
+                        if self.scheduler:
+                            self.scheduler.record_limit(request['model'])
+                        self.resolve_request(request, self.REQUEST_LIMITED)
+                    return
+
                 # Проверяем, нужно ли логировать/обрабатывать сообщение
                 if not self.message_filter.should_print_message(message_text, has_video) and not has_video:
                     return  # Пропускаем неинтересные сообщения
@@ -469,6 +695,7 @@ class MessageMonitor:
                             if request['prompt'].startswith(prompt_text[:30]) or prompt_text.startswith(request['prompt'][:30]):
                                 # Нашли соответствующий слот
                                 request['status_message_id'] = event.message.id
+                                self.accept_request(request)
                                 
                                 if self.logger:
                                     self.logger.log_app_event("STATUS_MESSAGE", 
@@ -496,14 +723,11 @@ class MessageMonitor:
                                                     {"error_text": message_text[:200]})
                         
                         # Отмечаем промпт как пропущенный из-за ошибки
-                        self.table_manager.mark_error(request['prompt_id'], request['model'], message_text[:100])
+                        await self.table_manager.mark_error(request['prompt_id'], request['model'], message_text[:100])
                         print(f"❌ Промпт {prompt_id} помечен как завершившийся с ошибкой")
                         
-                        # Уменьшаем счетчик использования модели
-                        self.decrease_model_counter(request['model'])
-                        
-                        # Устанавливаем событие для разблокировки ожидающего потока
-                        request['event'].set()
+                        # Завершаем ожидание запроса
+                        self.resolve_request(request, False)
                         return
                     else:
                         # Если не смогли определить слот, ищем по контексту сообщения
@@ -521,30 +745,31 @@ class MessageMonitor:
                                                             {"error_text": message_text[:200]})
                                 
                                 # Отмечаем промпт как завершившийся с ошибкой
-                                self.table_manager.mark_error(request['prompt_id'], request['model'], message_text[:100])
+                                await self.table_manager.mark_error(request['prompt_id'], request['model'], message_text[:100])
                                 print(f"❌ Промпт {prompt_id} помечен как завершившийся с ошибкой (по содержимому)")
                                 
-                                # Уменьшаем счетчик использования модели
-                                self.decrease_model_counter(request['model'])
-                                
-                                # Устанавливаем событие
-                                request['event'].set()
+                                # Завершаем ожидание запроса
+                                self.resolve_request(request, False)
                                 return
 
                 # Проверяем сообщения об ожидании (как положительный признак начала генерации)
                 if any(msg in message_text for msg in self.generation_start_messages):
                     self.generation_in_progress = True
                     print("Началась генерация видео...")
+                    slot = self.find_slot_by_reply(event.message)
+                    request = self.active_requests.get(slot) if slot else None
+                    if not request:
+                        slot, request = self.oldest_unaccepted_request()
+                    if request:
+                        self.accept_request(request)
                     return
                     
                 # Проверяем сообщения об ошибках
                 if any(msg in message_text for msg in self.error_messages):
                     for slot, request in list(self.active_requests.items()):
                         print(f"Получена ошибка от бота для слота {slot}")
-                        self.table_manager.mark_error(request['prompt_id'], request['model'])
-                        # Уменьшаем счетчик при ошибке
-                        self.decrease_model_counter(request['model'])
-                        request['event'].set()
+                        await self.table_manager.mark_error(request['prompt_id'], request['model'])
+                        self.resolve_request(request, False)
                     return
 
             except Exception as e:
@@ -587,14 +812,11 @@ class MessageMonitor:
                                                     {"error_text": message_text[:200]})
                         
                         # Отмечаем промпт как завершившийся с ошибкой
-                        self.table_manager.mark_error(request['prompt_id'], request['model'], message_text[:100])
+                        await self.table_manager.mark_error(request['prompt_id'], request['model'], message_text[:100])
                         print(f"❌ Промпт {prompt_id} помечен как завершившийся с ошибкой (из статусного сообщения)")
                         
-                        # Уменьшаем счетчик использования модели
-                        self.decrease_model_counter(request['model'])
-                        
-                        # Устанавливаем событие
-                        request['event'].set()
+                        # Завершаем ожидание запроса
+                        self.resolve_request(request, False)
                         return
                 
                 # Используем новый метод для проверки, нужно ли обрабатывать отредактированное сообщение
@@ -628,14 +850,11 @@ class MessageMonitor:
                                                     {"error_text": message_text[:200]})
                         
                         # Отмечаем промпт как завершившийся с ошибкой
-                        self.table_manager.mark_error(request['prompt_id'], request['model'], message_text[:100])
+                        await self.table_manager.mark_error(request['prompt_id'], request['model'], message_text[:100])
                         print(f"❌ Промпт {prompt_id} помечен как завершившийся с ошибкой (в отредактированном сообщении)")
                         
-                        # Уменьшаем счетчик использования модели
-                        self.decrease_model_counter(request['model'])
-                        
-                        # Устанавливаем событие, чтобы разблокировать ожидающий поток
-                        request['event'].set()
+                        # Завершаем ожидание запроса
+                        self.resolve_request(request, False)
                         return
                     else:
                         # Если не смогли определить слот, ищем по контексту сообщения
@@ -651,14 +870,11 @@ class MessageMonitor:
                                                            {"error_text": message_text[:200]})
                                 
                                 # Отмечаем промпт как завершившийся с ошибкой
-                                self.table_manager.mark_error(request['prompt_id'], request['model'], message_text[:100])
+                                await self.table_manager.mark_error(request['prompt_id'], request['model'], message_text[:100])
                                 print(f"❌ Промпт {prompt_id} помечен как завершившийся с ошибкой (по содержимому)")
                                 
-                                # Уменьшаем счетчик использования модели
-                                self.decrease_model_counter(request['model'])
-                                
-                                # Устанавливаем событие
-                                request['event'].set()
+                                # Завершаем ожидание запроса
+                                self.resolve_request(request, False)
                                 return
                 
                 # Проверяем, содержит ли сообщение промпт
@@ -694,15 +910,15 @@ class MessageMonitor:
                             # Проверяем соответствие видео промпту
                             if self.check_video_matches_prompt(video_path, request['prompt']):
                                 # Обновляем статус и уведомляем ожидающий поток
-                                self.table_manager.mark_success(request['prompt_id'], request['model'])
-                                request['event'].set()
+                                await self.table_manager.mark_success(request['prompt_id'], request['model'])
+                                self.resolve_request(request, True)
                             else:
                                 # Видео не соответствует промпту
                                 if self.logger:
                                     self.logger.log_app_event("VIDEO_MISMATCH",
                                                            f"Видео не соответствует промпту для слота {slot}")
-                                self.table_manager.mark_error(request['prompt_id'], request['model'])
-                                request['event'].set()
+                                await self.table_manager.mark_error(request['prompt_id'], request['model'])
+                                self.resolve_request(request, False)
 
             except Exception as e:
                 if self.logger:
@@ -774,41 +990,46 @@ class MessageMonitor:
             print("Таймаут ожидания видео при очистке слотов")
             return False
 
-    async def cleanup_active_slots(self):
-        """Очищает активные слоты из прошлой сессии"""
+    async def cleanup_active_slots(self, keep=()):
+        """
+        Очищает активные слоты из прошлой сессии
+
+        Args:
+            keep: ID промптов, восстановленных из контрольной точки (их слоты не очищаются)
+        """
         try:
             print("Очистка активных слотов из прошлой сессии...")
             
             # Получаем активные промпты
             if self.table_manager:
-                active_prompts = self.table_manager.get_active_prompts()
+                active_prompts = await self.table_manager.get_active_prompts()
                 if active_prompts:
                     for prompt in active_prompts:
                         prompt_id = prompt.get('id')
                         slot = prompt.get('slot')
-                        if prompt_id and slot:
+                        if prompt_id and slot and prompt_id not in keep:
                             print(f"Обнаружен активный слот {slot} для промпта {prompt_id} из прошлой сессии")
                             if self.logger:
                                 self.logger.log_app_event("CLEANUP", 
                                                         f"Очистка слота {slot} (промпт {prompt_id}) из прошлой сессии")
                             
-                            self.table_manager.mark_error(prompt_id, "", "Прервано при перезапуске бота")
+                            await self.table_manager.mark_error(prompt_id, "", "Прервано при перезапуске бота")
                             print(f"Слот {slot} очищен и промпт {prompt_id} помечен как завершенный с ошибкой")
             elif hasattr(self.video_downloader, 'table_manager'):
                 # Если table_manager не был установлен напрямую, но есть в video_downloader
                 table_manager = self.video_downloader.table_manager
-                active_prompts = table_manager.get_active_prompts()
+                active_prompts = await table_manager.get_active_prompts()
                 if active_prompts:
                     for prompt in active_prompts:
                         prompt_id = prompt.get('id')
                         slot = prompt.get('slot')
-                        if prompt_id and slot:
+                        if prompt_id and slot and prompt_id not in keep:
                             print(f"Обнаружен активный слот {slot} для промпта {prompt_id} из прошлой сессии")
                             if self.logger:
                                 self.logger.log_app_event("CLEANUP", 
                                                         f"Очистка слота {slot} (промпт {prompt_id}) из прошлой сессии")
                             
-                            table_manager.mark_error(prompt_id, "", "Прервано при перезапуске бота")
+                            await table_manager.mark_error(prompt_id, "", "Прервано при перезапуске бота")
                             print(f"Слот {slot} очищен и промпт {prompt_id} помечен как завершенный с ошибкой")
             else:
                 print("Внимание: table_manager не доступен, очистка активных слотов не выполнена")
@@ -817,8 +1038,11 @@ class MessageMonitor:
                                             "table_manager не доступен, очистка активных слотов не выполнена",
                                             "WARNING")
                                             
-            # Очищаем активные слоты
-            self.active_requests = {}
+            # Очищаем активные слоты, завершая их ожидание
+            for slot, request in list(self.active_requests.items()):
+                if request['prompt_id'] not in keep:
+                    self.resolve_request(request, False)
+                    del self.active_requests[slot]
             if self.logger:
                 self.logger.log_app_event("CLEANUP_COMPLETE", "Очистка активных слотов завершена")
                 
@@ -1,4 +1,10 @@
 import asyncio
+import time
+from contextlib import asynccontextmanager
+from telethon.errors import FloodWaitError
+from failure_policy import FailurePolicy
+from prompt_reader import split_prompt_meta
+from rate_limiter import OutgoingRateLimiter
 
 class TelegramNavigator:
     def __init__(self, client, bot, config, message_monitor, logger=None):
@@ -7,6 +13,21 @@ class TelegramNavigator:
         self.config = config
         self.message_monitor = message_monitor
         self.logger = logger
+        # Маршрутизация: промпт отправляется в наименее загруженную из разрешенных моделей
+        self.routing = config.get('model_routing', 'false').strip().lower() == 'true'
+        self.routing_models = self.parse_model_numbers(config.get('routing_models', ''))
+        # Все сообщения аккаунта проходят через ограничитель частоты отправки
+        self.rate_limiter = OutgoingRateLimiter.from_config(config, client, logger)
+        # Сколько раз навигация по меню выполнялась и пропускалась (бот уже в режиме модели)
+        self.navigations_sent = 0
+        self.navigations_skipped = 0
+        # Сколько ждать ответа бота на выбор модели перед отправкой промпта (секунды)
+        self.model_ack_timeout = float(config.get('model_ack_timeout', '10'))
+        # Блокировки отправки по чатам и время ожидания блокировки
+        self.submit_locks = {}
+        self.submissions = 0
+        self.submit_lock_wait = 0.0
+        self.submit_lock_wait_max = 0.0
         self.models = {
             '1': '🌙 SORA',
             '2': '➕ Hailuo MiniMax',
@@ -41,56 +62,123 @@ class TelegramNavigator:
                                         {"attempted_model": model_number})
             return False
 
-    async def navigate_and_send_prompt(self, prompt_data, slot=None):
+    @staticmethod
+    def parse_model_numbers(value):
+        """Разбирает список номеров моделей через запятую: '1, 4' -> ['1', '4']"""
+        return [number.strip() for number in value.split(',') if number.strip()]
+
+    def get_model(self, prompt_data=None):
+        """
+        Возвращает модель из конфига
+        prompt_data: словарь с данными промпта
+        """
+        # Используем модель из конфига или по умолчанию первую
+        model_number = self.config.get('model_number', '1')
+        return self.models.get(model_number, self.models['1'])
+
+    def get_allowed_models(self, prompt_data):
+        """
+        Возвращает модели, в которые можно отправить промпт
+        prompt_data: словарь с данными промпта
+        """
+        if not self.routing:
+            return [self.get_model(prompt_data)]
+        meta, _ = split_prompt_meta(prompt_data['prompt'])
+        numbers = self.parse_model_numbers(meta.get('models', '')) or self.routing_models or list(self.models)
+        return [self.models[number] for number in numbers if number in self.models]
+
+    def select_model(self, prompt_data, scheduler):
+        """
+        Выбирает наименее загруженную модель без лимита
+        prompt_data: словарь с данными промпта
+        scheduler: планировщик с бюджетами моделей
+
+        Returns:
+            str: Название модели или None, если все разрешенные модели заняты
+        """
+        best_model = None
+        best_load = None
+        for model in self.get_allowed_models(prompt_data):
+            if not scheduler.has_capacity(model) or self.message_monitor.is_model_limited(model):
+                continue
+            load = self.message_monitor.model_limits.get(model, 0) / self.message_monitor.get_model_limit(model)
+            if best_load is None or load < best_load:
+                best_model, best_load = model, load
+        return best_model
+
+    @asynccontextmanager
+    async def submission_lock(self, chat):
+        """Удерживает блокировку чата на время отправки /video, модели и промпта"""
+        key = getattr(chat, 'user_id', None) or str(chat)
+        lock = self.submit_locks.setdefault(key, asyncio.Lock())
+        started = time.monotonic()
+        async with lock:
+            wait = time.monotonic() - started
+            self.submissions += 1
+            self.submit_lock_wait += wait
+            self.submit_lock_wait_max = max(self.submit_lock_wait_max, wait)
+            yield
+
+    def get_submission_metrics(self):
+        """
+        Returns:
+            dict: Количество отправок и время ожидания блокировки чата (секунды)
+        """
+        return {
+            'submissions': self.submissions,
+            'submit_lock_wait': round(self.submit_lock_wait, 2),
+            'submit_lock_wait_avg': round(self.submit_lock_wait / self.submissions, 3) if self.submissions else None,
+            'submit_lock_wait_max': round(self.submit_lock_wait_max, 3),
+        }
+
+    async def navigate_and_send_prompt(self, prompt_data, slot=None, model=None):
         """
         Отправляет промпт и ожидает ответа
         prompt_data: словарь с данными промпта
         slot: номер слота для параллельной обработки
+        model: модель, выбранная планировщиком (по умолчанию из конфига)
+        """
+        if not await self.submit_prompt(prompt_data, slot, model):
+            return False
+        return await self.collect_result(slot)
+
+    async def submit_prompt(self, prompt_data, slot=None, model=None):
+        """
+        Отправляет промпт, не дожидаясь видео
+        prompt_data: словарь с данными промпта
+        slot: номер слота для параллельной обработки
+        model: модель, выбранная планировщиком (по умолчанию из конфига)
+
+        Returns:
+            bool: True, если промпт отправлен и запрос ожидает ответа бота в мониторе
         """
         try:
-            # Используем модель из конфига или по умолчанию первую
-            model_number = self.config.get('model_number', '1')
-            model = self.models.get(model_number, self.models['1'])
+            model = model or self.get_model(prompt_data)
+            model_number = next((number for number, name in self.models.items() if name == model), None)
+            _, prompt_text = split_prompt_meta(prompt_data['prompt'])
             
             if self.logger:
                 self.logger.log_app_event("NAVIGATION_START", 
                                         f"Начинаем навигацию для отправки промпта {prompt_data['id']} в слоте {slot}",
                                         extra_info={"model": model})
             
-            # Проверяем, находится ли модель в состоянии лимита
+            # Проверяем, не сообщил ли бот о лимите модели. Ожидание свободного
+            # слота выполняет планировщик, поэтому промпт просто возвращается в очередь
             if self.message_monitor.is_model_limited(model):
-                message = f"\nМодель {model} достигла лимита запросов (текущее значение: {self.message_monitor.model_limits.get(model, 0)})"
-                print(message)
-                print(f"Автоматическое ожидание снятия лимита для модели {model}...")
-                
+                message = f"Модель {model} достигла лимита запросов (текущее значение: {self.message_monitor.model_limits.get(model, 0)})"
+                print(f"\n{message}")
+
                 if self.logger:
                     self.logger.log_model_limit(model, self.message_monitor.model_limits.get(model, 0), prompt_data['id'])
-                
-                # Ждем снятия лимита
-                await self.wait_for_limit_release(model)
-                print(f"Лимит для модели {model} снят, продолжаем отправку промпта")
-                
-                if self.logger:
-                    self.logger.log_app_event("LIMIT_RELEASED", 
-                                            f"Лимит для модели {model} снят, продолжаем отправку промпта {prompt_data['id']}")
-                
-                # Проверяем лимит еще раз после ожидания
-                if self.message_monitor.is_model_limited(model):
-                    message = f"Лимит для модели {model} все еще активен после ожидания"
-                    print(message)
-                    
-                    if self.logger:
-                        self.logger.log_app_event("LIMIT_PERSISTS", message, "WARNING", 
-                                                {"prompt_id": prompt_data['id'], "model": model})
-                        
-                    # Отмечаем промпт как ожидающий и возвращаем False для повторного добавления в очередь 
-                    self.message_monitor.table_manager.mark_pending(prompt_data['id'])
-                    return False
-            
+
+                await self.message_monitor.table_manager.mark_pending(prompt_data['id'])
+                return False
+
             # Устанавливаем текущий запрос в мониторе для конкретного слота
-            if not self.message_monitor.set_current_task(prompt_data['id'], prompt_data['prompt'], model, slot):
+            if not await self.message_monitor.set_current_task(prompt_data['id'], prompt_text, model, slot,
+                                                               prompt_data['prompt']):
                 # Если не удалось установить запрос (возможно, лимит), отмечаем промпт как ожидающий
-                self.message_monitor.table_manager.mark_pending(prompt_data['id'])
+                await self.message_monitor.table_manager.mark_pending(prompt_data['id'])
                 
                 if self.logger:
                     self.logger.log_app_event("TASK_SET_FAILED", 
@@ -98,33 +186,76 @@ class TelegramNavigator:
                                             "ERROR")
                 return False
 
-            # Отправляем команду /video и сразу модель
-            if self.logger:
-                self.logger.log_outgoing("/video", self.config.get('bot_name', 'Unknown'), "COMMAND")
-                
-            await self.client.send_message(self.bot, '/video')
-            
-            if self.logger:
-                self.logger.log_outgoing(model, self.config.get('bot_name', 'Unknown'), "MODEL",
-                                      {"model_number": model_number})
-                
-            await self.client.send_message(self.bot, model)
-            await asyncio.sleep(0.5)
+            # Отправка в чат бота выполняется по очереди: сообщения разных слотов не перемешиваются,
+            # а ожидание видео идет уже вне блокировки
+            async with self.submission_lock(self.bot):
+                if self.message_monitor.menu_model == model:
+                    # Бот уже ждет промпт для этой модели - навигация не нужна
+                    self.navigations_skipped += 1
+                    if self.logger:
+                        self.logger.log_app_event("NAVIGATION_SKIPPED", f"Бот уже в режиме модели {model}, меню пропущено",
+                                                  extra_info={"prompt_id": prompt_data['id'], "slot": slot})
+                else:
+                    # Отправляем команду /video и сразу модель, затем ждем, пока бот подтвердит выбор
+                    ack = self.message_monitor.expect_model_ack()
+                    try:
+                        if self.logger:
+                            self.logger.log_outgoing("/video", self.config.get('bot_name', 'Unknown'), "COMMAND")
+                        
+                        await self.rate_limiter.send(self.bot, '/video')
+                    
+                        if self.logger:
+                            self.logger.log_outgoing(model, self.config.get('bot_name', 'Unknown'), "MODEL",
+                                                  {"model_number": model_number})
+                        
+                        model_message = await self.rate_limiter.send(self.bot, model)
+                        ack_started = time.monotonic()
+                        confirmed = await self.message_monitor.wait_model_ack(ack, getattr(model_message, 'id', 0),
+                                                                              self.model_ack_timeout)
+                    finally:
+                        self.message_monitor.discard_model_ack(ack)
+                    self.navigations_sent += 1
+
+                    if confirmed is False:
+                        message = f"Бот не подтвердил выбор модели {model} (слот {slot}), промпт не отправлен"
+                        print(message)
+                        if self.logger:
+                            self.logger.log_app_event("MODEL_ACK_FAILED", message, "WARNING", {"prompt_id": prompt_data['id']})
+                        self.message_monitor.release_request(slot)
+                        self.message_monitor.record_failure(prompt_data['id'], FailurePolicy.SEND_FAILED, message)
+                        return False
+                    if confirmed is None:
+                        # Бот не ответил вовремя - отправляем промпт, но состояние меню не запоминаем
+                        if self.logger:
+                            self.logger.log_app_event("MODEL_ACK_TIMEOUT",
+                                                      f"Нет ответа на выбор модели {model} за {self.model_ack_timeout:g} с",
+                                                      "WARNING", {"prompt_id": prompt_data['id']})
+                    else:
+                        self.message_monitor.set_menu_model(model, getattr(model_message, 'id', 0))
+                        if self.logger:
+                            self.logger.log_app_event("MODEL_ACK", f"Бот подтвердил выбор модели {model}",
+                                                      extra_info={"seconds": round(time.monotonic() - ack_started, 3)})
 
-            # Отправляем промпт
-            print(f"Отправлен промпт (Слот {slot}): {prompt_data['prompt']}")
+                # Отправляем промпт
+                print(f"Отправлен промпт (Слот {slot}): {prompt_text}")
             
-            if self.logger:
-                self.logger.log_outgoing(prompt_data['prompt'], self.config.get('bot_name', 'Unknown'), "PROMPT",
-                                      {"prompt_id": prompt_data['id'], "slot": slot})
+                if self.logger:
+                    self.logger.log_outgoing(prompt_text, self.config.get('bot_name', 'Unknown'), "PROMPT",
+                                          {"prompt_id": prompt_data['id'], "slot": slot})
                 
-            await self.client.send_message(self.bot, prompt_data['prompt'])
+                await self.rate_limiter.send(self.bot, prompt_text)
+            return True
 
-            print(f"Ожидание получения видео (Слот {slot})...")
+        except FloodWaitError as e:
+            # Telegram просит подождать - промпт повторится после паузы
+            message = f"Telegram ограничил частоту запросов на {e.seconds} с (слот {slot})"
+            print(message)
             if self.logger:
-                self.logger.log_app_event("WAITING_VIDEO", f"Ожидание получения видео в слоте {slot}")
-                
-            return await self.message_monitor.wait_for_video(slot)
+                self.logger.log_app_event("FLOOD_WAIT", message, "WARNING",
+                                          {"seconds": e.seconds, "prompt_id": prompt_data['id']})
+            self.message_monitor.release_request(slot)
+            self.message_monitor.record_failure(prompt_data['id'], FailurePolicy.FLOOD_WAIT, e.seconds)
+            return False
 
         except Exception as e:
             error_message = f"Ошибка при навигации в слоте {slot}: {e}"
@@ -133,50 +264,27 @@ class TelegramNavigator:
             if self.logger:
                 self.logger.log_exception(e, context=f"При навигации для промпта {prompt_data['id']} в слоте {slot}")
                 
+            self.message_monitor.release_request(slot)
             return False
-            
-    async def wait_for_limit_release(self, model=None):
+
+    async def collect_result(self, slot):
         """
-        Ожидает снятия лимита для указанной модели
-        Если модель не указана, ожидает снятия лимита для любой модели
+        Ожидает результат отправленного промпта
+
+        Видео и ошибки сопоставляет с запросом монитор сообщений, поэтому
+        ожидание не занимает слот отправки.
+        slot: номер слота запроса
         """
-        if model is None:
-            # Если модель не указана, используем текущую модель из конфига
-            model_number = self.config.get('model_number', '1')
-            model = self.models.get(model_number, self.models['1'])
-            
-        if not self.message_monitor.is_model_limited(model):
-            # Если лимита нет, возвращаем True
-            return True
-            
-        print(f"Ожидаем снятия лимита для модели {model} (текущее значение: {self.message_monitor.model_limits.get(model, 0)})")
-        
-        # Максимальное количество попыток ожидания
-        max_attempts = 3
-        current_attempt = 0
-        
-        while current_attempt < max_attempts:
-            current_attempt += 1
-            print(f"Попытка {current_attempt}/{max_attempts} ожидания снятия лимита для модели {model}")
-            
-            # Пробуем ожидать получения любого видео, которое может снять лимит
-            try:
-                success = await self.message_monitor.wait_for_any_video_received()
-                if success:
-                    # Проверяем, был ли снят лимит для данной модели
-                    if not self.message_monitor.is_model_limited(model):
-                        print(f"Лимит для модели {model} успешно снят")
-                        return True
-                    else:
-                        print(f"Получено видео, но лимит для модели {model} все еще активен")
-                        # Продолжаем попытки, если лимит все еще активен
-                else:
-                    print(f"Не удалось дождаться видео для снятия лимита модели {model}")
-                    # Если не получили видео, делаем паузу перед следующей попыткой
-                    await asyncio.sleep(5)
-            except Exception as e:
-                print(f"Ошибка при ожидании снятия лимита: {e}")
-                await asyncio.sleep(2)
-        
-        print(f"Все попытки ожидания снятия лимита для модели {model} исчерпаны")
-        return False 
\ No newline at end of file
+        try:
+            print(f"Ожидание получения видео (Слот {slot})...")
+            if self.logger:
+                self.logger.log_app_event("WAITING_VIDEO", f"Ожидание получения видео в слоте {slot}")
+
+            return await self.message_monitor.wait_for_video(slot)
+
+        except Exception as e:
+            print(f"Ошибка при ожидании видео в слоте {slot}: {e}")
+            if self.logger:
+                self.logger.log_exception(e, context=f"При ожидании видео в слоте {slot}")
+            self.message_monitor.release_request(slot)
+            return False
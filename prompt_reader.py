@@ -0,0 +1,181 @@
+import json
+import os
+
+# Служебные строки в начале промпта: '#models: 1,4', '#priority: 5', '#deadline: 2026-10-20 18:00'
+PROMPT_META_KEYS = ('models', 'priority', 'deadline')
+
+
+def split_prompt_meta(prompt):
+    """
+    Отделяет служебные строки в начале промпта от текста, который отправляется боту
+
+    Args:
+        prompt: Текст промпта из файла
+
+    Returns:
+        tuple: (словарь {ключ: значение}, текст промпта)
+    """
+    meta = {}
+    lines = prompt.split('\n')
+    while lines and lines[0].startswith('#'):
+        key, separator, value = lines[0][1:].partition(':')
+        key = key.strip().lower()
+        if not separator or key not in PROMPT_META_KEYS:
+            break
+        meta[key] = value.strip()
+        lines.pop(0)
+    if not meta:
+        return meta, prompt
+    return meta, '\n'.join(lines).strip()
+
+
+class PromptReader:
+    """
+    Потоковое чтение промптов из файла с сохранением позиции.
+
+    Промпты разделены пустой строкой и читаются по одному, без загрузки
+    всего файла в память. Позиция (смещение в байтах) сохраняется в файл
+    курсора только для промптов, обработка которых завершена, поэтому
+    после перезапуска чтение продолжается с первого незавершенного промпта.
+    Вместе с ней сохраняется, докуда файл был прочитан (read_until): промпты
+    до этой позиции после перезапуска читаются повторно и уже есть в таблице.
+    """
+
+    def __init__(self, prompt_file, cursor_file=None):
+        self.prompt_file = prompt_file
+        self.cursor_file = cursor_file
+        self.offset, self.read_until = self.load_cursor()
+        self.position = self.offset  # Смещение после последнего прочитанного промпта
+        self.exhausted = False
+        self._iterator = None
+        self._inflight = []  # [prompt_id, смещение после промпта, завершен]
+
+    def load_cursor(self):
+        """
+        Загружает сохраненную позицию
+
+        Returns:
+            tuple: (смещение завершенных промптов, смещение, до которого файл был прочитан)
+                в байтах; (0, 0), если курсор отсутствует или не подходит к файлу
+        """
+        if not self.cursor_file or not os.path.exists(self.cursor_file):
+            return 0, 0
+        try:
+            with open(self.cursor_file, 'r', encoding='utf-8') as f:
+                cursor = json.load(f)
+        except (OSError, ValueError):
+            return 0, 0
+
+        offset = int(cursor.get('offset', 0))
+        read_until = max(offset, int(cursor.get('read', offset)))
+        if cursor.get('file') != os.path.abspath(self.prompt_file):
+            return 0, 0
+        if not os.path.exists(self.prompt_file) or os.path.getsize(self.prompt_file) < read_until:
+            # Файл заменен или укорочен - начинаем сначала
+            return 0, 0
+        return offset, read_until
+
+    def save_cursor(self, offset):
+        """Атомарно сохраняет позицию"""
+        if not self.cursor_file:
+            return
+        tmp_file = self.cursor_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'file': os.path.abspath(self.prompt_file), 'offset': offset,
+                       'read': max(offset, self.position, self.read_until)}, f)
+        os.replace(tmp_file, self.cursor_file)
+
+    def reset_cursor(self):
+        """Сбрасывает позицию на начало файла"""
+        self.offset = 0
+        self.read_until = 0
+        self.position = 0
+        self._iterator = None
+        self.exhausted = False
+        self._inflight = []
+        if self.cursor_file and os.path.exists(self.cursor_file):
+            os.remove(self.cursor_file)
+
+    def iter_prompts(self, start_offset=0):
+        """
+        Читает промпты начиная с указанной позиции
+
+        Args:
+            start_offset: Смещение в байтах
+
+        Yields:
+            tuple: (текст промпта, смещение сразу после промпта)
+        """
+        with open(self.prompt_file, 'rb') as f:
+            f.seek(start_offset)
+            lines = []
+            position = start_offset
+            end = start_offset
+            for line in f:
+                position += len(line)
+                if line.strip():
+                    # Переводы строк приводятся к \n, как при чтении в текстовом режиме (CRLF в Windows)
+                    content = line.rstrip(b'\r\n')
+                    lines.append(content)
+                    # Смещение не зависит от того, что идет за промптом (разделитель,
+                    # дописанный позже, или конец файла)
+                    end = position - (len(line) - len(content))
+                    continue
+                if lines:
+                    yield b'\n'.join(lines).decode('utf-8').strip(), end
+                    lines = []
+            if lines:
+                yield b'\n'.join(lines).decode('utf-8').strip(), end
+
+    def read(self, limit):
+        """
+        Возвращает следующие промпты, не больше limit
+
+        Returns:
+            list: Список кортежей (текст промпта, смещение после промпта)
+        """
+        if self.exhausted:
+            return []
+        if self._iterator is None:
+            self._iterator = self.iter_prompts(self.offset)
+
+        batch = []
+        for prompt, offset in self._iterator:
+            batch.append((prompt, offset))
+            if len(batch) >= limit:
+                break
+        else:
+            self.exhausted = True
+        if batch:
+            self.position = batch[-1][1]
+            if self.position > self.read_until:
+                self.save_cursor(self.offset)
+        return batch
+
+    def is_reread(self, offset):
+        """Проверяет, был ли промпт, заканчивающийся на offset, прочитан до перезапуска"""
+        return offset <= self.read_until
+
+    def track(self, prompt_id, offset):
+        """Запоминает прочитанный промпт до завершения его обработки"""
+        self._inflight.append([prompt_id, offset, False])
+
+    def unfinished_ids(self):
+        """Возвращает ID прочитанных промптов, обработка которых не завершена"""
+        return [entry[0] for entry in self._inflight if not entry[2]]
+
+    def commit(self, prompt_id):
+        """
+        Отмечает промпт (все его вхождения) как обработанный и сдвигает
+        сохраненную позицию за все подряд завершенные промпты
+        """
+        for entry in self._inflight:
+            if entry[0] == prompt_id:
+                entry[2] = True
+
+        committed = None
+        while self._inflight and self._inflight[0][2]:
+            committed = self._inflight.pop(0)[1]
+        if committed is not None:
+            self.offset = committed
+            self.save_cursor(committed)
@@ -0,0 +1,81 @@
+import sys
+
+
+class PromptRecord:
+    """
+    Компактная строка таблицы промптов.
+
+    Хранит поля в __slots__ вместо словаря, а повторяющиеся короткие значения
+    (статус, модель, слот) интернирует, чтобы все строки ссылались на один объект.
+    Поддерживает доступ как к словарю (row['id'], row.get('slot')), поэтому
+    подходит везде, где раньше использовались строки csv.DictReader.
+    """
+
+    __slots__ = ('id', 'prompt', 'status', 'model', 'video_path', 'timestamp', 'slot')
+
+    FIELDS = __slots__
+    _KEYS = dict.fromkeys(__slots__).keys()
+    _INTERNED = frozenset(('status', 'model', 'slot'))
+
+    def __init__(self, id='', prompt='', status='pending', model='', video_path='', timestamp='', slot=''):
+        self.id = id
+        self.prompt = prompt
+        self.status = sys.intern(status)
+        self.model = sys.intern(model)
+        self.video_path = video_path
+        self.timestamp = timestamp
+        self.slot = sys.intern(slot)
+
+    @classmethod
+    def from_dict(cls, row):
+        """Создает запись из словаря (или другой записи)"""
+        return cls(*(str(row.get(field) or '') for field in cls.FIELDS))
+
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        value = str(value)
+        if key in self._INTERNED:
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        if key not in self._KEYS:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._KEYS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def keys(self):
+        return self._KEYS
+
+    def values(self):
+        return [getattr(self, field) for field in self.FIELDS]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.FIELDS]
+
+    def copy(self):
+        return PromptRecord(*self.values())
+
+    def __eq__(self, other):
+        if isinstance(other, PromptRecord):
+            return self.values() == other.values()
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"PromptRecord({dict(self.items())!r})"
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import deque
+from telethon.errors import FloodWaitError
+
+
+class TokenBucket:
+    """
+    Корзина токенов: в среднем rate сообщений в секунду, до burst подряд.
+
+    Токены резервируются заранее (их число может уйти в минус), поэтому
+    отправители получают время ожидания в порядке обращения и не опрашивают
+    корзину в цикле.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """
+        Резервирует токен
+
+        Returns:
+            float: Сколько секунд подождать перед отправкой
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class OutgoingRateLimiter:
+    """
+    Ограничение исходящих сообщений аккаунта.
+
+    Каждое сообщение ждет токен в общей корзине аккаунта и в корзине чата.
+    Если Telegram все же отвечает FloodWait, отправка всех сообщений
+    аккаунта приостанавливается ровно на указанное время, после чего
+    сообщение отправляется повторно. Ожидание дольше max_flood_wait
+    передается вызывающему коду как FloodWaitError (промпт уйдет в повтор).
+    """
+
+    MAX_FLOOD_RETRIES = 3
+
+    def __init__(self, client, chat_rate=1.0, chat_burst=3, account_rate=2.0, account_burst=5,
+                 max_flood_wait=300, logger=None):
+        """
+        Args:
+            client: Телеграм-клиент аккаунта
+            chat_rate: Сообщений в секунду в один чат
+            chat_burst: Сообщений подряд в один чат
+            account_rate: Сообщений в секунду со всего аккаунта
+            account_burst: Сообщений подряд со всего аккаунта
+            max_flood_wait: Самое долгое ожидание FloodWait без отказа (секунды)
+            logger: Логгер для записи событий
+        """
+        self.client = client
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.account_bucket = TokenBucket(account_rate, account_burst)
+        self.chat_buckets = {}
+        self.max_flood_wait = max_flood_wait
+        self.logger = logger
+        self.blocked_until = 0.0  # time.monotonic() окончания FloodWait
+
+        # Метрики
+        self.sent = 0
+        self.flood_waits = 0
+        self.throttle_seconds = 0.0
+        self.latencies = deque(maxlen=500)
+
+    @classmethod
+    def from_config(cls, config, client, logger=None):
+        """Создает ограничитель по ключам send_rate_*, send_burst_* и flood_wait_max_seconds"""
+        return cls(client,
+                   chat_rate=float(config.get('send_rate_per_chat', '1')),
+                   chat_burst=int(config.get('send_burst_per_chat', '3')),
+                   account_rate=float(config.get('send_rate_per_account', '2')),
+                   account_burst=int(config.get('send_burst_per_account', '5')),
+                   max_flood_wait=float(config.get('flood_wait_max_seconds', '300')),
+                   logger=logger)
+
+    def _chat_bucket(self, chat):
+        key = getattr(chat, 'user_id', None) or getattr(chat, 'channel_id', None) or str(chat)
+        if key not in self.chat_buckets:
+            self.chat_buckets[key] = TokenBucket(self.chat_rate, self.chat_burst)
+        return self.chat_buckets[key]
+
+    async def _acquire(self, chat):
+        """Ждет токены аккаунта и чата и окончание FloodWait; возвращает время ожидания"""
+        wait = max(self.account_bucket.reserve(), self._chat_bucket(chat).reserve(),
+                   self.blocked_until - time.monotonic())
+        if wait > 0:
+            await asyncio.sleep(wait)
+            self.throttle_seconds += wait
+            return wait
+        return 0.0
+
+    async def send(self, chat, message):
+        """
+        Отправляет сообщение с учетом ограничений
+
+        Raises:
+            FloodWaitError: Telegram требует ждать дольше max_flood_wait
+        """
+        for attempt in range(1, self.MAX_FLOOD_RETRIES + 1):
+            await self._acquire(chat)
+            started = time.monotonic()
+            try:
+                result = await self.client.send_message(chat, message)
+            except FloodWaitError as e:
+                self.flood_waits += 1
+                message_text = f"FloodWait {e.seconds} с при отправке сообщения (попытка {attempt})"
+                print(message_text)
+                if self.logger:
+                    self.logger.log_app_event("FLOOD_WAIT", message_text, "WARNING", {"seconds": e.seconds})
+                if e.seconds > self.max_flood_wait or attempt == self.MAX_FLOOD_RETRIES:
+                    raise
+                self.blocked_until = max(self.blocked_until, time.monotonic() + e.seconds)
+                continue
+            self.sent += 1
+            self.latencies.append(time.monotonic() - started)
+            return result
+
+    def get_metrics(self):
+        """
+        Returns:
+            dict: Отправлено сообщений, FloodWait, суммарное ожидание и задержка отправки (секунды)
+        """
+        latencies = sorted(self.latencies)
+        return {
+            'sent': self.sent,
+            'flood_waits': self.flood_waits,
+            'throttle_seconds': round(self.throttle_seconds, 1),
+            'latency_avg': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'latency_p95': round(latencies[max(0, -(-95 * len(latencies) // 100) - 1)], 3) if latencies else None,
+        }
@@ -6,10 +6,11 @@ class RequestManager:
         self.max_slots = max_slots
         self.table_manager = table_manager
         self.active_slots = {}  # slot_number: prompt_id
+        self.draining = False  # Плавная остановка: новые слоты не выдаются
         
     async def get_available_slot(self):
         """Возвращает номер доступного слота или None"""
-        active_prompts = self.table_manager.get_active_prompts()
+        active_prompts = await self.table_manager.get_active_prompts()
         used_slots = set(int(p.get('slot', 0)) for p in active_prompts)
         
         for slot in range(1, self.max_slots + 1):
@@ -21,7 +22,7 @@ class RequestManager:
         """Получает слот для промпта"""
         slot = await self.get_available_slot()
         if slot:
-            self.table_manager.mark_queued(prompt_id, slot)
+            await self.table_manager.mark_queued(prompt_id, slot)
             self.active_slots[slot] = prompt_id
             print(f"Промпт {prompt_id} добавлен в слот {slot}")
             return slot
@@ -0,0 +1,211 @@
+import random
+import time
+
+
+class Backoff:
+    """
+    Экспоненциальная задержка со случайным разбросом.
+
+    Задержка попытки n: base * factor^(n-1), но не больше max_delay, затем
+    умножается на случайный коэффициент 1 ± jitter, чтобы промпты, упавшие
+    одновременно, не возвращались в очередь одной пачкой.
+    """
+
+    def __init__(self, base, factor=2.0, max_delay=3600.0, jitter=0.2):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    @classmethod
+    def parse(cls, value, jitter=0.2):
+        """
+        Разбирает расписание вида 'база:множитель:максимум', например '30:2:900'
+
+        Returns:
+            Backoff: Расписание задержек
+        """
+        parts = value.strip().split(':')
+        try:
+            numbers = [float(part) for part in parts if part.strip()]
+        except ValueError:
+            raise ValueError(f"Неверное расписание повторов: {value}")
+        if not 1 <= len(numbers) <= 3 or min(numbers) < 0:
+            raise ValueError(f"Неверное расписание повторов: {value}")
+        return cls(*numbers, jitter=jitter)
+
+    def delay(self, attempt):
+        """Возвращает задержку в секундах перед попыткой attempt (с 1)"""
+        delay = min(self.max_delay, self.base * self.factor ** max(0, attempt - 1))
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
+
+
+class TimerWheel:
+    """
+    Колесо таймеров для отложенных повторов.
+
+    Элемент кладется в ячейку, соответствующую тику срабатывания (tick
+    секунд на тик). Добавление не зависит от количества отложенных
+    элементов, а цикл обработки просматривает только ячейки прошедших тиков.
+    """
+
+    def __init__(self, tick=1.0, size=512):
+        self.tick = tick
+        self.size = size
+        self.buckets = [[] for _ in range(size)]
+        self.started = time.monotonic()
+        self.position = 0  # Номер следующего непросмотренного тика
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _current_tick(self, now=None):
+        return int(((now if now is not None else time.monotonic()) - self.started) / self.tick)
+
+    def schedule(self, delay, item):
+        """Добавляет элемент, который сработает через delay секунд"""
+        due_tick = self._current_tick() + max(1, int(-(-delay // self.tick)))
+        self.buckets[due_tick % self.size].append((due_tick, item))
+        self.count += 1
+
+    def pop_due(self, now=None):
+        """
+        Returns:
+            list: Элементы, время которых наступило
+        """
+        current = self._current_tick(now)
+        due = []
+        if self.count:
+            # После долгого перерыва достаточно просмотреть колесо один раз
+            for tick in range(max(self.position, current - self.size + 1), current + 1):
+                bucket = self.buckets[tick % self.size]
+                if bucket:
+                    due.extend(item for due_tick, item in bucket if due_tick <= current)
+                    bucket[:] = [entry for entry in bucket if entry[0] > current]
+            self.count -= len(due)
+        self.position = current + 1
+        return due
+
+    def items(self, now=None):
+        """
+        Returns:
+            list: (секунды до срабатывания, элемент) для всех отложенных элементов
+        """
+        now = now if now is not None else time.monotonic()
+        return [(max(0.0, self.started + due_tick * self.tick - now), item)
+                for bucket in self.buckets for due_tick, item in bucket]
+
+    def next_delay(self, now=None):
+        """
+        Returns:
+            float: Секунды до ближайшего срабатывания или None, если колесо пусто
+        """
+        if not self.count:
+            return None
+        now = now if now is not None else time.monotonic()
+        due_tick = min(entry[0] for bucket in self.buckets for entry in bucket)
+        return max(0.0, self.started + due_tick * self.tick - now)
+
+
+class RetryScheduler:
+    """
+    Повторы неудачных промптов.
+
+    Классы отказов определяет FailurePolicy, у каждого класса свое
+    расписание задержек (backoff_<класс> в конфиге). Отложенные промпты
+    ждут в колесе таймеров, не занимая слотов, а история попыток хранится
+    для каждого промпта.
+    """
+
+    DEFAULT_BACKOFF = {
+        'error': '30:2:900',
+        'timeout': '300:2:3600',
+        'send_failed': '10:2:300',
+        'limit': '15:2:300',
+        'download': '30:2:600',
+        'flood_wait': '60:2:3600',
+    }
+
+    def __init__(self, policy, backoffs=None, tick=1.0, logger=None):
+        """
+        Args:
+            policy: FailurePolicy
+            backoffs: Словарь {класс отказа: Backoff}
+            tick: Точность колеса таймеров в секундах
+            logger: Логгер для записи событий
+        """
+        self.policy = policy
+        self.backoffs = {failure_class: Backoff.parse(self.DEFAULT_BACKOFF[failure_class])
+                         for failure_class in policy.FAILURE_CLASSES}
+        self.backoffs.update(backoffs or {})
+        self.logger = logger
+        self.wheel = TimerWheel(tick)
+        self.history = {}  # ID промпта: список попыток
+
+    @classmethod
+    def from_config(cls, config, policy, logger=None):
+        """Создает планировщик повторов по ключам backoff_<класс> и backoff_jitter"""
+        jitter = float(config.get('backoff_jitter', '0.2'))
+        backoffs = {}
+        for failure_class in policy.FAILURE_CLASSES:
+            value = config.get(f'backoff_{failure_class}', '').strip() or cls.DEFAULT_BACKOFF[failure_class]
+            backoffs[failure_class] = Backoff.parse(value, jitter)
+        return cls(policy, backoffs, logger=logger)
+
+    def __len__(self):
+        return len(self.wheel)
+
+    def attempts(self, prompt_id, failure_class=None):
+        """Возвращает количество неудачных попыток промпта (всех или одного класса)"""
+        return sum(1 for entry in self.history.get(prompt_id, ())
+                   if failure_class is None or entry['failure'] == failure_class)
+
+    def requeues(self, prompt_id):
+        """Возвращает, сколько раз промпт уже возвращался в очередь (с задержкой или с паузой модели)"""
+        return sum(1 for entry in self.history.get(prompt_id, ())
+                   if entry['action'] in (self.policy.REQUEUE, self.policy.PAUSE))
+
+    def record(self, prompt_id, failure_class, action, delay=0, detail=''):
+        """Добавляет попытку в историю промпта"""
+        entry = {'time': time.time(), 'failure': failure_class, 'action': action,
+                 'delay': round(delay, 1), 'detail': str(detail)[:100]}
+        self.history.setdefault(prompt_id, []).append(entry)
+        return entry
+
+    def delay(self, prompt_id, failure_class, minimum=0):
+        """Возвращает задержку после очередного отказа класса failure_class (до записи в историю)"""
+        attempt = self.attempts(prompt_id, failure_class) + 1
+        return max(minimum, self.backoffs[failure_class].delay(attempt))
+
+    def schedule(self, prompt_data, delay):
+        """Откладывает возврат промпта в очередь на delay секунд"""
+        self.wheel.schedule(delay, prompt_data)
+        if self.logger:
+            self.logger.log_app_event("RETRY_SCHEDULED", f"Промпт {prompt_data['id']} вернется в очередь через {delay:.0f} с",
+                                      extra_info={"prompt_id": prompt_data['id'], "delay": round(delay, 1)})
+
+    def pop_due(self):
+        """Возвращает промпты, время повтора которых наступило"""
+        return self.wheel.pop_due()
+
+    def next_delay(self):
+        """Возвращает секунды до ближайшего повтора или None"""
+        return self.wheel.next_delay()
+
+    def pending(self):
+        """
+        Returns:
+            list: (промпт, секунды до повтора) для отложенных промптов
+        """
+        return [(prompt_data, delay) for delay, prompt_data in self.wheel.items()]
+
+    def forget(self, prompt_id):
+        """Удаляет историю промпта после итогового результата и записывает ее в лог"""
+        history = self.history.pop(prompt_id, None)
+        if history and self.logger:
+            self.logger.log_app_event("RETRY_HISTORY", f"История попыток промпта {prompt_id}",
+                                      extra_info={"prompt_id": prompt_id, "attempts": history})
+        return history
@@ -0,0 +1,202 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from concurrency_controller import AIMDController
+
+
+class ModelScheduler:
+    """
+    Планировщик параллельных генераций.
+
+    Ограничивает общее количество одновременных запросов (parallel_requests)
+    и количество одновременных запросов для каждой модели (model_concurrency).
+    Бюджеты хранятся в asyncio.Semaphore: промпт отправляется, только когда
+    свободны и общий слот, и слот модели, а ожидание не требует опроса.
+    При adaptive_concurrency=true лимит модели подбирается AIMDController.
+
+    При pipeline_mode=true общий слот занимается только на время отправки
+    промпта, а ожидание видео ограничивают лишь лимиты моделей: количество
+    запросов в работе определяется возможностями бота, а не parallel_requests.
+    """
+
+    def __init__(self, max_slots, model_caps=None, default_cap=2, logger=None, controller=None, pipeline=False):
+        """
+        Args:
+            max_slots: Общее количество одновременных запросов
+            model_caps: Словарь {название модели: лимит одновременных запросов}
+            default_cap: Лимит для моделей, не указанных в model_caps
+            logger: Логгер для записи событий
+            controller: AIMDController (лимиты моделей становятся начальными окнами)
+            pipeline: Общий слот ограничивает только одновременную отправку промптов
+        """
+        self.max_slots = max_slots
+        self.model_caps = dict(model_caps or {})
+        self.default_cap = default_cap
+        self.logger = logger
+        self.controller = controller
+        self.pipeline = pipeline
+        self.slots = asyncio.Semaphore(max_slots)
+        self.submitting = 0  # Промпты, которые сейчас отправляются (в режиме pipeline)
+        self.active = {}  # модель: количество запросов в работе
+        self.paused = {}  # модель: время окончания паузы (time.monotonic)
+        self._model_semaphores = {}
+
+    @classmethod
+    def from_config(cls, config, models, logger=None):
+        """
+        Создает планировщик по конфигу
+
+        Args:
+            config: Конфигурация (parallel_requests, model_concurrency, model_concurrency_default, pipeline_mode)
+            models: Словарь {номер модели: название}, как в TelegramNavigator.models
+
+        Returns:
+            ModelScheduler: Планировщик
+        """
+        max_slots = int(config.get('parallel_requests', '1'))
+        if max_slots < 1:
+            raise ValueError("parallel_requests должно быть не меньше 1")
+        default_cap = int(config.get('model_concurrency_default', '2'))
+
+        # Формат: номер_модели:лимит через запятую, например 1:2,4:3
+        model_caps = {}
+        for item in config.get('model_concurrency', '').split(','):
+            if not item.strip():
+                continue
+            model_number, _, cap = item.partition(':')
+            model_number = model_number.strip()
+            if model_number not in models or not cap.strip().isdigit():
+                raise ValueError(f"Неверное значение model_concurrency: {item.strip()}")
+            model_caps[models[model_number]] = int(cap)
+
+        controller = None
+        if config.get('adaptive_concurrency', 'false').strip().lower() == 'true':
+            controller = AIMDController(model_caps, default_cap,
+                                        max_window=int(config.get('aimd_max_window', '8')),
+                                        increase=float(config.get('aimd_increase', '1')),
+                                        decrease=float(config.get('aimd_decrease', '0.5')),
+                                        logger=logger)
+        pipeline = config.get('pipeline_mode', 'false').strip().lower() == 'true'
+        return cls(max_slots, model_caps, default_cap, logger, controller, pipeline)
+
+    def cap(self, model):
+        """Возвращает лимит одновременных запросов для модели"""
+        if self.controller:
+            return self.controller.limit(model)
+        return self.model_caps.get(model, self.default_cap)
+
+    def record_success(self, model):
+        """Сообщает контроллеру, что бот принял запрос"""
+        if self.controller:
+            self.controller.record_success(model)
+
+    def record_limit(self, model):
+        """Сообщает контроллеру, что бот ответил сообщением о лимите"""
+        if self.controller:
+            self.controller.record_limit(model)
+
+    def get_window_metrics(self):
+        """
+        Returns:
+            dict: {модель: текущее окно} (пусто без адаптивного лимита)
+        """
+        return self.controller.get_metrics() if self.controller else {}
+
+    def max_in_flight(self, models):
+        """Возвращает наибольшее количество запросов в работе для перечисленных моделей"""
+        if not self.pipeline:
+            return self.max_slots
+        return sum(self.controller.max_window if self.controller else self.cap(model) for model in set(models))
+
+    def available(self, model):
+        """Возвращает количество свободных слотов модели с учетом общего лимита"""
+        free_model = self.cap(model) - self.active.get(model, 0)
+        if self.pipeline:
+            # Общий слот нужен только на время отправки - его ожидает сам промпт
+            return max(0, free_model)
+        free_global = self.max_slots - sum(self.active.values())
+        return max(0, min(free_global, free_model))
+
+    def has_capacity(self, model):
+        """Проверяет, можно ли сразу отправить промпт в модель"""
+        return not self.is_paused(model) and self.available(model) > 0
+
+    def pause(self, model, seconds=None):
+        """Приостанавливает отправку промптов в модель (без срока, если seconds не указан)"""
+        self.paused[model] = time.monotonic() + seconds if seconds else float('inf')
+        if self.logger:
+            self.logger.log_app_event("MODEL_PAUSED", f"Модель {model} приостановлена",
+                                      "WARNING", {"model": model, "seconds": seconds})
+
+    def resume(self, model):
+        """Снимает паузу модели"""
+        if self.paused.pop(model, None) is not None and self.logger:
+            self.logger.log_app_event("MODEL_RESUMED", f"Модель {model} снова доступна")
+
+    def next_resume_delay(self):
+        """Возвращает секунды до окончания ближайшей паузы со сроком или None"""
+        now = time.monotonic()
+        delays = [until - now for until in self.paused.values() if until != float('inf')]
+        return max(0.0, min(delays)) if delays else None
+
+    def is_paused(self, model):
+        """Проверяет, приостановлена ли модель"""
+        until = self.paused.get(model)
+        if until is None:
+            return False
+        if time.monotonic() >= until:
+            del self.paused[model]
+            return False
+        return True
+
+    def _model_semaphore(self, model):
+        if model not in self._model_semaphores:
+            # Адаптивное окно ограничивается при отправке, семафор - верхняя граница
+            size = self.controller.max_window if self.controller else self.cap(model)
+            self._model_semaphores[model] = asyncio.Semaphore(size)
+        return self._model_semaphores[model]
+
+    async def acquire(self, model):
+        """Ожидает слот модели, а затем общий слот (в режиме pipeline - только слот модели)"""
+        model_semaphore = self._model_semaphore(model)
+        await model_semaphore.acquire()
+        if not self.pipeline:
+            try:
+                await self.slots.acquire()
+            except BaseException:
+                model_semaphore.release()
+                raise
+        self.active[model] = self.active.get(model, 0) + 1
+        if self.logger:
+            self.logger.log_app_event("SCHEDULER_ACQUIRE", f"Занят слот модели {model}",
+                                      extra_info={"model": model, "active": self.active[model],
+                                                  "cap": self.cap(model)})
+
+    async def try_acquire(self, model):
+        """Занимает слот модели, только если он свободен сразу; возвращает True при успехе"""
+        if (self.available(model) <= 0 or self._model_semaphore(model).locked()
+                or (not self.pipeline and self.slots.locked())):
+            return False
+        await self.acquire(model)
+        return True
+
+    def release(self, model):
+        """Освобождает слот модели и общий слот"""
+        self.active[model] -= 1
+        if not self.pipeline:
+            self.slots.release()
+        self._model_semaphore(model).release()
+
+    @asynccontextmanager
+    async def submission(self):
+        """Удерживает общий слот на время отправки промпта (только в режиме pipeline)"""
+        if not self.pipeline:
+            yield
+            return
+        await self.slots.acquire()
+        self.submitting += 1
+        try:
+            yield
+        finally:
+            self.submitting -= 1
+            self.slots.release()
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from prompt_reader import PromptReader
+
+
+class SharedPromptQueue:
+    """
+    Общая очередь промптов для нескольких процессов бота на одном хосте.
+
+    Очередь хранится в файле SQLite. Каждый процесс (со своим аккаунтом Telegram)
+    атомарно забирает промпт с арендой (lease) на lease_seconds секунд и продлевает
+    ее, пока идет генерация. Если процесс упал и аренда истекла, промпт снова
+    становится доступен другим процессам. Завершенные промпты повторно не выдаются.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_CLAIMED = 'claimed'
+
+    def __init__(self, db_file, worker_id, lease_seconds=300):
+        self.db_file = db_file
+        self.worker_id = str(worker_id)
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_file)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # Транзакции открываются явно через BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(db_file, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                digest TEXT NOT NULL UNIQUE,
+                id TEXT NOT NULL UNIQUE,
+                prompt TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT NOT NULL DEFAULT '',
+                lease_until REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, seq)')
+
+    def _transaction(self, func):
+        """Выполняет func(conn) в эксклюзивной транзакции между процессами"""
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(self.conn)
+                self.conn.execute('COMMIT')
+                return result
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def populate(self, prompt_file, batch_size=1000):
+        """
+        Добавляет промпты из файла в очередь (повторный вызов из другого процесса безопасен)
+
+        Returns:
+            int: Количество новых промптов
+        """
+        def insert(conn, batch):
+            before = conn.total_changes
+            for digest, prompt in batch:
+                if conn.execute("SELECT 1 FROM jobs WHERE digest = ?", (digest,)).fetchone():
+                    continue
+                # Короткий ID удлиняется, если уже занят другим промптом
+                length = 8
+                while length < len(digest) and conn.execute(
+                        "SELECT 1 FROM jobs WHERE id = ?", (digest[:length],)).fetchone():
+                    length += 4
+                conn.execute("INSERT INTO jobs (digest, id, prompt) VALUES (?, ?, ?)",
+                             (digest, digest[:length], prompt))
+            return conn.total_changes - before
+
+        added = 0
+        batch = []
+        for prompt, _ in PromptReader(prompt_file).iter_prompts():
+            batch.append((hashlib.md5(prompt.encode()).hexdigest(), prompt))
+            if len(batch) >= batch_size:
+                added += self._transaction(lambda conn: insert(conn, batch))
+                batch = []
+        if batch:
+            added += self._transaction(lambda conn: insert(conn, batch))
+        return added
+
+    def claim(self):
+        """
+        Атомарно забирает следующий свободный промпт
+
+        Returns:
+            dict: {'id', 'prompt'} или None, если свободных промптов нет
+        """
+        def take(conn):
+            now = time.time()
+            row = conn.execute(
+                "SELECT seq, id, prompt FROM jobs WHERE status = ? "
+                "OR (status = ? AND lease_until < ?) ORDER BY seq LIMIT 1",
+                (self.STATUS_PENDING, self.STATUS_CLAIMED, now)).fetchone()
+            if not row:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1 WHERE seq = ?",
+                (self.STATUS_CLAIMED, self.worker_id, now + self.lease_seconds, row[0]))
+            return {'id': row[1], 'prompt': row[2]}
+
+        return self._transaction(take)
+
+    def renew(self):
+        """
+        Продлевает аренду всех промптов этого процесса
+
+        Returns:
+            int: Количество продленных аренд
+        """
+        def extend(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE status = ? AND worker = ?",
+                (time.time() + self.lease_seconds, self.STATUS_CLAIMED, self.worker_id))
+            return cursor.rowcount
+
+        return self._transaction(extend)
+
+    def complete(self, prompt_id, status):
+        """Фиксирует итоговый статус промпта (completed, skipped, error, timeout)"""
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = ?, lease_until = 0 WHERE id = ? AND worker = ?",
+            (status, prompt_id, self.worker_id)))
+
+    def release(self, prompt_id):
+        """Возвращает промпт в общую очередь"""
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = ?, worker = '', lease_until = 0 WHERE id = ? AND worker = ? AND status = ?",
+            (self.STATUS_PENDING, prompt_id, self.worker_id, self.STATUS_CLAIMED)))
+
+    def release_all(self, keep=()):
+        """
+        Возвращает в очередь все промпты этого процесса
+
+        Args:
+            keep: ID промптов, аренда которых остается за процессом (генерация
+                  продолжится после перезапуска, пока аренда не истекла)
+        """
+        def release(conn):
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_ids (id TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM keep_ids")
+            conn.executemany("INSERT OR IGNORE INTO keep_ids VALUES (?)", [(prompt_id,) for prompt_id in keep])
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = '', lease_until = 0 WHERE worker = ? AND status = ? "
+                "AND id NOT IN (SELECT id FROM keep_ids)",
+                (self.STATUS_PENDING, self.worker_id, self.STATUS_CLAIMED))
+
+        self._transaction(release)
+
+    def remaining(self):
+        """
+        Returns:
+            int: Количество промптов, еще не получивших итоговый статус
+        """
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)",
+                                     (self.STATUS_PENDING, self.STATUS_CLAIMED)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from table_manager import TableManager
+from prompt_record import PromptRecord
+
+
+class SQLiteTableManager(TableManager):
+    """
+    Менеджер таблицы промптов с хранением в SQLite.
+
+    Публичный интерфейс совпадает с TableManager, но каждое изменение статуса
+    обновляет одну строку по индексу вместо перезаписи всего CSV.
+    CSV-файл остается доступным через export_csv().
+    """
+
+    def __init__(self, config):
+        base_path = config.get('downloads_path', 'downloaded_videos')
+        os.makedirs(base_path, exist_ok=True)
+        self.db_file = os.path.join(base_path, config.get('table_db_file', 'prompts_table.db'))
+
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_schema()
+
+        super().__init__(config)
+
+    def _create_schema(self):
+        """Создает таблицу и индексы, если их нет"""
+        with self._lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS prompts (
+                    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL,
+                    prompt TEXT NOT NULL DEFAULT '',
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    model TEXT NOT NULL DEFAULT '',
+                    video_path TEXT NOT NULL DEFAULT '',
+                    timestamp TEXT NOT NULL DEFAULT '',
+                    slot TEXT NOT NULL DEFAULT ''
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_prompts_id ON prompts(id)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_prompts_status ON prompts(status)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_prompts_slot ON prompts(slot)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_prompts_model ON prompts(model)')
+
+    def _select(self, where='', params=()):
+        """Выполняет выборку строк в порядке добавления"""
+        query = f"SELECT {', '.join(self.headers)} FROM prompts"
+        if where:
+            query += f" WHERE {where}"
+        query += " ORDER BY row_id"
+        with self._lock:
+            return [PromptRecord(*row) for row in self.conn.execute(query, params)]
+
+    def clear_table(self):
+        """Очищает таблицу в базе"""
+        self._reset_dedup_index()
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM prompts')
+
+    def _ensure_table_exists(self):
+        """Схема создается при инициализации"""
+        pass
+
+    def _read_table(self):
+        """Читает всю таблицу"""
+        return self._select()
+
+    def _write_table(self, rows):
+        """Заменяет содержимое таблицы переданными строками"""
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM prompts')
+            self._insert_rows(rows)
+
+    def _append_rows(self, rows):
+        """Добавляет новые строки в таблицу"""
+        with self._lock, self.conn:
+            self._insert_rows(rows)
+
+    def _insert_rows(self, rows):
+        """Вставляет строки (вызывается внутри транзакции)"""
+        self.conn.executemany(
+            f"INSERT INTO prompts ({', '.join(self.headers)}) VALUES ({', '.join('?' * len(self.headers))})",
+            ([str(row.get(field) or '') for field in self.headers] for row in rows)
+        )
+
+    def update_status(self, prompt_id, status, model='', video_path='', slot=''):
+        """Обновляет статус и другие поля промпта"""
+        fields = {'status': status, 'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        if model:
+            fields['model'] = model
+        if video_path:
+            fields['video_path'] = video_path
+        if slot:
+            fields['slot'] = str(slot)
+
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        with self._lock, self.conn:
+            self.conn.execute(f"UPDATE prompts SET {assignments} WHERE id = ?",
+                              (*fields.values(), prompt_id))
+
+    def _rows_with_status(self, *statuses):
+        """Возвращает строки с одним из указанных статусов"""
+        return self._select(f"status IN ({', '.join('?' * len(statuses))})", statuses)
+
+    def get_slot_prompts(self, slot_number):
+        """Получает список промптов для конкретного слота"""
+        return self._select("slot = ?", (str(slot_number),))
+
+    def get_model_prompts(self, model):
+        """Получает список промптов для модели"""
+        return self._select("model = ?", (model,))
+
+    def count_by_status(self):
+        """Возвращает количество строк для каждого статуса"""
+        with self._lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM prompts GROUP BY status"))
+
+    def get_status(self, prompt_id):
+        rows = self._select("id = ?", (prompt_id,))
+        return rows[0] if rows else None
+
+    def close(self):
+        """Выгружает таблицу в CSV и закрывает соединение с базой"""
+        with self._lock:
+            self.export_csv()
+            self.conn.close()
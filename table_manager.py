@@ -1,13 +1,40 @@
 import csv
 import os
 import hashlib
+import threading
+from abc import ABC, abstractmethod
 from datetime import datetime
+from prompt_reader import PromptReader
+from prompt_record import PromptRecord
+
+
+def create_table_manager(config):
+    """
+    Создает менеджер таблицы с хранилищем, выбранным в конфиге
+
+    Args:
+        config: Конфигурация (ключ storage_backend: csv, sqlite или journal)
+
+    Returns:
+        TableManager: Менеджер таблицы промптов
+    """
+    backend = config.get('storage_backend', 'csv').strip().lower()
+    if backend == 'sqlite':
+        from sqlite_table_manager import SQLiteTableManager
+        return SQLiteTableManager(config)
+    if backend == 'journal':
+        from journal_table_manager import JournalTableManager
+        return JournalTableManager(config)
+    if float(config.get('write_flush_interval', '0')) > 0:
+        from buffered_table_manager import BufferedTableManager
+        return BufferedTableManager(config)
+    return TableManager(config)
 
 class TableManager:
     def __init__(self, config):
         self.base_path = config.get('downloads_path', 'downloaded_videos')
         self.table_file = os.path.join(self.base_path, config.get('table_file', 'prompts_table.csv'))
-        self.headers = ['id', 'prompt', 'status', 'model', 'video_path', 'timestamp', 'slot']
+        self.headers = list(PromptRecord.FIELDS)
         
         # Статусы промптов
         self.STATUS_PENDING = 'pending'          # Ожидает обработки
@@ -18,11 +45,25 @@ class TableManager:
         self.STATUS_ERROR = 'error'             # Ошибка при обработке
         self.STATUS_SKIPPED = 'skipped'         # Пропущен пользователем
         self.STATUS_TIMEOUT = 'timeout'         # Превышено время ожидания
-        
-        self.clear_table()
+
+        # Индекс дедупликации: полный хеш промпта -> ID, и множество занятых ID
+        self._hash_index = {}
+        self._taken_ids = set()
+        self._dedup_index_loaded = False
+
+        # Статусы, которые сохраняются при возобновлении работы
+        self.FINISHED_STATUSES = (self.STATUS_COMPLETED, self.STATUS_SKIPPED)
+
+        # В режиме возобновления сохраняем таблицу прошлого запуска
+        self.resume = config.get('resume', 'false').strip().lower() == 'true'
+        if self.resume:
+            self._load_existing()
+        else:
+            self.clear_table()
 
     def clear_table(self):
         """Создает новую таблицу или очищает существующую"""
+        self._reset_dedup_index()
         os.makedirs(os.path.dirname(self.table_file), exist_ok=True)
         with open(self.table_file, 'w', newline='', encoding='utf-8') as f:
             writer = csv.DictWriter(f, fieldnames=self.headers)
@@ -33,33 +74,213 @@ class TableManager:
         if not os.path.exists(self.table_file):
             self.clear_table()
 
+    def _load_existing(self):
+        """Открывает таблицу прошлого запуска"""
+        self._ensure_table_exists()
+
     def generate_prompt_id(self, prompt):
         hash_object = hashlib.md5(prompt.encode())
         return hash_object.hexdigest()[:8]
 
+    def _reset_dedup_index(self):
+        """Очищает индекс дедупликации"""
+        self._hash_index = {}
+        self._taken_ids = set()
+        self._dedup_index_loaded = True
+
+    def _ensure_dedup_index(self):
+        """Заполняет индекс дедупликации строками, уже находящимися в таблице"""
+        if self._dedup_index_loaded:
+            return
+        self._dedup_index_loaded = True
+        for row in self._read_table():
+            digest = hashlib.md5(row['prompt'].encode()).digest()
+            self._hash_index.setdefault(digest, row['id'])
+            self._taken_ids.add(row['id'])
+
+    def _assign_prompt_id(self, prompt):
+        """
+        Выдает ID промпту с проверкой по полному хешу
+
+        Одинаковые промпты получают один и тот же ID. Если короткий ID уже
+        занят другим промптом, он удлиняется, пока не станет уникальным.
+
+        Returns:
+            tuple: (ID промпта, True если промпт встретился впервые)
+        """
+        digest = hashlib.md5(prompt.encode()).digest()
+        prompt_id = self._hash_index.get(digest)
+        if prompt_id:
+            return prompt_id, False
+
+        full_hash = digest.hex()
+        length = 8
+        while full_hash[:length] in self._taken_ids and length < len(full_hash):
+            length += 4
+        prompt_id = full_hash[:length]
+
+        self._hash_index[digest] = prompt_id
+        self._taken_ids.add(prompt_id)
+        return prompt_id, True
+
+    def _make_row(self, prompt, prompt_id=None):
+        """Создает строку таблицы для нового промпта"""
+        return PromptRecord(id=prompt_id or self.generate_prompt_id(prompt), prompt=prompt,
+                            status=self.STATUS_PENDING)
+
     def load_prompts(self, prompt_file):
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            prompts = [p.strip() for p in f.read().split('\n\n') if p.strip()]
+        reader = PromptReader(prompt_file)
+        self._reset_dedup_index()
 
+        # Повторы промпта получают тот же ID: задача одна, а ее статус
+        # записывается во все строки-вхождения
         new_prompts = []
-        for prompt in prompts:
-            new_prompts.append({
-                'id': self.generate_prompt_id(prompt),
-                'prompt': prompt,
-                'status': 'pending',
-                'model': '',
-                'video_path': '',
-                'timestamp': ''
-            })
+        duplicates = 0
+        for prompt, _ in reader.iter_prompts():
+            prompt_id, is_new = self._assign_prompt_id(prompt)
+            if not is_new:
+                duplicates += 1
+            new_prompts.append(self._make_row(prompt, prompt_id))
+
+        if duplicates:
+            print(f"Найдено {duplicates} повторяющихся промптов, они будут сгенерированы один раз")
+
+        if self.resume:
+            new_prompts = self._reconcile(new_prompts)
 
         self._write_table(new_prompts)
         return new_prompts
 
+    def _reconcile(self, new_prompts):
+        """
+        Сопоставляет перечитанные промпты с таблицей прошлого запуска
+
+        Завершенные и пропущенные промпты сохраняются вместе со статусом и путем
+        к видео (во всех вхождениях), остальные ставятся в очередь заново.
+
+        Args:
+            new_prompts: Строки, построенные из файла промптов
+
+        Returns:
+            list: Строки новой таблицы
+        """
+        finished = {}
+        for row in self._read_table():
+            if row['status'] in self.FINISHED_STATUSES:
+                finished.setdefault(row['id'], []).append(row)
+
+        rows = []
+        kept = 0
+        used = {}
+        for row in new_prompts:
+            matches = finished.get(row['id'])
+            if not matches:
+                rows.append(row)
+                continue
+            # Лишние вхождения завершенного промпта (например, дописанный в файл повтор)
+            # получают его статус и видео, а не генерируются заново
+            count = used.get(row['id'], 0)
+            used[row['id']] = count + 1
+            rows.append(matches[count] if count < len(matches) else PromptRecord.from_dict(matches[0]))
+            kept += 1
+
+        # Завершенные промпты, которых больше нет в файле, остаются в таблице
+        for prompt_id, matches in finished.items():
+            rows.extend(matches[used.get(prompt_id, 0):])
+
+        print(f"Возобновление работы: сохранено {kept} завершенных промптов, "
+              f"в очереди {len(new_prompts) - kept}")
+        return rows
+
+    def requeue_unfinished(self, keep=()):
+        """
+        Возвращает в очередь промпты, не завершенные в прошлом запуске
+
+        Args:
+            keep: ID промптов, которые бот продолжает ожидать (из контрольной точки)
+
+        Returns:
+            int: Количество возвращенных промптов
+        """
+        unfinished = [row for row in self._read_table()
+                      if row['status'] not in self.FINISHED_STATUSES and row['status'] != self.STATUS_PENDING
+                      and row['id'] not in keep]
+        for prompt_id in {row['id'] for row in unfinished}:
+            self.mark_pending(prompt_id)
+        return len(unfinished)
+
+    def ingest_prompts(self, prompt_reader, limit):
+        """
+        Дочитывает следующие промпты из файла и добавляет их в таблицу
+
+        Args:
+            prompt_reader: PromptReader с позицией в файле промптов
+            limit: Максимальное количество промптов
+
+        Returns:
+            list: Добавленные строки
+        """
+        self._ensure_dedup_index()
+
+        rows = []
+        new_prompts = []
+        for prompt, offset in prompt_reader.read(limit):
+            prompt_id, is_new = self._assign_prompt_id(prompt)
+            prompt_reader.track(prompt_id, offset)
+            existing = None if is_new else self.get_status(prompt_id)
+
+            # После перезапуска промпты от курсора до места, где остановилось чтение,
+            # читаются повторно: их строки уже в таблице, а незавершенные - в очереди
+            if existing and prompt_reader.is_reread(offset):
+                if existing['status'] in self.FINISHED_STATUSES:
+                    prompt_reader.commit(prompt_id)
+                continue
+
+            row = self._make_row(prompt, prompt_id)
+
+            # Повтор уже известного промпта (в том числе из прошлого запуска)
+            # записывается строкой-вхождением, как в load_prompts, но не занимает
+            # слот: его статус и видео общие с первым вхождением
+            if not is_new:
+                existing = existing or next((r for r in rows if r['id'] == prompt_id), None)
+                if existing:
+                    for field in ('status', 'model', 'video_path', 'timestamp', 'slot'):
+                        row[field] = existing.get(field) or ''
+                    if existing['status'] in self.FINISHED_STATUSES:
+                        prompt_reader.commit(prompt_id)
+                rows.append(row)
+                continue
+
+            rows.append(row)
+            new_prompts.append(row)
+
+        if rows:
+            self._append_rows(rows)
+        return new_prompts
+
+    def add_prompt(self, prompt_id, prompt):
+        """
+        Добавляет в таблицу промпт с готовым ID (например, полученный из общей очереди)
+
+        Returns:
+            PromptRecord: Строка промпта в статусе pending
+        """
+        if self.get_status(prompt_id):
+            self.mark_pending(prompt_id)
+            return self.get_status(prompt_id)
+        if self._dedup_index_loaded:
+            # Тот же промпт, прочитанный позже из файла, станет вхождением этой строки
+            self._hash_index.setdefault(hashlib.md5(prompt.encode()).digest(), prompt_id)
+            self._taken_ids.add(prompt_id)
+        row = self._make_row(prompt, prompt_id)
+        self._append_rows([row])
+        return row
+
     def _read_table(self):
         """Читает всю таблицу"""
         self._ensure_table_exists()
         with open(self.table_file, 'r', encoding='utf-8') as f:
-            return list(csv.DictReader(f))
+            return [PromptRecord.from_dict(row) for row in csv.DictReader(f)]
 
     def _write_table(self, rows):
         with open(self.table_file, 'w', newline='', encoding='utf-8') as f:
@@ -67,21 +288,36 @@ class TableManager:
             writer.writeheader()
             writer.writerows(rows)
 
+    def _append_rows(self, rows):
+        """Дописывает новые строки в конец таблицы"""
+        self._ensure_table_exists()
+        with open(self.table_file, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.headers)
+            writer.writerows(rows)
+
+    def _apply_update(self, row, status, model='', video_path='', slot=''):
+        """Применяет изменения статуса к строке таблицы"""
+        row['status'] = status
+        if model:
+            row['model'] = model
+        if video_path:
+            row['video_path'] = video_path
+        if slot:
+            row['slot'] = str(slot)
+        row['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
     def update_status(self, prompt_id, status, model='', video_path='', slot=''):
         """Обновляет статус и другие поля промпта"""
         rows = self._read_table()
         for row in rows:
             if row['id'] == prompt_id:
-                row['status'] = status
-                if model:
-                    row['model'] = model
-                if video_path:
-                    row['video_path'] = video_path
-                if slot:
-                    row['slot'] = str(slot)
-                row['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._apply_update(row, status, model, video_path, slot)
         self._write_table(rows)
 
+    def _rows_with_status(self, *statuses):
+        """Возвращает строки с одним из указанных статусов"""
+        return [row for row in self._read_table() if row['status'] in statuses]
+
     def mark_queued(self, prompt_id, slot_number):
         """Отмечает промпт как добавленный в очередь"""
         self.update_status(prompt_id, self.STATUS_QUEUED, slot=slot_number)
@@ -94,10 +330,20 @@ class TableManager:
         """Получает список промптов для конкретного слота"""
         return [row for row in self._read_table() if row.get('slot') == str(slot_number)]
 
+    def get_model_prompts(self, model):
+        """Получает список промптов для модели"""
+        return [row for row in self._read_table() if row.get('model') == model]
+
+    def count_by_status(self):
+        """Возвращает количество строк для каждого статуса"""
+        counts = {}
+        for row in self._read_table():
+            counts[row['status']] = counts.get(row['status'], 0) + 1
+        return counts
+
     def get_active_prompts(self):
         """Получает список активных промптов (в очереди или в обработке)"""
-        return [row for row in self._read_table() 
-               if row['status'] in [self.STATUS_QUEUED, self.STATUS_IN_PROGRESS, self.STATUS_WAITING_DOWNLOAD]]
+        return self._rows_with_status(self.STATUS_QUEUED, self.STATUS_IN_PROGRESS, self.STATUS_WAITING_DOWNLOAD)
 
     def mark_in_progress(self, prompt_id, model=''):
         """Отмечает промпт как находящийся в обработке"""
@@ -116,22 +362,13 @@ class TableManager:
             model: Модель, для которой произошла ошибка
             error_message: Сообщение об ошибке (опционально)
         """
-        rows = self._read_table()
-        for row in rows:
-            if row['id'] == prompt_id:
-                row['status'] = self.STATUS_ERROR
-                if model:
-                    row['model'] = model
-                row['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
-                # Добавляем информацию об ошибке в поле video_path
-                if error_message:
-                    error_info = f"ERROR: {error_message[:100]}"
-                    row['video_path'] = error_info
-                else:
-                    row['video_path'] = "ERROR: Неизвестная ошибка"
-                    
-        self._write_table(rows)
+        # Добавляем информацию об ошибке в поле video_path
+        if error_message:
+            error_info = f"ERROR: {error_message[:100]}"
+        else:
+            error_info = "ERROR: Неизвестная ошибка"
+
+        self.update_status(prompt_id, self.STATUS_ERROR, model=model, video_path=error_info)
         print(f"❌ Промпт {prompt_id} отмечен как завершившийся с ошибкой")
 
     def mark_completed(self, prompt_id, model='', video_path=''):
@@ -151,15 +388,21 @@ class TableManager:
 
     def get_in_progress_prompts(self):
         """Получает список промптов в обработке"""
-        return [row for row in self._read_table() if row['status'] == self.STATUS_IN_PROGRESS]
+        return self._rows_with_status(self.STATUS_IN_PROGRESS)
 
     def get_waiting_download_prompts(self):
         """Получает список промптов, ожидающих загрузки видео"""
-        return [row for row in self._read_table() if row['status'] == self.STATUS_WAITING_DOWNLOAD]
+        return self._rows_with_status(self.STATUS_WAITING_DOWNLOAD)
 
     def get_pending_prompts(self):
-        """Получает список необработанных промптов"""
-        return [row for row in self._read_table() if row['status'] == self.STATUS_PENDING]
+        """Получает список необработанных промптов, по одному на каждый уникальный ID"""
+        seen = set()
+        prompts = []
+        for row in self._rows_with_status(self.STATUS_PENDING):
+            if row['id'] not in seen:
+                seen.add(row['id'])
+                prompts.append(row)
+        return prompts
 
     def mark_pending(self, prompt_id):
         """Возвращает промпт в состояние ожидания"""
@@ -167,4 +410,226 @@ class TableManager:
 
     def get_all_prompts(self):
         """Получает список всех промптов из таблицы"""
-        return self._read_table() 
\ No newline at end of file
+        return self._read_table()
+
+    def export_csv(self, path=None):
+        """
+        Выгружает таблицу в CSV
+
+        Args:
+            path: Путь к файлу (по умолчанию table_file)
+
+        Returns:
+            str: Путь к записанному файлу
+        """
+        path = path or self.table_file
+        rows = self._read_table()
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.headers, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def close(self):
+        """Завершает работу с хранилищем"""
+        pass
+ 
+
+class MemoryTableManager(TableManager, ABC):
+    """
+    Базовый менеджер таблицы, который обслуживает чтения из памяти.
+
+    Подклассы определяют, как изменения попадают на диск (_persist_update),
+    и что делает фоновый поток на каждом тике (_on_tick).
+
+    Порядок блокировок: сначала _snapshot_lock, затем _lock. Запись снимка
+    (в том числе сброс буфера по порогу) нельзя начинать под _lock - для
+    этого служит _after_persist, который вызывается уже без блокировки.
+    """
+
+    def __init__(self, config):
+        self._lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()  # Сериализует запись снимков
+        self._rows = []    # PromptRecord в порядке добавления
+        self._index = {}   # id: PromptRecord или список записей с этим id
+        # Вторичные индексы: значение поля -> {id(записи): запись}
+        self._by_status = {}
+        self._by_slot = {}
+        self._by_model = {}
+        self._stop_event = threading.Event()
+        self._worker = None
+        super().__init__(config)
+
+    def _start_worker(self, interval, name):
+        """Запускает фоновый поток, вызывающий _on_tick каждые interval секунд"""
+        if interval <= 0:
+            return
+        self._worker = threading.Thread(target=self._worker_loop, args=(interval,), name=name, daemon=True)
+        self._worker.start()
+
+    def _worker_loop(self, interval):
+        while not self._stop_event.wait(interval):
+            try:
+                self._on_tick()
+            except Exception as e:
+                print(f"Ошибка в фоновом потоке таблицы: {e}")
+
+    def _stop_worker(self):
+        """Останавливает фоновый поток"""
+        self._stop_event.set()
+        if self._worker:
+            self._worker.join(timeout=5)
+            self._worker = None
+
+    def _on_tick(self):
+        """Периодическая работа фонового потока"""
+        pass
+
+    @abstractmethod
+    def _persist_update(self, prompt_id, record):
+        """Сохраняет изменение строки (вызывается под _lock, снимок здесь не пишется)"""
+
+    @abstractmethod
+    def _persist_rows(self, rows):
+        """Сохраняет новые строки (вызывается под _lock, снимок здесь не пишется)"""
+
+    def _after_persist(self):
+        """Вызывается после изменения таблицы, уже без блокировки"""
+        pass
+
+    def _set_rows(self, rows):
+        """Заменяет строки в памяти и перестраивает индекс"""
+        self._rows = []
+        self._index = {}
+        self._by_status = {}
+        self._by_slot = {}
+        self._by_model = {}
+        self._add_rows(rows)
+
+    def _add_rows(self, rows):
+        """Добавляет строки в память и индекс"""
+        added = []
+        for row in rows:
+            row = PromptRecord.from_dict(row)
+            self._rows.append(row)
+            # Список заводится только для повторяющихся ID
+            entry = self._index.get(row.id)
+            if entry is None:
+                self._index[row.id] = row
+            elif isinstance(entry, list):
+                entry.append(row)
+            else:
+                self._index[row.id] = [entry, row]
+            self._bucket_add(row)
+            added.append(row)
+        return added
+
+    def _bucket_add(self, row):
+        """Добавляет запись во вторичные индексы"""
+        key = id(row)
+        self._by_status.setdefault(row.status, {})[key] = row
+        self._by_slot.setdefault(row.slot, {})[key] = row
+        self._by_model.setdefault(row.model, {})[key] = row
+
+    def _bucket_move(self, row, old_status, old_model, old_slot):
+        """Переносит запись между корзинами вторичных индексов после изменения"""
+        key = id(row)
+        for buckets, old_value, new_value in ((self._by_status, old_status, row.status),
+                                               (self._by_model, old_model, row.model),
+                                               (self._by_slot, old_slot, row.slot)):
+            if old_value == new_value:
+                continue
+            bucket = buckets.get(old_value)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del buckets[old_value]
+            buckets.setdefault(new_value, {})[key] = row
+
+    def _update_row(self, row, apply):
+        """Изменяет запись функцией apply и обновляет вторичные индексы"""
+        old_status, old_model, old_slot = row.status, row.model, row.slot
+        apply(row)
+        self._bucket_move(row, old_status, old_model, old_slot)
+
+    def _rows_by_id(self, prompt_id):
+        """Возвращает все записи с указанным ID"""
+        entry = self._index.get(prompt_id)
+        if entry is None:
+            return ()
+        if isinstance(entry, list):
+            return entry
+        return (entry,)
+
+    def _append_rows(self, rows):
+        """Добавляет новые строки в таблицу"""
+        with self._lock:
+            self._persist_rows(self._add_rows(rows))
+        self._after_persist()
+
+    def _write_snapshot(self, rows):
+        """Атомарно записывает снимок таблицы в CSV"""
+        os.makedirs(os.path.dirname(self.table_file), exist_ok=True)
+        tmp_file = self.table_file + '.tmp'
+        with open(tmp_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.headers)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp_file, self.table_file)
+
+    def _ensure_table_exists(self):
+        """Таблица всегда находится в памяти"""
+        pass
+
+    def _load_existing(self):
+        """Загружает в память снимок таблицы прошлого запуска"""
+        if not os.path.exists(self.table_file):
+            self.clear_table()
+            return
+        with open(self.table_file, 'r', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        with self._lock:
+            self._set_rows(rows)
+
+    def _read_table(self):
+        """Возвращает копию всех строк таблицы"""
+        with self._lock:
+            return [row.copy() for row in self._rows]
+
+    def update_status(self, prompt_id, status, model='', video_path='', slot=''):
+        """Обновляет статус промпта в памяти и передает изменение в хранилище"""
+        with self._lock:
+            rows = self._rows_by_id(prompt_id)
+            if not rows:
+                return
+            for row in rows:
+                self._update_row(row, lambda r: self._apply_update(r, status, model, video_path, slot))
+            record = {'id': prompt_id, 'status': status, 'model': model, 'video_path': video_path,
+                      'slot': str(slot) if slot else '', 'timestamp': rows[0]['timestamp']}
+            self._persist_update(prompt_id, record)
+        self._after_persist()
+
+    def get_status(self, prompt_id):
+        with self._lock:
+            rows = self._rows_by_id(prompt_id)
+            return rows[0].copy() if rows else None
+
+    def _rows_with_status(self, *statuses):
+        """Возвращает строки с одним из указанных статусов по индексу статусов"""
+        with self._lock:
+            return [row.copy() for status in statuses for row in self._by_status.get(status, {}).values()]
+
+    def get_slot_prompts(self, slot_number):
+        """Получает список промптов для конкретного слота по индексу слотов"""
+        with self._lock:
+            return [row.copy() for row in self._by_slot.get(str(slot_number), {}).values()]
+
+    def get_model_prompts(self, model):
+        """Получает список промптов для модели по индексу моделей"""
+        with self._lock:
+            return [row.copy() for row in self._by_model.get(model, {}).values()]
+
+    def count_by_status(self):
+        """Возвращает количество строк для каждого статуса"""
+        with self._lock:
+            return {status: len(bucket) for status, bucket in self._by_status.items()}
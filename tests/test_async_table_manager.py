@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+from async_table_manager import AsyncTableManager
+from table_manager import TableManager
+
+
+class RecordingTableManager:
+    """Менеджер таблицы, запоминающий порядок и поток вызовов"""
+
+    STATUS_COMPLETED = 'completed'
+
+    def __init__(self):
+        self.calls = []
+        self.closed = False
+
+    def mark_completed(self, prompt_id, model, video_path=''):
+        self.calls.append((prompt_id, threading.current_thread().name))
+
+    def close(self):
+        self.closed = True
+
+
+def test_calls_run_in_order_on_the_writer_thread():
+    table_manager = RecordingTableManager()
+    async_table_manager = AsyncTableManager(table_manager)
+
+    async def run():
+        await asyncio.gather(*(async_table_manager.mark_completed(str(i), 'A') for i in range(20)))
+        await async_table_manager.close()
+
+    asyncio.run(run())
+    assert [prompt_id for prompt_id, _ in table_manager.calls] == [str(i) for i in range(20)]
+    assert all(name.startswith('table-writer') for _, name in table_manager.calls)
+    assert table_manager.closed
+
+
+def test_attributes_pass_through():
+    async_table_manager = AsyncTableManager(RecordingTableManager())
+    assert async_table_manager.STATUS_COMPLETED == 'completed'
+
+
+def test_wraps_table_manager(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    prompt_file.write_text('one\n\ntwo\n', encoding='utf-8')
+    table_manager = AsyncTableManager(TableManager({'downloads_path': str(tmp_path / 'downloads')}))
+
+    async def run():
+        rows = await table_manager.load_prompts(str(prompt_file))
+        await table_manager.mark_completed(rows[0]['id'], 'A', 'one.mp4')
+        status = await table_manager.get_status(rows[0]['id'])
+        pending = await table_manager.get_pending_prompts()
+        await table_manager.close()
+        return status, pending
+
+    status, pending = asyncio.run(run())
+    assert (status['status'], status['video_path']) == ('completed', 'one.mp4')
+    assert [row['prompt'] for row in pending] == ['two']
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip('telethon')
+
+from bot_account import load_accounts, select_account  # noqa: E402
+
+
+class FakeAccount:
+    def __init__(self, name, load, models):
+        self.name = name
+        self._load = load
+        self.models = models
+
+    def load(self):
+        return self._load
+
+    def select_model(self, prompt_data):
+        return self.models.get(prompt_data['id'])
+
+
+def test_load_accounts_list_and_fallback():
+    assert load_accounts({'accounts': '1:a, 2:b'}) == [('1', 'a'), ('2', 'b')]
+    assert load_accounts({'accounts': '', 'api_id': '3', 'api_hash': 'c'}) == [('3', 'c')]
+
+
+@pytest.mark.parametrize('accounts', ['1', 'x:a', '1:a,1:b'])
+def test_load_accounts_rejects_bad_values(accounts):
+    with pytest.raises(ValueError):
+        load_accounts({'accounts': accounts})
+
+
+def test_select_account_prefers_least_loaded():
+    busy = FakeAccount('busy', 0.75, {'p': 'A'})
+    idle = FakeAccount('idle', 0.25, {'p': 'B'})
+    assert select_account([busy, idle], {'id': 'p'}) == (idle, 'B')
+
+
+def test_select_account_skips_accounts_without_free_model():
+    busy = FakeAccount('busy', 0.75, {'p': 'A'})
+    full = FakeAccount('full', 0.0, {})
+    assert select_account([full, busy], {'id': 'p'}) == (busy, 'A')
+    assert select_account([full], {'id': 'p'}) == (None, None)
@@ -0,0 +1,76 @@
+import csv
+import threading
+
+from buffered_table_manager import BufferedTableManager
+
+
+def make_table_manager(tmp_path, **config):
+    config = {'downloads_path': str(tmp_path / 'downloads'), 'write_flush_interval': '60', **config}
+    return BufferedTableManager(config)
+
+
+def load(table_manager, tmp_path, prompts):
+    prompt_file = tmp_path / 'prompt.txt'
+    prompt_file.write_text('\n\n'.join(prompts) + '\n', encoding='utf-8')
+    return table_manager.load_prompts(str(prompt_file))
+
+
+def written_statuses(table_manager):
+    with open(table_manager.table_file, encoding='utf-8') as f:
+        return [row['status'] for row in csv.DictReader(f)]
+
+
+def test_updates_are_coalesced_until_flush(tmp_path):
+    table_manager = make_table_manager(tmp_path)
+    rows = load(table_manager, tmp_path, ['one', 'two'])
+    table_manager.mark_in_progress(rows[0]['id'], 'A')
+    table_manager.mark_completed(rows[0]['id'], 'A', 'one.mp4')
+
+    assert table_manager.get_status(rows[0]['id'])['status'] == 'completed'
+    assert written_statuses(table_manager) == ['pending', 'pending']
+    stats = table_manager.get_flush_stats()
+    assert (stats['updates'], stats['coalesced'], stats['dirty']) == (2, 1, 1)
+
+    assert table_manager.flush()
+    assert written_statuses(table_manager) == ['completed', 'pending']
+    assert not table_manager.flush()
+    table_manager.close()
+
+
+def test_flush_when_dirty_limit_is_reached(tmp_path):
+    table_manager = make_table_manager(tmp_path, write_flush_max_dirty='2')
+    rows = load(table_manager, tmp_path, ['one', 'two', 'three'])
+    table_manager.mark_skipped(rows[0]['id'])
+    assert written_statuses(table_manager) == ['pending', 'pending', 'pending']
+
+    table_manager.mark_skipped(rows[1]['id'])
+    assert written_statuses(table_manager) == ['skipped', 'skipped', 'pending']
+    assert table_manager.get_flush_stats()['dirty'] == 0
+    table_manager.close()
+
+
+def test_close_flushes_pending_updates(tmp_path):
+    table_manager = make_table_manager(tmp_path)
+    rows = load(table_manager, tmp_path, ['one'])
+    table_manager.mark_completed(rows[0]['id'], 'A')
+    table_manager.close()
+    assert written_statuses(table_manager) == ['completed']
+
+
+def test_threshold_flush_does_not_deadlock_with_background_flusher(tmp_path):
+    table_manager = make_table_manager(tmp_path, write_flush_interval='0.001', write_flush_max_dirty='1')
+    rows = load(table_manager, tmp_path, [f'prompt {i}' for i in range(20)])
+
+    def update_rows():
+        for _ in range(20):
+            for row in rows:
+                table_manager.mark_in_progress(row['id'], 'A')
+
+    threads = [threading.Thread(target=update_rows, daemon=True) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert not any(thread.is_alive() for thread in threads)
+    table_manager.close()
+    assert written_statuses(table_manager) == ['in_progress'] * 20
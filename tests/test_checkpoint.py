@@ -0,0 +1,40 @@
+import types
+
+from checkpoint import DrainCheckpoint
+from failure_policy import FailurePolicy
+from job_queue import JobQueue
+from retry_scheduler import RetryScheduler
+
+
+def make_account(api_id, requests):
+    return types.SimpleNamespace(api_id=api_id, message_monitor=types.SimpleNamespace(active_requests=requests))
+
+
+def test_save_and_load_once(tmp_path):
+    checkpoint_file = str(tmp_path / 'checkpoint.json')
+    queue = JobQueue()
+    queue.extend([{'id': 'a', 'prompt': 'one'}, {'id': 'b', 'prompt': 'two'}])
+    retry_scheduler = RetryScheduler(FailurePolicy())
+    retry_scheduler.schedule({'id': 'c', 'prompt': 'three'}, 100)
+    retry_scheduler.record('c', FailurePolicy.ERROR, FailurePolicy.REQUEUE, 100)
+    account = make_account('111', {2: {'prompt_id': 'd', 'prompt': 'four', 'source_prompt': '#priority: 1\nfour',
+                                       'model': 'A', 'start_time': 1.0, 'sent_message_id': 7,
+                                       'accepted': True}})
+
+    checkpoint = DrainCheckpoint(checkpoint_file)
+    checkpoint.save(queue, retry_scheduler, [account])
+    state = checkpoint.load()
+
+    assert state['queue'] == ['a', 'b']
+    assert [retry['id'] for retry in state['retries']] == ['c']
+    assert state['history']['c'][0]['failure'] == FailurePolicy.ERROR
+    assert state['in_flight'] == [{'api_id': '111', 'slot': 2, 'prompt_id': 'd', 'prompt': 'four',
+                                   'source_prompt': '#priority: 1\nfour', 'model': 'A', 'start_time': 1.0,
+                                   'sent_message_id': 7, 'status_message_id': None, 'accepted': True}]
+    # Контрольная точка читается один раз
+    assert checkpoint.load() is None
+    assert (tmp_path / 'checkpoint.json.loaded').exists()
+
+
+def test_load_without_checkpoint(tmp_path):
+    assert DrainCheckpoint(str(tmp_path / 'missing.json')).load() is None
@@ -0,0 +1,49 @@
+import asyncio
+
+from concurrency_controller import AIMDController
+from scheduler import ModelScheduler
+
+
+def test_initial_window_is_clamped():
+    controller = AIMDController({'A': 20, 'B': 0}, default_window=3, max_window=8)
+    assert controller.limit('A') == 8
+    assert controller.limit('B') == 1
+    assert controller.limit('C') == 3
+
+
+def test_window_grows_by_one_per_window_of_successes():
+    controller = AIMDController(default_window=2, max_window=8)
+    controller.record_success('A')
+    assert controller.limit('A') == 2
+    controller.record_success('A')
+    controller.record_success('A')
+    assert controller.limit('A') == 3
+
+
+def test_window_stops_at_max():
+    controller = AIMDController(default_window=3, max_window=4)
+    for _ in range(100):
+        controller.record_success('A')
+    assert controller.limit('A') == 4
+
+
+def test_limit_halves_window_down_to_min():
+    controller = AIMDController(default_window=6, decrease=0.5)
+    controller.record_limit('A')
+    assert controller.limit('A') == 3
+    controller.record_limit('A')
+    controller.record_limit('A')
+    assert controller.limit('A') == 1
+    assert controller.get_metrics() == {'A': 1}
+
+
+def test_scheduler_uses_controller_window():
+    async def run():
+        controller = AIMDController(default_window=1, max_window=4)
+        scheduler = ModelScheduler(4, default_cap=1, controller=controller)
+        await scheduler.acquire('A')
+        assert not scheduler.has_capacity('A')
+        controller.record_success('A')
+        assert scheduler.has_capacity('A')
+
+    asyncio.run(run())
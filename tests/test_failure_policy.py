@@ -0,0 +1,70 @@
+import pytest
+
+from failure_policy import FailurePolicy
+
+
+def test_classify_prefers_recorded_reason():
+    policy = FailurePolicy()
+    assert policy.classify('error', FailurePolicy.DOWNLOAD) == FailurePolicy.DOWNLOAD
+    assert policy.classify('error') == FailurePolicy.ERROR
+    assert policy.classify('timeout') == FailurePolicy.TIMEOUT
+    assert policy.classify('in_progress') == FailurePolicy.SEND_FAILED
+
+
+def test_retry_until_exhausted():
+    policy = FailurePolicy({'error': 'retry:2'})
+    assert policy.decide(FailurePolicy.ERROR, 1) == (FailurePolicy.RETRY, 2)
+    assert policy.decide(FailurePolicy.ERROR, 2) == (FailurePolicy.RETRY, 2)
+    assert policy.decide(FailurePolicy.ERROR, 3) == (FailurePolicy.SKIP, 0)
+
+
+def test_requeue_capped_by_max_requeues():
+    policy = FailurePolicy({'timeout': 'requeue:30'}, max_requeues=2)
+    assert policy.decide(FailurePolicy.TIMEOUT, 1, requeues=1) == (FailurePolicy.REQUEUE, 30)
+    assert policy.decide(FailurePolicy.TIMEOUT, 1, requeues=2) == (FailurePolicy.SKIP, 0)
+
+
+def test_exhausted_requeue_still_respects_cap():
+    policy = FailurePolicy({'error': 'retry:1'}, exhausted='requeue', max_requeues=3)
+    assert policy.decide(FailurePolicy.ERROR, 2, requeues=2) == (FailurePolicy.REQUEUE, 0)
+    assert policy.decide(FailurePolicy.ERROR, 2, requeues=3) == (FailurePolicy.SKIP, 0)
+
+
+def test_exhausted_pause_still_respects_cap():
+    policy = FailurePolicy({'send_failed': 'pause:60'}, exhausted='pause:120', max_requeues=1)
+    assert policy.decide(FailurePolicy.SEND_FAILED, 1, requeues=0) == (FailurePolicy.PAUSE, 60)
+    assert policy.decide(FailurePolicy.SEND_FAILED, 1, requeues=1) == (FailurePolicy.SKIP, 0)
+
+
+def test_rate_limits_are_not_capped():
+    policy = FailurePolicy(max_requeues=1)
+    assert policy.decide(FailurePolicy.LIMIT, 1, requeues=10) == (FailurePolicy.REQUEUE, 0)
+    assert policy.decide(FailurePolicy.FLOOD_WAIT, 1, requeues=10) == (FailurePolicy.REQUEUE, 0)
+
+
+def test_unlimited_requeues():
+    policy = FailurePolicy(max_requeues=0)
+    assert policy.decide(FailurePolicy.TIMEOUT, 1, requeues=100) == (FailurePolicy.REQUEUE, 0)
+
+
+def test_bare_pause_gets_default_duration():
+    assert FailurePolicy.parse_action('pause') == (FailurePolicy.PAUSE, FailurePolicy.DEFAULT_PAUSE_SECONDS)
+    assert FailurePolicy.parse_action('pause:30') == (FailurePolicy.PAUSE, 30)
+
+
+@pytest.mark.parametrize('value', ['wait', 'retry:x', 'pause:-5'])
+def test_invalid_actions(value):
+    with pytest.raises(ValueError):
+        FailurePolicy.parse_action(value)
+
+
+def test_exhausted_cannot_retry():
+    with pytest.raises(ValueError):
+        FailurePolicy(exhausted='retry:1')
+
+
+def test_from_config():
+    policy = FailurePolicy.from_config({'on_download': 'requeue:300', 'max_requeues': '2'})
+    assert policy.rules[FailurePolicy.DOWNLOAD] == (FailurePolicy.REQUEUE, 300)
+    assert policy.rules[FailurePolicy.ERROR] == (FailurePolicy.RETRY, 1)
+    assert policy.max_requeues == 2
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+from generation_stats import GenerationStats
+
+
+def test_timeout_uses_default_until_enough_samples():
+    stats = GenerationStats(min_samples=3, margin=2, min_timeout=0, max_timeout=10_000)
+    stats.record('A', 100)
+    stats.record('A', 200)
+    assert stats.timeout('A', 1200) == 1200
+    stats.record('A', 300)
+    assert stats.timeout('A', 1200) == 600
+
+
+def test_timeout_is_clamped():
+    stats = GenerationStats(min_samples=1, margin=1, min_timeout=180, max_timeout=300)
+    stats.record('fast', 10)
+    stats.record('slow', 1000)
+    assert stats.timeout('fast', 1200) == 180
+    assert stats.timeout('slow', 1200) == 300
+
+
+def test_not_adaptive_keeps_default():
+    stats = GenerationStats(min_samples=1, adaptive=False)
+    stats.record('A', 500)
+    assert stats.timeout('A', 1200) == 1200
+
+
+def test_quantile_nearest_rank():
+    stats = GenerationStats()
+    for value in range(1, 101):
+        stats.record('A', value)
+    assert stats.quantile('A', 50) == 50
+    assert stats.quantile('A', 95) == 95
+    assert stats.quantile('B', 95) is None
+
+
+def test_window_keeps_latest_samples():
+    stats = GenerationStats(window=3)
+    for value in (1, 2, 3, 4):
+        stats.record('A', value)
+    assert list(stats.durations['A']) == [2, 3, 4]
+
+
+def test_saves_and_reloads(tmp_path):
+    stats_file = str(tmp_path / 'stats.json')
+    stats = GenerationStats(stats_file, save_interval=0)
+    stats.record('A', 12.34)
+    assert json.loads(open(stats_file, encoding='utf-8').read()) == {'durations': {'A': [12.3]}}
+    assert list(GenerationStats(stats_file).durations['A']) == [12.3]
+
+
+def test_record_in_event_loop_writes_in_background(tmp_path):
+    stats_file = tmp_path / 'stats.json'
+    stats = GenerationStats(str(stats_file), save_interval=3600)
+
+    async def run():
+        stats.record('A', 10)
+        assert not stats_file.exists()
+        stats.save()
+        assert not stats.dirty
+
+        stats.save_interval = 0
+        stats.record('A', 20)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert json.loads(stats_file.read_text(encoding='utf-8')) == {'durations': {'A': [10.0, 20.0]}}
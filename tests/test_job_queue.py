@@ -0,0 +1,125 @@
+from datetime import datetime
+
+from job_queue import JobQueue
+
+
+def row(prompt_id, prompt='prompt'):
+    return {'id': prompt_id, 'prompt': prompt}
+
+
+def test_fifo_for_equal_priority(monkeypatch):
+    queue = JobQueue()
+    now = [1000.0]
+    monkeypatch.setattr('job_queue.time.time', lambda: now[0])
+    for prompt_id in ('a', 'b', 'c'):
+        queue.push(row(prompt_id))
+        now[0] += 1
+    assert [queue.pop()['id'] for _ in range(3)] == ['a', 'b', 'c']
+
+
+def test_priority_is_worth_aging_seconds(monkeypatch):
+    queue = JobQueue(aging_seconds=600)
+    now = [1000.0]
+    monkeypatch.setattr('job_queue.time.time', lambda: now[0])
+    queue.push(row('old'))
+    now[0] += 500
+    queue.push(row('urgent'), priority=1)
+    assert queue.peek()['id'] == 'urgent'
+
+    # Через aging_seconds ожидания промпт без приоритета обгоняет новый приоритетный
+    now[0] += 200
+    queue.push(row('late'), priority=1)
+    queue.pop()
+    assert queue.pop()['id'] == 'old'
+
+
+def test_priority_and_deadline_from_prompt_meta(monkeypatch):
+    queue = JobQueue(aging_seconds=600, deadline_lead=100)
+    monkeypatch.setattr('job_queue.time.time', lambda: 10_000.0)
+    deadline = datetime.fromtimestamp(5_000.0).isoformat()
+    queue.push(row('plain'))
+    queue.push(row('high', '#priority: 2\nvideo'))
+    queue.push(row('due', f'#deadline: {deadline}\nvideo'))
+    assert queue.ids() == ['due', 'high', 'plain']
+
+
+def test_requeue_keeps_key(monkeypatch):
+    queue = JobQueue()
+    now = [1000.0]
+    monkeypatch.setattr('job_queue.time.time', lambda: now[0])
+    queue.push(row('a'))
+    now[0] += 1
+    queue.push(row('b'))
+    first = queue.pop()
+    now[0] += 10_000
+    queue.requeue(first)
+    assert queue.pop()['id'] == 'a'
+
+
+def test_remove_buried_entry_updates_len():
+    queue = JobQueue()
+    queue.extend([row(prompt_id) for prompt_id in 'abc'])
+    assert queue.remove('b')
+    assert not queue.remove('b')
+    assert len(queue) == 2
+    assert queue.ids() == ['a', 'c']
+    assert [queue.pop()['id'], queue.pop()['id']] == ['a', 'c']
+    assert not queue
+
+
+def test_push_after_remove_is_not_dropped():
+    queue = JobQueue()
+    queue.extend([row('a'), row('b')])
+    queue.remove('b')
+    queue.push(row('b'))
+    assert len(queue) == 2
+    assert [queue.pop()['id'], queue.pop()['id']] == ['a', 'b']
+    assert len(queue) == 0
+
+
+def test_push_replaces_existing_entry():
+    queue = JobQueue()
+    queue.push(row('a'))
+    queue.push(row('a'), priority=5)
+    assert len(queue) == 1
+    assert queue.pop()['id'] == 'a'
+    assert not queue
+
+
+def test_many_removals_compact_heap():
+    queue = JobQueue()
+    queue.extend([row(str(number)) for number in range(500)])
+    for number in range(490):
+        queue.remove(str(number))
+    assert len(queue) == 10
+    assert len(queue._heap) <= 2 * len(queue) + 64
+    assert queue.pop()['id'] == '490'
+
+
+def test_pop_first_skips_blocked_head():
+    queue = JobQueue()
+    queue.extend([row('a', '#models: 1\na'), row('b'), row('c')])
+    prompt_data, result = queue.pop_first(lambda row: None if row['id'] == 'a' else 'model', 10)
+    assert (prompt_data['id'], result) == ('b', 'model')
+    # Пропущенный промпт остается первым
+    assert queue.ids() == ['a', 'c']
+    assert len(queue) == 2
+
+
+def test_pop_first_is_bounded():
+    queue = JobQueue()
+    queue.extend([row('a'), row('b')])
+    assert queue.pop_first(lambda row: row['id'] == 'b', 1) == (None, None)
+    assert queue.pop_first(lambda row: False, 10) == (None, None)
+    assert queue.ids() == ['a', 'b']
+
+
+def test_raise_priority_moves_queued_prompt_forward():
+    queue = JobQueue()
+    queue.extend([row('a'), row('b')])
+    assert queue.raise_priority('b', 100)
+    assert queue.ids() == ['b', 'a']
+    # Более низкий приоритет не отодвигает промпт назад
+    assert queue.raise_priority('b', -100)
+    assert queue.ids() == ['b', 'a']
+    assert not queue.raise_priority('missing', 100)
@@ -0,0 +1,85 @@
+import json
+import os
+
+from journal_table_manager import JournalTableManager
+from prompt_reader import PromptReader
+
+
+def make_config(tmp_path, resume):
+    return {'downloads_path': str(tmp_path), 'resume': 'true' if resume else 'false',
+            'journal_compact_interval': '0'}
+
+
+def crash(table_manager):
+    """Закрывает журнал без компакции, как при аварийном завершении"""
+    table_manager._stop_worker()
+    table_manager._journal.close()
+    table_manager._journal = None
+
+
+def test_recover_replays_journal(tmp_path):
+    table_manager = JournalTableManager(make_config(tmp_path, resume=False))
+    table_manager.add_prompt('a', 'first')
+    table_manager.add_prompt('b', 'second')
+    table_manager.mark_completed('a', 'A', 'a.mp4')
+    table_manager.mark_in_progress('b', 'B')
+    crash(table_manager)
+
+    recovered = JournalTableManager(make_config(tmp_path, resume=True))
+    assert recovered.get_status('a')['status'] == 'completed'
+    assert recovered.get_status('a')['video_path'] == 'a.mp4'
+    assert recovered.get_status('b')['status'] == 'in_progress'
+    # Журнал свернут в снимок при восстановлении
+    assert not os.path.exists(recovered.compacting_file)
+    assert os.path.getsize(recovered.journal_file) == 0
+    recovered.close()
+
+
+def test_recover_skips_torn_tail(tmp_path):
+    table_manager = JournalTableManager(make_config(tmp_path, resume=False))
+    table_manager.add_prompt('a', 'first')
+    table_manager.mark_completed('a', 'A')
+    journal_file = table_manager.journal_file
+    crash(table_manager)
+    with open(journal_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'id': 'a', 'status': 'error'})[:12])
+
+    recovered = JournalTableManager(make_config(tmp_path, resume=True))
+    assert recovered.get_status('a')['status'] == 'completed'
+    assert len(recovered.get_all_prompts()) == 1
+    recovered.close()
+
+
+def test_recover_after_crash_during_compaction(tmp_path):
+    table_manager = JournalTableManager(make_config(tmp_path, resume=False))
+    table_manager.add_prompt('a', 'first')
+    crash(table_manager)
+    # Сбой после переименования журнала, но до записи снимка
+    os.replace(table_manager.journal_file, table_manager.compacting_file)
+    with open(table_manager.journal_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'id': 'a', 'status': 'completed', 'model': 'A'}) + '\n')
+
+    recovered = JournalTableManager(make_config(tmp_path, resume=True))
+    assert recovered.get_status('a')['status'] == 'completed'
+    assert recovered.get_status('a')['model'] == 'A'
+    recovered.close()
+
+
+def test_recover_after_crash_before_compacted_journal_removed(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    prompt_file.write_text('x\n\nx\n\ny\n', encoding='utf-8')
+    table_manager = JournalTableManager(make_config(tmp_path, resume=False))
+    table_manager.ingest_prompts(PromptReader(str(prompt_file)), 10)
+    table_manager.mark_completed(table_manager.get_all_prompts()[0]['id'], 'A')
+    with open(table_manager.journal_file, 'r', encoding='utf-8') as f:
+        journal = f.read()
+    table_manager.compact()
+    crash(table_manager)
+    # Снимок уже записан, а свернутый журнал не удален
+    with open(table_manager.compacting_file, 'w', encoding='utf-8') as f:
+        f.write(journal)
+
+    recovered = JournalTableManager(make_config(tmp_path, resume=True))
+    assert [(row['prompt'], row['status']) for row in recovered.get_all_prompts()] == [
+        ('x', 'completed'), ('x', 'completed'), ('y', 'pending')]
+    recovered.close()
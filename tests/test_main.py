@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip('telethon')
+
+import asyncio  # noqa: E402
+
+import main  # noqa: E402
+from async_table_manager import AsyncTableManager  # noqa: E402
+from job_queue import JobQueue  # noqa: E402
+from prompt_reader import PromptReader  # noqa: E402
+from table_manager import TableManager  # noqa: E402
+
+
+class Logger:
+    def log_app_event(self, *args, **kwargs):
+        pass
+
+
+def test_worker_id_is_generated_once(tmp_path):
+    worker_id = main.load_worker_id({}, str(tmp_path))
+    assert worker_id
+    assert main.load_worker_id({'worker_id': ''}, str(tmp_path)) == worker_id
+    # Другой процесс со своей папкой получает другой ID
+    other_path = tmp_path / 'other'
+    other_path.mkdir()
+    assert main.load_worker_id({}, str(other_path)) != worker_id
+
+
+def test_worker_id_from_config(tmp_path):
+    assert main.load_worker_id({'worker_id': ' w1 '}, str(tmp_path)) == 'w1'
+    assert not (tmp_path / 'worker_id.txt').exists()
+
+
+def test_urgent_duplicate_raises_queued_priority(tmp_path):
+    async def run():
+        table_manager = TableManager({'downloads_path': str(tmp_path / 'downloads')})
+        queue = JobQueue()
+        prompt_file = tmp_path / 'prompt.txt'
+        prompt_file.write_text('old\n\nqueued\n', encoding='utf-8')
+        queue.extend(table_manager.ingest_prompts(PromptReader(str(prompt_file)), 10))
+        urgent_file = tmp_path / 'urgent.txt'
+        urgent_file.write_text('queued\n\nnew\n', encoding='utf-8')
+
+        assert await main.load_urgent_prompts(str(urgent_file), AsyncTableManager(table_manager), queue, 100, Logger()) == 1
+        prompts = {row['id']: row['prompt'] for row in table_manager.get_all_prompts()}
+        order = [prompts[prompt_id] for prompt_id in queue.ids()]
+        assert sorted(order[:2]) == ['new', 'queued']
+        assert order[2] == 'old'
+
+    asyncio.run(run())
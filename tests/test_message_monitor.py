@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip('telethon')
+
+import asyncio  # noqa: E402
+
+from message_monitor import MessageMonitor  # noqa: E402
+
+
+class FakeTableManager:
+    """Асинхронный менеджер таблицы, запоминающий вызовы"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        async def call(*args):
+            self.calls.append((name,) + args)
+        return call
+
+
+class FakeDownloader:
+    def __init__(self):
+        self.table_manager = FakeTableManager()
+
+
+@pytest.fixture
+def monitor(tmp_path, monkeypatch):
+    # MessageLogger создает каталог logs в текущей папке
+    monkeypatch.chdir(tmp_path)
+    return MessageMonitor(None, None, FakeDownloader(), {'model_concurrency_default': '2'})
+
+
+def run_request(monitor, result=None):
+    """Отправляет запрос в слот 1 и завершает его результатом result (None - таймаут)"""
+    async def run():
+        assert await monitor.set_current_task('p1', 'a cat', 'A', 1)
+        assert monitor.model_limits['A'] == 1
+        if result is not None:
+            asyncio.get_running_loop().call_later(0.01, monitor.resolve_request, monitor.active_requests[1], result)
+        return await monitor.wait_for_video(1)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('result', [True, False])
+def test_wait_for_video_returns_resolved_result(monitor, result):
+    assert run_request(monitor, result) is result
+    assert monitor.active_requests == {}
+    assert monitor.model_limits['A'] == 0
+
+
+def test_wait_for_video_times_out(monitor):
+    monitor.wait_time = 0.01
+    assert run_request(monitor) is False
+    assert monitor.model_limits['A'] == 0
+    assert ('mark_timeout', 'p1', 'A') in monitor.get_table_manager().calls
+
+
+def test_limited_model_is_not_sent(monitor):
+    monitor.model_limits['A'] = 2
+
+    async def run():
+        return await monitor.set_current_task('p1', 'a cat', 'A', 1)
+
+    assert not asyncio.run(run())
+    assert monitor.active_requests == {}
+    assert ('mark_pending', 'p1') in monitor.get_table_manager().calls
+
+
+def test_release_request_frees_model_counter(monitor):
+    async def run():
+        await monitor.set_current_task('p1', 'a cat', 'A', 1)
+        monitor.release_request(1)
+
+    asyncio.run(run())
+    assert monitor.active_requests == {}
+    assert monitor.model_limits['A'] == 0
@@ -0,0 +1,252 @@
+import pytest
+
+pytest.importorskip('telethon')
+
+import asyncio  # noqa: E402
+
+from failure_policy import FailurePolicy  # noqa: E402
+from message_monitor import MessageMonitor  # noqa: E402
+from navigation import TelegramNavigator  # noqa: E402
+
+SORA, HAILUO, RUNWAY, KLING = '🌙 SORA', '➕ Hailuo MiniMax', '📦 RunWay: Gen-3', '🎬 Kling 1.6'
+
+
+class FakeMonitor:
+    def __init__(self, loads=None, limited=()):
+        self.model_limits = dict(loads or {})
+        self.limited = set(limited)
+
+    def get_model_limit(self, model):
+        return 2
+
+    def is_model_limited(self, model):
+        return model in self.limited
+
+
+class FakeScheduler:
+    def __init__(self, full=()):
+        self.full = set(full)
+
+    def has_capacity(self, model):
+        return model not in self.full
+
+
+def make_navigator(monitor, **config):
+    return TelegramNavigator(None, None, {'model_number': '2', **config}, monitor)
+
+
+def test_without_routing_uses_configured_model():
+    navigator = make_navigator(FakeMonitor({HAILUO: 1}))
+    assert navigator.select_model({'prompt': '#models: 1\ncat'}, FakeScheduler()) == HAILUO
+    assert navigator.select_model({'prompt': 'cat'}, FakeScheduler(full=[HAILUO])) is None
+
+
+def test_routes_to_least_loaded_model():
+    navigator = make_navigator(FakeMonitor({SORA: 1, RUNWAY: 1}), model_routing='true', routing_models='1, 2, 3')
+    assert navigator.select_model({'prompt': 'cat'}, FakeScheduler()) == HAILUO
+
+
+def test_skips_limited_and_full_models():
+    monitor = FakeMonitor({SORA: 1}, limited=[HAILUO])
+    navigator = make_navigator(monitor, model_routing='true', routing_models='1,2,3')
+    assert navigator.select_model({'prompt': 'cat'}, FakeScheduler(full=[RUNWAY])) == SORA
+    assert navigator.select_model({'prompt': 'cat'}, FakeScheduler(full=[SORA, RUNWAY])) is None
+
+
+def test_prompt_header_overrides_routing_models():
+    navigator = make_navigator(FakeMonitor({SORA: 1}), model_routing='true', routing_models='2,3')
+    prompt = {'prompt': '#models: 1,4\na cat on a roof'}
+    assert navigator.get_allowed_models(prompt) == [SORA, KLING]
+    assert navigator.select_model(prompt, FakeScheduler()) == KLING
+
+
+class FakeTableManager:
+    """Асинхронный менеджер таблицы, запоминающий вызовы"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        async def call(*args):
+            self.calls.append((name,) + args)
+        return call
+
+
+class FakeDownloader:
+    def __init__(self):
+        self.table_manager = FakeTableManager()
+
+
+class FakeMessage:
+    def __init__(self, message_id, text):
+        self.id = message_id
+        self.text = text
+        self.message = text
+        self.media = None
+        self.reply_to = None
+
+
+class FakeEvent:
+    def __init__(self, message):
+        self.message = message
+
+
+class FakeClient:
+    """
+    Клиент Telegram с ботом-имитацией: бот отвечает на выбор модели
+    и сразу возвращает видео на каждый отправленный промпт
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.sent = []
+        self.monitor = None
+        self.replies = {model: 'Отправьте описание видео' for model in (SORA, HAILUO, RUNWAY, KLING)}
+        self.reply_delay = 0
+        self.last_id = 0
+
+    def on(self, builder):
+        def register(handler):
+            self.handlers[handler.__name__] = handler
+            return handler
+        return register
+
+    def _message(self, text):
+        self.last_id += 1
+        return FakeMessage(self.last_id, text)
+
+    async def bot_says(self, text, delay=0):
+        await asyncio.sleep(delay)
+        await self.handlers['handler'](FakeEvent(self._message(text)))
+
+    async def send_message(self, chat, text):
+        message = self._message(text)
+        self.sent.append(text)
+        await self.handlers['outgoing_handler'](FakeEvent(message))
+        reply = self.replies.get(text)
+        if reply and self.reply_delay:
+            asyncio.ensure_future(self.bot_says(reply, self.reply_delay))
+        elif reply:
+            # Ответ приходит раньше, чем завершается отправка сообщения
+            await self.bot_says(reply)
+        for request in self.monitor.active_requests.values():
+            if request['prompt'] == text:
+                self.monitor.resolve_request(request, True)
+        return message
+
+
+def make_bot(tmp_path, monkeypatch, **config):
+    # MessageLogger создает каталог logs в текущей папке
+    monkeypatch.chdir(tmp_path)
+    config = {'model_number': '1', 'send_rate_per_chat': '1000', 'send_burst_per_chat': '100',
+              'send_rate_per_account': '1000', 'send_burst_per_account': '100', **config}
+    client = FakeClient()
+    monitor = MessageMonitor(client, 'bot', FakeDownloader(), config)
+    client.monitor = monitor
+    return client, monitor, TelegramNavigator(client, 'bot', config, monitor)
+
+
+def send_prompts(navigator, prompts):
+    """Отправляет промпты по очереди: [(id, текст, модель), ...] -> результаты"""
+    async def run():
+        await navigator.message_monitor.start_monitoring()
+        results = []
+        for slot, (prompt_id, text, model) in enumerate(prompts, 1):
+            results.append(await navigator.navigate_and_send_prompt({'id': prompt_id, 'prompt': text}, slot, model))
+        return results
+    return asyncio.run(run())
+
+
+def test_same_model_skips_navigation(tmp_path, monkeypatch):
+    client, _, navigator = make_bot(tmp_path, monkeypatch)
+    assert send_prompts(navigator, [('p1', 'first', SORA), ('p2', 'second', SORA), ('p3', 'third', HAILUO)]) == \
+        [True, True, True]
+    assert client.sent == ['/video', SORA, 'first', 'second', '/video', HAILUO, 'third']
+    assert (navigator.navigations_sent, navigator.navigations_skipped) == (2, 1)
+
+
+def test_menu_message_resets_model_state(tmp_path, monkeypatch):
+    client, monitor, navigator = make_bot(tmp_path, monkeypatch)
+    send_prompts(navigator, [('p1', 'first', SORA)])
+    assert monitor.menu_model == SORA
+
+    asyncio.run(client.bot_says('Выберите раздел для работы с видео'))
+    assert monitor.menu_model is None
+    send_prompts(navigator, [('p2', 'second', SORA)])
+    assert client.sent[3:] == ['/video', SORA, 'second']
+
+
+def test_manual_message_resets_model_state(tmp_path, monkeypatch):
+    client, monitor, navigator = make_bot(tmp_path, monkeypatch)
+    send_prompts(navigator, [('p1', 'first', SORA)])
+    asyncio.run(client.send_message('bot', '/start'))
+    assert monitor.menu_model is None
+
+
+def test_prompt_waits_for_model_ack(tmp_path, monkeypatch):
+    client, monitor, navigator = make_bot(tmp_path, monkeypatch)
+    client.reply_delay = 0.05
+    assert send_prompts(navigator, [('p1', 'first', SORA)]) == [True]
+    assert client.sent == ['/video', SORA, 'first']
+    assert monitor.menu_model == SORA
+    assert monitor.model_ack_waiters == []
+
+
+def test_no_tool_selected_reply_fails_the_prompt(tmp_path, monkeypatch):
+    client, monitor, navigator = make_bot(tmp_path, monkeypatch)
+    client.replies[SORA] = 'Не выбран инструмент для работы с чат-ботом'
+    assert send_prompts(navigator, [('p1', 'first', SORA)]) == [False]
+    assert client.sent == ['/video', SORA]
+    assert monitor.active_requests == {}
+    assert monitor.model_limits[SORA] == 0
+    assert monitor.pop_failure('p1')[0] == FailurePolicy.SEND_FAILED
+    assert monitor.menu_model is None
+
+
+def test_missing_ack_sends_prompt_without_caching_model(tmp_path, monkeypatch):
+    client, monitor, navigator = make_bot(tmp_path, monkeypatch, model_ack_timeout='0.05')
+    client.replies[SORA] = None
+    assert send_prompts(navigator, [('p1', 'first', SORA), ('p2', 'second', SORA)]) == [True, True]
+    assert client.sent == ['/video', SORA, 'first', '/video', SORA, 'second']
+    assert monitor.menu_model is None
+
+
+def test_generation_status_is_not_a_model_ack(tmp_path, monkeypatch):
+    _, monitor, _ = make_bot(tmp_path, monkeypatch)
+    assert monitor.classify_model_ack('⏳ Генерация видео', False) is None
+    assert monitor.classify_model_ack('Отправьте описание видео', True) is None
+    assert monitor.classify_model_ack('Отправьте описание видео', False) is True
+
+
+def test_concurrent_submissions_do_not_interleave(tmp_path, monkeypatch):
+    client, _, navigator = make_bot(tmp_path, monkeypatch)
+    client.reply_delay = 0.02
+
+    async def run():
+        await navigator.message_monitor.start_monitoring()
+        return await asyncio.gather(
+            navigator.navigate_and_send_prompt({'id': 'p1', 'prompt': 'first'}, 1, SORA),
+            navigator.navigate_and_send_prompt({'id': 'p2', 'prompt': 'second'}, 2, HAILUO))
+
+    assert asyncio.run(run()) == [True, True]
+    assert client.sent == ['/video', SORA, 'first', '/video', HAILUO, 'second']
+    assert navigator.get_submission_metrics()['submissions'] == 2
+
+
+def test_submit_returns_before_result_is_collected(tmp_path, monkeypatch):
+    client, monitor, navigator = make_bot(tmp_path, monkeypatch)
+    # Видео не приходит сразу: результат дожидается collect_result
+    client.monitor = type('NoVideo', (), {'active_requests': {}})()
+
+    async def run():
+        await monitor.start_monitoring()
+        assert await navigator.submit_prompt({'id': 'p1', 'prompt': 'first'}, 1, SORA)
+        assert client.sent == ['/video', SORA, 'first']
+        collect = asyncio.ensure_future(navigator.collect_result(1))
+        await asyncio.sleep(0.01)
+        assert not collect.done()
+        monitor.resolve_request(monitor.active_requests[1], True)
+        return await collect
+
+    assert asyncio.run(run()) is True
+    assert monitor.active_requests == {}
@@ -0,0 +1,84 @@
+from prompt_reader import PromptReader, split_prompt_meta
+
+
+def write_prompts(path, prompts):
+    path.write_text('\n\n'.join(prompts) + '\n', encoding='utf-8')
+
+
+def test_split_prompt_meta():
+    meta, text = split_prompt_meta('#models: 1,4\n#Priority: 5\ncat on a roof\nat night')
+    assert meta == {'models': '1,4', 'priority': '5'}
+    assert text == 'cat on a roof\nat night'
+
+
+def test_split_prompt_meta_keeps_unknown_header():
+    prompt = '#hashtag in the text\nsecond line'
+    assert split_prompt_meta(prompt) == ({}, prompt)
+    assert split_prompt_meta('#priority: 1\n#hashtag\ntext') == ({'priority': '1'}, '#hashtag\ntext')
+
+
+def test_read_in_batches(tmp_path):
+    prompt_file = tmp_path / 'prompts.txt'
+    write_prompts(prompt_file, ['one', 'two\nlines', 'three'])
+    reader = PromptReader(str(prompt_file))
+
+    assert [prompt for prompt, _ in reader.read(2)] == ['one', 'two\nlines']
+    assert not reader.exhausted
+    assert [prompt for prompt, _ in reader.read(2)] == ['three']
+    assert reader.exhausted
+    assert reader.read(2) == []
+
+
+def test_cursor_moves_past_contiguous_commits(tmp_path):
+    prompt_file = tmp_path / 'prompts.txt'
+    cursor_file = tmp_path / 'cursor.json'
+    write_prompts(prompt_file, ['one', 'two', 'three'])
+    reader = PromptReader(str(prompt_file), str(cursor_file))
+    batch = reader.read(3)
+    for prompt_id, (_, offset) in zip(('a', 'b', 'c'), batch):
+        reader.track(prompt_id, offset)
+
+    # Завершен только второй промпт - первый еще в работе, позиция не сдвигается
+    reader.commit('b')
+    assert PromptReader(str(prompt_file), str(cursor_file)).offset == 0
+    reader.commit('a')
+    assert reader.offset == batch[1][1]
+
+    resumed = PromptReader(str(prompt_file), str(cursor_file))
+    assert [prompt for prompt, _ in resumed.read(10)] == ['three']
+
+
+def test_cursor_ignored_for_other_or_shorter_file(tmp_path):
+    prompt_file = tmp_path / 'prompts.txt'
+    cursor_file = tmp_path / 'cursor.json'
+    write_prompts(prompt_file, ['one', 'two'])
+    reader = PromptReader(str(prompt_file), str(cursor_file))
+    reader.save_cursor(prompt_file.stat().st_size)
+
+    assert PromptReader(str(tmp_path / 'other.txt'), str(cursor_file)).offset == 0
+    write_prompts(prompt_file, ['x'])
+    assert PromptReader(str(prompt_file), str(cursor_file)).offset == 0
+
+
+def test_read_position_survives_restart(tmp_path):
+    prompt_file = tmp_path / 'prompts.txt'
+    cursor_file = tmp_path / 'cursor.json'
+    write_prompts(prompt_file, ['one', 'two', 'three'])
+    reader = PromptReader(str(prompt_file), str(cursor_file))
+    batch = reader.read(2)
+    reader.track('a', batch[0][1])
+    reader.commit('a')
+
+    resumed = PromptReader(str(prompt_file), str(cursor_file))
+    assert resumed.offset == batch[0][1]
+    assert resumed.read_until == batch[1][1]
+    (_, two_offset), (_, three_offset) = resumed.read(10)
+    assert resumed.is_reread(two_offset)
+    assert not resumed.is_reread(three_offset)
+
+
+def test_crlf_file_gives_same_prompts(tmp_path):
+    prompt_file = tmp_path / 'prompts.txt'
+    prompt_file.write_bytes(b'line one\r\nline two\r\n\r\nsecond\r\n')
+    reader = PromptReader(str(prompt_file))
+    assert [prompt for prompt, _ in reader.read(10)] == ['line one\nline two', 'second']
@@ -0,0 +1,50 @@
+import csv
+import io
+
+import pytest
+
+from prompt_record import PromptRecord
+
+
+def test_from_dict_fills_missing_fields():
+    record = PromptRecord.from_dict({'id': 'abc', 'prompt': 'cat', 'status': 'pending', 'slot': None})
+    assert dict(record.items()) == {'id': 'abc', 'prompt': 'cat', 'status': 'pending', 'model': '',
+                                    'video_path': '', 'timestamp': '', 'slot': ''}
+
+
+def test_mapping_access():
+    record = PromptRecord('abc', 'cat')
+    record['status'] = 'completed'
+    record['slot'] = 2
+    assert record['status'] == 'completed'
+    assert record['slot'] == '2'
+    assert record.get('missing', 'default') == 'default'
+    assert 'model' in record and 'missing' not in record
+    with pytest.raises(KeyError):
+        record['missing'] = 'value'
+    with pytest.raises(KeyError):
+        record['missing']
+
+
+def test_short_values_are_interned():
+    first = PromptRecord.from_dict({'id': 'a', 'status': ''.join(['compl', 'eted'])})
+    second = PromptRecord('b')
+    second['status'] = ''.join(['comp', 'leted'])
+    assert first.status is second.status
+
+
+def test_copy_and_equality():
+    record = PromptRecord('abc', 'cat', model='A')
+    copy = record.copy()
+    copy['status'] = 'completed'
+    assert record['status'] == 'pending'
+    assert record == PromptRecord('abc', 'cat', model='A')
+    assert record == dict(record.items())
+    assert record != copy
+
+
+def test_csv_dict_writer_accepts_records():
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=PromptRecord.FIELDS)
+    writer.writerow(PromptRecord('abc', 'cat'))
+    assert out.getvalue().strip() == 'abc,cat,pending,,,,'
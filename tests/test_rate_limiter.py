@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('telethon')
+
+from rate_limiter import OutgoingRateLimiter, TokenBucket  # noqa: E402
+from telethon.errors import FloodWaitError  # noqa: E402
+
+
+class FakeClient:
+    def __init__(self, flood_waits=()):
+        self.flood_waits = list(flood_waits)
+        self.sent = []
+
+    async def send_message(self, chat, message):
+        if self.flood_waits:
+            raise FloodWaitError(request=None, capture=self.flood_waits.pop(0))
+        self.sent.append((chat, message))
+        return message
+
+
+def test_bucket_allows_burst_then_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1.0
+    clock.now += 10
+    assert bucket.reserve() == 0
+
+
+def test_chat_and_account_buckets(clock):
+    async def run():
+        client = FakeClient()
+        limiter = OutgoingRateLimiter(client, chat_rate=1, chat_burst=2, account_rate=10, account_burst=10)
+        for _ in range(3):
+            await limiter.send('bot', 'hi')
+        # Третье сообщение в тот же чат ждет токен чата, другой чат не ждет
+        assert clock.sleeps == [1.0]
+        await limiter.send('other', 'hi')
+        assert clock.sleeps == [1.0]
+        assert limiter.get_metrics()['sent'] == 4
+
+    asyncio.run(run())
+
+
+def test_short_flood_wait_blocks_account_and_resends(clock):
+    async def run():
+        client = FakeClient(flood_waits=[30])
+        limiter = OutgoingRateLimiter(client, max_flood_wait=60)
+        assert await limiter.send('bot', 'hi') == 'hi'
+        assert clock.sleeps == [30]
+        assert limiter.get_metrics()['flood_waits'] == 1
+        assert limiter.get_metrics()['throttle_seconds'] == 30
+
+    asyncio.run(run())
+
+
+def test_long_flood_wait_is_raised(clock):
+    async def run():
+        limiter = OutgoingRateLimiter(FakeClient(flood_waits=[600]), max_flood_wait=60)
+        with pytest.raises(FloodWaitError):
+            await limiter.send('bot', 'hi')
+        assert limiter.sent == 0
+
+    asyncio.run(run())
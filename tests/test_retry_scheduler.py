@@ -0,0 +1,79 @@
+import pytest
+
+from failure_policy import FailurePolicy
+from retry_scheduler import Backoff, RetryScheduler, TimerWheel
+
+
+def test_backoff_grows_to_max():
+    backoff = Backoff(10, 2, 50, jitter=0)
+    assert [backoff.delay(attempt) for attempt in range(1, 5)] == [10, 20, 40, 50]
+
+
+def test_backoff_jitter_bounds():
+    backoff = Backoff(100, jitter=0.2)
+    assert all(80 <= backoff.delay(1) <= 120 for _ in range(100))
+
+
+def test_backoff_parse():
+    backoff = Backoff.parse('30:3', jitter=0)
+    assert (backoff.base, backoff.factor, backoff.max_delay) == (30, 3, 3600)
+    for value in ('', 'x:2', '1:2:3:4', '-1'):
+        with pytest.raises(ValueError):
+            Backoff.parse(value)
+
+
+def test_wheel_pops_items_when_due(clock):
+    wheel = TimerWheel(tick=1.0, size=8)
+    wheel.schedule(2, 'a')
+    wheel.schedule(5, 'b')
+    assert len(wheel) == 2
+    assert wheel.next_delay() == 2
+
+    clock.now += 1
+    assert wheel.pop_due() == []
+    clock.now += 1
+    assert wheel.pop_due() == ['a']
+    assert wheel.next_delay() == 3
+    clock.now += 10
+    assert wheel.pop_due() == ['b']
+    assert len(wheel) == 0
+    assert wheel.next_delay() is None
+
+
+def test_wheel_keeps_items_beyond_one_turn(clock):
+    wheel = TimerWheel(tick=1.0, size=4)
+    wheel.schedule(6, 'late')
+    clock.now += 2
+    # Ячейка тика 2 совпадает с ячейкой тика 6, но срок еще не наступил
+    assert wheel.pop_due() == []
+    assert [item for _, item in wheel.items()] == ['late']
+    clock.now += 4
+    assert wheel.pop_due() == ['late']
+
+
+def test_wheel_after_long_pause(clock):
+    wheel = TimerWheel(tick=1.0, size=4)
+    wheel.schedule(1, 'a')
+    wheel.schedule(3, 'b')
+    clock.now += 100
+    assert sorted(wheel.pop_due()) == ['a', 'b']
+
+
+def test_retry_scheduler_history_and_delays(clock):
+    policy = FailurePolicy()
+    scheduler = RetryScheduler(policy, {'error': Backoff(10, 2, 100, jitter=0)})
+    assert scheduler.delay('p', 'error') == 10
+    scheduler.record('p', 'error', policy.REQUEUE, 10)
+    assert scheduler.delay('p', 'error') == 20
+    assert scheduler.delay('p', 'error', minimum=60) == 60
+    scheduler.record('p', 'limit', policy.PAUSE)
+    scheduler.record('p', 'timeout', policy.RETRY)
+    assert scheduler.attempts('p') == 3
+    assert scheduler.requeues('p') == 2
+
+    scheduler.schedule({'id': 'p'}, 10)
+    assert [prompt_data['id'] for prompt_data, _ in scheduler.pending()] == ['p']
+    clock.now += 10
+    assert scheduler.pop_due() == [{'id': 'p'}]
+    assert len(scheduler.forget('p')) == 3
+    assert scheduler.attempts('p') == 0
@@ -0,0 +1,58 @@
+import asyncio
+
+from scheduler import ModelScheduler
+
+
+def test_slots_bound_requests_in_flight():
+    scheduler = ModelScheduler(2, {'A': 2, 'B': 2})
+
+    async def run():
+        await scheduler.acquire('A')
+        await scheduler.acquire('B')
+        assert not scheduler.has_capacity('A')
+        assert scheduler.available('B') == 0
+        scheduler.release('A')
+        assert scheduler.available('A') == 1
+
+    asyncio.run(run())
+
+
+def test_pipeline_holds_the_slot_only_while_submitting():
+    scheduler = ModelScheduler(1, {'A': 2, 'B': 1}, pipeline=True)
+
+    async def run():
+        await scheduler.acquire('A')
+        await scheduler.acquire('A')
+        await scheduler.acquire('B')
+        assert scheduler.active == {'A': 2, 'B': 1}
+        assert scheduler.available('A') == 0
+        assert scheduler.max_in_flight(['A', 'B']) == 3
+
+        order = []
+
+        async def submit(name):
+            async with scheduler.submission():
+                order.append((name, scheduler.submitting))
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(submit('first'), submit('second'))
+        assert order == [('first', 1), ('second', 1)]
+        scheduler.release('B')
+        assert scheduler.available('B') == 1
+
+    asyncio.run(run())
+
+
+def test_try_acquire_does_not_wait():
+    scheduler = ModelScheduler(3, {'A': 1})
+
+    async def run():
+        assert await scheduler.try_acquire('A')
+        # Лимит модели исчерпан: восстановленный промпт не должен ждать освобождения слота
+        assert not await scheduler.try_acquire('A')
+        assert scheduler.active == {'A': 1}
+        assert await scheduler.try_acquire('B')
+        assert await scheduler.try_acquire('C')
+        assert not await scheduler.try_acquire('D')
+
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+import time
+
+import shared_queue
+from shared_queue import SharedPromptQueue
+
+
+def make_queues(tmp_path, prompts, lease_seconds=300):
+    prompt_file = tmp_path / 'prompts.txt'
+    prompt_file.write_text('\n\n'.join(prompts) + '\n', encoding='utf-8')
+    db_file = str(tmp_path / 'queue.db')
+    first = SharedPromptQueue(db_file, 'w1', lease_seconds)
+    second = SharedPromptQueue(db_file, 'w2', lease_seconds)
+    first.populate(str(prompt_file))
+    return first, second, str(prompt_file)
+
+
+def test_populate_is_idempotent(tmp_path):
+    first, second, prompt_file = make_queues(tmp_path, ['one', 'two', 'one'])
+    assert second.populate(prompt_file) == 0
+    assert first.remaining() == 2
+
+
+def test_workers_claim_different_prompts(tmp_path):
+    first, second, _ = make_queues(tmp_path, ['one', 'two'])
+    claimed = [first.claim(), second.claim()]
+    assert sorted(job['prompt'] for job in claimed) == ['one', 'two']
+    assert first.claim() is None
+
+
+def test_expired_lease_is_claimed_again(tmp_path, monkeypatch):
+    first, second, _ = make_queues(tmp_path, ['one'], lease_seconds=60)
+    job = first.claim()
+    assert second.claim() is None
+
+    now = time.time()
+    monkeypatch.setattr(shared_queue.time, 'time', lambda: now + 30)
+    assert first.renew() == 1
+    monkeypatch.setattr(shared_queue.time, 'time', lambda: now + 80)
+    # Аренда продлена до now + 90
+    assert second.claim() is None
+    monkeypatch.setattr(shared_queue.time, 'time', lambda: now + 100)
+    assert second.claim() == job
+    # Аренда перешла ко второму процессу - первый не может завершить промпт
+    first.complete(job['id'], 'completed')
+    assert first.remaining() == 1
+
+
+def test_completed_prompt_is_not_claimed_again(tmp_path):
+    first, second, _ = make_queues(tmp_path, ['one'], lease_seconds=0)
+    job = first.claim()
+    first.complete(job['id'], 'completed')
+    assert second.claim() is None
+    assert first.remaining() == 0
+
+
+def test_release_all_keeps_listed_leases(tmp_path):
+    first, second, _ = make_queues(tmp_path, ['one', 'two', 'three'])
+    jobs = [first.claim(), first.claim()]
+    first.release_all(keep={jobs[1]['id']})
+    assert [second.claim()['prompt'], second.claim()['prompt']] == ['one', 'three']
+    assert second.claim() is None
@@ -0,0 +1,118 @@
+import csv
+import random
+
+import pytest
+
+from table_manager import create_table_manager
+
+# Настройки хранилища для каждого бэкенда таблицы
+BACKENDS = {
+    'csv': {},
+    'sqlite': {'storage_backend': 'sqlite'},
+    'journal': {'storage_backend': 'journal'},
+    'buffered': {'write_flush_interval': '60'},
+}
+
+
+def make_table_manager(tmp_path, backend):
+    config = {'downloads_path': str(tmp_path / 'downloads'), **BACKENDS[backend]}
+    return create_table_manager(config)
+
+
+@pytest.fixture(params=list(BACKENDS))
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def table_manager(tmp_path, backend):
+    table_manager = make_table_manager(tmp_path, backend)
+    yield table_manager
+    table_manager.close()
+
+
+def load(table_manager, tmp_path, prompts):
+    prompt_file = tmp_path / 'prompt.txt'
+    prompt_file.write_text('\n\n'.join(prompts) + '\n', encoding='utf-8')
+    return table_manager.load_prompts(str(prompt_file))
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_status_updates(table_manager, tmp_path):
+    rows = load(table_manager, tmp_path, ['first prompt', 'second\nprompt'])
+    assert [row['prompt'] for row in table_manager.get_all_prompts()] == ['first prompt', 'second\nprompt']
+    assert [row['id'] for row in table_manager.get_pending_prompts()] == [row['id'] for row in rows]
+
+    first, second = rows[0]['id'], rows[1]['id']
+    table_manager.mark_queued(first, 1)
+    table_manager.mark_in_progress(first, 'A')
+    assert [row['id'] for row in table_manager.get_slot_prompts(1)] == [first]
+    assert [row['id'] for row in table_manager.get_in_progress_prompts()] == [first]
+
+    table_manager.mark_completed(first, 'A', 'video.mp4')
+    status = table_manager.get_status(first)
+    assert (status['status'], status['model'], status['video_path'], status['slot']) == \
+        ('completed', 'A', 'video.mp4', '1')
+    assert status['timestamp']
+    assert [row['id'] for row in table_manager.get_pending_prompts()] == [second]
+    assert table_manager.get_status('missing') is None
+
+
+def test_export_csv(table_manager, tmp_path):
+    rows = load(table_manager, tmp_path, ['one', 'two'])
+    table_manager.mark_skipped(rows[1]['id'])
+    export_file = tmp_path / 'export.csv'
+    table_manager.export_csv(str(export_file))
+    assert [(row['prompt'], row['status']) for row in read_csv(export_file)] == \
+        [('one', 'pending'), ('two', 'skipped')]
+
+
+def test_table_file_is_written_on_close(tmp_path, backend):
+    table_manager = make_table_manager(tmp_path, backend)
+    rows = load(table_manager, tmp_path, ['one', 'two'])
+    table_manager.mark_completed(rows[0]['id'], 'A', 'one.mp4')
+    table_manager.close()
+
+    written = read_csv(table_manager.table_file)
+    assert [(row['prompt'], row['status'], row['video_path']) for row in written] == \
+        [('one', 'completed', 'one.mp4'), ('two', 'pending', '')]
+
+
+def test_queries_match_a_full_scan(table_manager, tmp_path):
+    rows = load(table_manager, tmp_path, [f'prompt {i}' for i in range(30)])
+    ids = [row['id'] for row in rows]
+    rng = random.Random(8)
+    for _ in range(200):
+        prompt_id = rng.choice(ids)
+        action = rng.randrange(5)
+        if action == 0:
+            table_manager.mark_queued(prompt_id, rng.randint(1, 3))
+        elif action == 1:
+            table_manager.mark_in_progress(prompt_id, rng.choice('AB'))
+        elif action == 2:
+            table_manager.mark_completed(prompt_id, rng.choice('AB'), 'video.mp4')
+        elif action == 3:
+            table_manager.mark_error(prompt_id, rng.choice('AB'))
+        else:
+            table_manager.mark_pending(prompt_id)
+
+    def key(rows):
+        return sorted(tuple(row[field] for field in ('id', 'status', 'model', 'slot')) for row in rows)
+
+    all_rows = table_manager.get_all_prompts()
+    counts = {}
+    for row in all_rows:
+        counts[row['status']] = counts.get(row['status'], 0) + 1
+    assert table_manager.count_by_status() == counts
+    assert key(table_manager.get_pending_prompts()) == key(r for r in all_rows if r['status'] == 'pending')
+    assert key(table_manager.get_in_progress_prompts()) == key(r for r in all_rows if r['status'] == 'in_progress')
+    assert key(table_manager.get_active_prompts()) == \
+        key(r for r in all_rows if r['status'] in ('queued', 'in_progress', 'waiting_download'))
+    for slot in (1, 2, 3):
+        assert key(table_manager.get_slot_prompts(slot)) == key(r for r in all_rows if r['slot'] == str(slot))
+    for model in ('A', 'B'):
+        assert key(table_manager.get_model_prompts(model)) == key(r for r in all_rows if r['model'] == model)
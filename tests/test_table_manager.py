@@ -0,0 +1,174 @@
+import hashlib
+
+from prompt_reader import PromptReader
+from table_manager import TableManager
+
+
+def make_config(tmp_path, resume=False):
+    return {'downloads_path': str(tmp_path / 'downloads'), 'resume': 'true' if resume else 'false'}
+
+
+def write_prompts(path, prompts):
+    path.write_text('\n\n'.join(prompts) + '\n', encoding='utf-8')
+
+
+def statuses(table_manager):
+    return [(row['id'], row['status']) for row in table_manager.get_all_prompts()]
+
+
+def test_resume_keeps_finished_prompts(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    write_prompts(prompt_file, ['one', 'two', 'three'])
+    table_manager = TableManager(make_config(tmp_path))
+    rows = table_manager.load_prompts(str(prompt_file))
+    table_manager.mark_completed(rows[0]['id'], 'A', 'one.mp4')
+    table_manager.mark_skipped(rows[1]['id'])
+    table_manager.mark_in_progress(rows[2]['id'], 'A')
+
+    write_prompts(prompt_file, ['one', 'two', 'three', 'four'])
+    table_manager = TableManager(make_config(tmp_path, resume=True))
+    table_manager.load_prompts(str(prompt_file))
+    assert [status for _, status in statuses(table_manager)] == ['completed', 'skipped', 'pending', 'pending']
+    assert table_manager.get_status(rows[0]['id'])['video_path'] == 'one.mp4'
+    assert [row['prompt'] for row in table_manager.get_pending_prompts()] == ['three', 'four']
+
+
+def test_resume_keeps_finished_prompts_removed_from_file(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    write_prompts(prompt_file, ['one', 'two'])
+    table_manager = TableManager(make_config(tmp_path))
+    rows = table_manager.load_prompts(str(prompt_file))
+    table_manager.mark_completed(rows[0]['id'], 'A', 'one.mp4')
+
+    write_prompts(prompt_file, ['two'])
+    table_manager = TableManager(make_config(tmp_path, resume=True))
+    table_manager.load_prompts(str(prompt_file))
+    assert sorted(statuses(table_manager)) == sorted([(rows[0]['id'], 'completed'), (rows[1]['id'], 'pending')])
+
+
+def test_without_resume_table_is_cleared(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    write_prompts(prompt_file, ['one'])
+    table_manager = TableManager(make_config(tmp_path))
+    rows = table_manager.load_prompts(str(prompt_file))
+    table_manager.mark_completed(rows[0]['id'], 'A')
+
+    table_manager = TableManager(make_config(tmp_path))
+    assert table_manager.get_all_prompts() == []
+
+
+def test_requeue_unfinished(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    write_prompts(prompt_file, ['one', 'two', 'three'])
+    table_manager = TableManager(make_config(tmp_path))
+    rows = table_manager.load_prompts(str(prompt_file))
+    table_manager.mark_completed(rows[0]['id'], 'A')
+    table_manager.mark_queued(rows[1]['id'], 1)
+    table_manager.mark_in_progress(rows[2]['id'], 'A')
+
+    table_manager = TableManager(make_config(tmp_path, resume=True))
+    assert table_manager.requeue_unfinished() == 2
+    assert [status for _, status in statuses(table_manager)] == ['completed', 'pending', 'pending']
+
+
+def test_duplicates_share_one_id(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    write_prompts(prompt_file, ['cat', 'dog', 'cat'])
+    table_manager = TableManager(make_config(tmp_path))
+    rows = table_manager.load_prompts(str(prompt_file))
+
+    assert [row['id'] for row in rows] == [rows[0]['id'], rows[1]['id'], rows[0]['id']]
+    assert [row['id'] for row in table_manager.get_pending_prompts()] == [rows[0]['id'], rows[1]['id']]
+    table_manager.mark_completed(rows[0]['id'], 'A', 'cat.mp4')
+    assert [row['status'] for row in table_manager.get_all_prompts()] == ['completed', 'pending', 'completed']
+
+
+def test_colliding_short_id_is_extended(tmp_path):
+    # У этих промптов совпадают первые 8 символов MD5 (90a74bc7)
+    first, second = 'prompt 9257', 'prompt 117474'
+    prompt_file = tmp_path / 'prompt.txt'
+    write_prompts(prompt_file, [first, second])
+    table_manager = TableManager(make_config(tmp_path))
+    rows = table_manager.load_prompts(str(prompt_file))
+
+    assert rows[0]['id'] == hashlib.md5(first.encode()).hexdigest()[:8]
+    assert rows[1]['id'] == hashlib.md5(second.encode()).hexdigest()[:12]
+    table_manager.mark_completed(rows[1]['id'], 'A')
+    assert table_manager.get_status(rows[0]['id'])['status'] == 'pending'
+
+
+
+def test_id_taken_in_table_is_extended(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    write_prompts(prompt_file, ['cat'])
+    full_hash = hashlib.md5(b'cat').hexdigest()
+    table_manager = TableManager(make_config(tmp_path))
+    # Короткий ID промпта уже занят другим промптом (например, из общей очереди)
+    table_manager.add_prompt(full_hash[:8], 'another prompt')
+
+    rows = table_manager.ingest_prompts(PromptReader(str(prompt_file)), 10)
+    assert [row['id'] for row in rows] == [full_hash[:12]]
+
+
+def test_stream_duplicate_becomes_occurrence(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    write_prompts(prompt_file, ['cat', 'dog', 'cat'])
+    table_manager = TableManager(make_config(tmp_path))
+    reader = PromptReader(str(prompt_file))
+
+    rows = table_manager.ingest_prompts(reader, 10)
+    assert [row['prompt'] for row in rows] == ['cat', 'dog']
+    assert len(table_manager.get_all_prompts()) == 3
+
+
+def test_stream_resume_does_not_add_rows_for_reread_prompts(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    cursor_file = str(tmp_path / 'cursor.json')
+    write_prompts(prompt_file, ['one', 'two', 'one', 'three'])
+    table_manager = TableManager(make_config(tmp_path))
+    reader = PromptReader(str(prompt_file), cursor_file)
+    rows = table_manager.ingest_prompts(reader, 10)
+    table_manager.mark_completed(rows[0]['id'], 'A')
+    reader.commit(rows[0]['id'])
+
+    for _ in range(2):
+        table_manager = TableManager(make_config(tmp_path, resume=True))
+        table_manager.requeue_unfinished()
+        reader = PromptReader(str(prompt_file), cursor_file)
+        assert table_manager.ingest_prompts(reader, 10) == []
+        assert len(table_manager.get_all_prompts()) == 4
+        assert table_manager.count_by_status() == {'completed': 2, 'pending': 2}
+
+
+def test_stream_resume_keeps_new_duplicates(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    cursor_file = str(tmp_path / 'cursor.json')
+    write_prompts(prompt_file, ['one', 'two'])
+    table_manager = TableManager(make_config(tmp_path))
+    reader = PromptReader(str(prompt_file), cursor_file)
+    rows = table_manager.ingest_prompts(reader, 10)
+    table_manager.mark_completed(rows[1]['id'], 'A')
+
+    # Дописанный после перезапуска повтор - новое вхождение с тем же статусом
+    write_prompts(prompt_file, ['one', 'two', 'two'])
+    table_manager = TableManager(make_config(tmp_path, resume=True))
+    reader = PromptReader(str(prompt_file), cursor_file)
+    assert table_manager.ingest_prompts(reader, 10) == []
+    assert statuses(table_manager) == [(rows[0]['id'], 'pending'), (rows[1]['id'], 'completed'),
+                                       (rows[1]['id'], 'completed')]
+
+
+def test_reconcile_finished_state_covers_every_occurrence(tmp_path):
+    prompt_file = tmp_path / 'prompt.txt'
+    write_prompts(prompt_file, ['x', 'y'])
+    table_manager = TableManager(make_config(tmp_path))
+    rows = table_manager.load_prompts(str(prompt_file))
+    table_manager.mark_completed(rows[0]['id'], 'A', 'x.mp4')
+
+    write_prompts(prompt_file, ['x', 'y', 'x'])
+    table_manager = TableManager(make_config(tmp_path, resume=True))
+    table_manager.load_prompts(str(prompt_file))
+    x_id, y_id = rows[0]['id'], rows[1]['id']
+    assert statuses(table_manager) == [(x_id, 'completed'), (y_id, 'pending'), (x_id, 'completed')]
+    assert table_manager.get_all_prompts()[2]['video_path'] == 'x.mp4'
+    assert [row['id'] for row in table_manager.get_pending_prompts()] == [y_id]
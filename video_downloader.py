@@ -5,6 +5,8 @@ import re
 from datetime import datetime
 import hashlib
 import gc
+from failure_policy import FailurePolicy
+from prompt_reader import split_prompt_meta
 
 class VideoDownloader:
     def __init__(self, table_manager, config, client=None, logger=None):
@@ -62,9 +64,10 @@ class VideoDownloader:
                          .replace('🌫', '').replace('🦋', '').strip()
                          
             # Получаем статус промпта
-            prompt_status = self.table_manager.get_status(prompt_id)
+            prompt_status = await self.table_manager.get_status(prompt_id)
             if prompt_status:
-                prompt = prompt_status.get('prompt', '')
+                # Служебные строки (#priority:, #models:) в имя файла не попадают
+                prompt = split_prompt_meta(prompt_status.get('prompt', ''))[1]
                 # Берем первые 5 слов из промпта для имени файла
                 if prompt:
                     prompt_short = self.get_first_5_words(prompt)
@@ -98,7 +101,7 @@ class VideoDownloader:
                 self.logger.log_video_downloaded(prompt_id, file_path, model, True)
                 
             # Отмечаем в таблице
-            self.table_manager.mark_completed(prompt_id, model, file_path)
+            await self.table_manager.mark_completed(prompt_id, model, file_path)
             
             self.last_download_success = True
             self.last_saved_filepath = file_path
@@ -113,7 +116,9 @@ class VideoDownloader:
                 self.logger.log_exception(e, context=f"При скачивании видео для промпта {prompt_id}")
                 
             # Отмечаем ошибку в таблице
-            self.table_manager.mark_error(prompt_id, model, str(e))
+            await self.table_manager.mark_error(prompt_id, model, str(e))
+            if self.message_monitor:
+                self.message_monitor.record_failure(prompt_id, FailurePolicy.DOWNLOAD, str(e))
             
             self.last_download_success = False
             return False